@@ -2,16 +2,23 @@
 """
 Initialize and configure the logger for the application. The logger will print
 to both the console and a specified log file assigned to the "debug"
-environment variable
+environment variable, from a background thread so that logging does not hold
+up the queries
 """
 
 import logging
+from .logs import create_pipeline
+from .logs import LogPipeline
 from .setup import LoadEnv
 from pydantic import ValidationError
 
 # Initialize the logger
 logger = logging.getLogger(__name__)
 
+# Initialize the logger of the slow query log, kept out of the log file
+slow_logger = logging.getLogger(f"{__name__}.slow")
+slow_logger.propagate = False
+
 # Define the log format string
 format_str = "[%(asctime)s - %(levelname)s] - %(message)s"
 
@@ -41,17 +48,37 @@ except ValidationError as v:
     )
     exit()
 
-# Add a file handler to the logger if the environment variables were loaded
-# successfully
+# Write the records of the logger to the console and to the log file from a
+# background thread if the environment variables were loaded successfully
 else:
-    # Create a file handler with the log file path specified in env_vars.DEBUG
-    file_handler = logging.FileHandler(env_vars.DEBUG)
+    # Create the pipeline writing to the log file path specified in
+    # env_vars.DEBUG
+    log_pipeline: LogPipeline = create_pipeline(
+        env_vars.DEBUG, format_str, env_vars.LOG_FLUSH_INTERVAL
+    )
 
-    # Create a formatter using the defined format string
-    formatter = logging.Formatter(format_str)
+    # Queue the records of the logger for the pipeline, which also writes
+    # them to the console in place of the handler of basicConfig
+    logger.setLevel(env_vars.LOG_LEVEL)
 
-    # Set the formatter for the file handler
-    file_handler.setFormatter(formatter)
+    # skip collecting the caller, thread and process of every record, the
+    # format uses none of them and the stack walk dominates a record's cost
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    logger.addHandler(log_pipeline.queue_handler)
+    logger.propagate = False
+    log_pipeline.start()
 
-    # Add the file handler to the logger
-    logger.addHandler(file_handler)
+    # Write the slow requests to their own file, from their own pipeline
+    # thread, if the slow query log is enabled
+    if env_vars.SLOW_QUERY_LOG is not None:
+        slow_pipeline: LogPipeline = create_pipeline(
+            env_vars.SLOW_QUERY_LOG,
+            "[%(asctime)s] - %(message)s",
+            env_vars.LOG_FLUSH_INTERVAL,
+            console=False,
+        )
+        slow_logger.addHandler(slow_pipeline.queue_handler)
+        slow_pipeline.start()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+This module contains the asyncio server engine. It serves the same protocol
+from the same database as the threaded Server, handling every connection as a
+coroutine of a single event loop instead of an OS thread so that thousands of
+mostly idle clients stay cheap.
+"""
+import asyncio
+import resource
+import socket
+import time
+from . import logger
+from .database import Database
+from .protocol import BUSY
+from .protocol import READ_SIZE
+from .server import SearchService
+from .session import Received
+from .session import Session
+from .setup import LoadEnv
+from functools import partial
+from ssl import SSLContext
+from typing import Callable
+from typing import Tuple
+from typing import TypeVar
+from typing import Union
+
+T = TypeVar("T")
+
+
+def raise_open_files_limit() -> int:
+    """
+    Raise the soft limit on open file descriptors to the hard limit, every
+    connection holding one.
+
+    Returns:
+        int: The soft limit in effect.
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+            soft = hard
+        except (ValueError, OSError):
+            pass
+    return soft
+
+
+class AsyncServer(SearchService):
+    """
+    A server answering the search queries of every client from an asyncio
+    event loop. The configuration and the database are those of
+    SearchService.
+
+    Attributes:
+        server_address (Tuple[str, int]): The (host, port) the server listens
+                                          on.
+        server (asyncio.Server | None): The listening server, once started.
+        reuse_port (bool): Whether the socket is bound with SO_REUSEPORT.
+        ssl_context (SSLContext | None): The context securing the
+                                         connections, None when SSL is
+                                         disabled.
+        connections (int): The number of open connections.
+    """
+
+    def __init__(
+        self,
+        server_address: Tuple[str, int],
+        env_vars_obj: LoadEnv,
+        database: Union[Database, None] = None,
+        listen_socket: Union[socket.socket, None] = None,
+        reuse_port: bool = False,
+        ssl_context: Union[SSLContext, None] = None,
+    ):
+        """
+        Initialize a new asyncio server instance.
+
+        Args:
+            server_address (tuple): The server address as a (host, port) tuple.
+            env_vars_obj (LoadEnv): An object containing environment variables.
+            database (Database | None): A database loaded beforehand, None to
+                                        load it on start.
+            listen_socket (socket | None): A bound socket to accept from,
+                                           e.g. inherited from a supervisor,
+                                           None to bind a new one.
+            reuse_port (bool): Whether to bind with SO_REUSEPORT so that
+                               several processes listen on the same port.
+            ssl_context (SSLContext | None): A context created beforehand,
+                                             e.g. by the supervisor so that
+                                             its workers share the session
+                                             ticket key, None to create it
+                                             on start.
+        """
+        self.configure(env_vars_obj)
+        self.metrics.gauge(
+            "search_open_connections",
+            "Connections open.",
+            lambda: self.connections,
+        )
+        self.server_address: Tuple[str, int] = server_address
+        self.server: Union[asyncio.Server, None] = None
+        self.reuse_port: bool = reuse_port
+        self.ssl_context: Union[SSLContext, None] = ssl_context
+        self.connections: int = 0
+        self.__database: Union[Database, None] = database
+        self.__listen_socket: Union[socket.socket, None] = listen_socket
+
+    async def start(self) -> None:
+        """
+        Load the database off the event loop, then start listening.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.open_database, self.__database)
+        self.__database = None  # the service holds it from now on
+        limit: int = raise_open_files_limit()
+
+        # secure the server if SSL authentication is set to True
+        if self.ssl_context is None:
+            self.ssl_context = self.load_ssl_context()
+        context: Union[SSLContext, None] = self.ssl_context
+        if self.__listen_socket is not None:
+            self.server = await asyncio.start_server(
+                self.handle,
+                sock=self.__listen_socket,
+                backlog=self.listen_backlog,
+                ssl=context,
+                ssl_handshake_timeout=(
+                    self.handshake_timeout if context else None
+                ),
+            )
+        else:
+            host, port = self.server_address
+            self.server = await asyncio.start_server(
+                self.handle,
+                host,
+                port,
+                backlog=self.listen_backlog,
+                ssl=context,
+                ssl_handshake_timeout=(
+                    self.handshake_timeout if context else None
+                ),
+                reuse_port=self.reuse_port or None,
+            )
+        logger.info(f"asyncio engine serving up to {limit} open files")
+        logger.info("server is up and running, waiting for client sockets")
+
+    async def serve_forever(self) -> None:
+        """
+        Start the server and serve clients until cancelled, then close it.
+        """
+        await self.start()
+        try:
+            async with self.server:  # type: ignore
+                await self.server.serve_forever()  # type: ignore
+        finally:
+            self.close_database()
+
+    async def offload(self, function: Callable[[], T]) -> T:
+        """
+        Run a blocking call, a reload or the lookup of a batch, in the default
+        executor so that it does not stall the event loop. Concurrent reloads
+        are coalesced by the database.
+
+        Args:
+            function (Callable[[], T]): The call.
+
+        Returns:
+            T: Its result.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, function)
+
+    async def read(
+        self,
+        reader: asyncio.StreamReader,
+        partial: bool,
+        timeout: Union[float, None] = None,
+    ) -> Union[Received, None]:
+        """
+        Read whatever the client sent so far. The event loop received the
+        bytes already, the read takes no time of its own.
+
+        Args:
+            reader (asyncio.StreamReader): The stream of the client.
+            partial (bool): Whether the client started a query it did not
+                            finish, it then has the read timeout to send the
+                            rest instead of the idle timeout.
+            timeout (float | None): The seconds to wait instead, if given.
+
+        Returns:
+            Received | None: The bytes read, empty once the client closed the
+                             connection, None if nothing was received within
+                             the timeout given.
+
+        Raises:
+            asyncio.TimeoutError: If nothing was received in time.
+        """
+        wait: float = (
+            timeout
+            if timeout is not None
+            else self.read_timeout if partial else self.idle_timeout
+        )
+        try:
+            data: bytes = await asyncio.wait_for(reader.read(READ_SIZE), wait)
+        except asyncio.TimeoutError:
+            if timeout is None:
+                raise
+            return None
+        # let a cProfile session reach the event loop thread, None unless
+        # profiling
+        hook: Union[Callable[[], None], None] = self.profiler.hook
+        if hook is not None:
+            hook()
+        end: int = time.perf_counter_ns()
+        return Received(data, end, end)
+
+    async def write(self, writer: asyncio.StreamWriter, data: bytes) -> None:
+        """
+        Send answers to the client, which has the read timeout to take them.
+
+        Args:
+            writer (asyncio.StreamWriter): The stream of the client.
+            data (bytes): The answers.
+
+        Raises:
+            asyncio.TimeoutError: If the client does not read them in time.
+        """
+        writer.write(data)
+        await asyncio.wait_for(writer.drain(), self.read_timeout)
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """
+        Handle a client connection, answering its queries until it closes the
+        connection.
+
+        Args:
+            reader (asyncio.StreamReader): The stream of the client queries.
+            writer (asyncio.StreamWriter): The stream of the responses.
+        """
+        client_ip, comm_port = writer.get_extra_info("peername")[:2]
+        ssl_object = writer.get_extra_info("ssl_object")
+        if ssl_object is not None:
+            self.handshakes.record(ssl_object)
+        self.connections += 1
+        try:
+            if self.connections > self.max_connections:
+                logger.error(
+                    "{"
+                    f"client_ip: {client_ip}, "
+                    f"open_connections: {self.connections - 1}, "
+                    "action: server busy, closing connection to client"
+                    "}"
+                )
+                self.metrics.rejected.inc()
+                writer.write(BUSY)
+                return
+            self.metrics.connections.inc()
+
+            # answer the client through the streams of the connection
+            session: Session = Session(
+                self,
+                writer.get_extra_info("peername"),
+                partial(self.read, reader),
+                partial(self.write, writer),
+                self.offload,
+            )
+            await session.serve()
+        except asyncio.TimeoutError:
+            logger.info(
+                "{"
+                f"client_ip: {client_ip}, "
+                f"comm_port: {comm_port}, "
+                "client_error: timed out, "
+                "action: closing connection to client"
+                "}"
+            )
+        except ConnectionError:
+            pass  # the client went away
+        finally:
+            self.connections -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+This module contains the Bloom filter used by the database to answer most
+lookups of missing strings without searching the data.
+"""
+import hashlib
+import math
+from typing import Iterable
+from typing import Union
+
+
+class BloomFilter:
+    """
+    A Bloom filter over strings. A string that was added is always reported
+    as possibly present, a string that was not added is reported as absent
+    except for a false positive rate depending on the size of the filter.
+
+    Attributes:
+        size (int): The number of bits in the filter.
+        hash_count (int): The number of bits set per string.
+        count (int): The number of strings added to the filter.
+        __bits (bytearray): The bits of the filter.
+    """
+
+    __bits: bytearray
+
+    def __init__(
+        self,
+        capacity: int,
+        fp_rate: float = 0.01,
+        max_bytes: Union[int, None] = None,
+    ):
+        """
+        Size a filter for a number of strings and a false positive rate.
+
+        Args:
+            capacity (int): The number of strings the filter is sized for.
+            fp_rate (float): The target false positive rate, in (0, 1).
+            max_bytes (int | None): An upper bound on the memory used by the
+                                    bits, trading a higher false positive
+                                    rate for a smaller filter.
+        """
+        capacity = max(capacity, 1)
+
+        # optimal number of bits and of hash functions for the capacity:
+        # m = -n ln(p) / ln(2)^2 and k = m / n ln(2)
+        size: int = math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2)
+        if max_bytes is not None:
+            size = min(size, max_bytes * 8)
+        self.size: int = max(size, 8)
+        self.hash_count: int = max(
+            1, round(self.size / capacity * math.log(2))
+        )
+        self.count: int = 0
+        self.__bits = bytearray((self.size + 7) // 8)
+
+    @classmethod
+    def from_items(
+        cls,
+        items: Iterable[Union[str, bytes]],
+        capacity: int,
+        fp_rate: float = 0.01,
+        max_bytes: Union[int, None] = None,
+    ) -> "BloomFilter":
+        """
+        Build a filter holding every item of an iterable.
+
+        Args:
+            items (Iterable[str | bytes]): The strings to add.
+            capacity (int): The number of strings the filter is sized for.
+            fp_rate (float): The target false positive rate, in (0, 1).
+            max_bytes (int | None): An upper bound on the memory used.
+
+        Returns:
+            BloomFilter: The filter holding the items.
+        """
+        bloom = cls(capacity, fp_rate, max_bytes)
+        for item in items:
+            bloom.add(item)
+        return bloom
+
+    def __positions(self, key: Union[str, bytes]) -> Iterable[int]:
+        """obtain the bits of a key by double hashing a single digest"""
+        if isinstance(key, str):
+            key = key.encode()
+        digest: bytes = hashlib.blake2b(key, digest_size=16).digest()
+        first: int = int.from_bytes(digest[:8], "little")
+        second: int = int.from_bytes(digest[8:], "little") | 1
+        size: int = self.size
+        return ((first + i * second) % size for i in range(self.hash_count))
+
+    def add(self, key: Union[str, bytes]) -> None:
+        """
+        Add a string to the filter.
+
+        Args:
+            key (str | bytes): The string to add.
+        """
+        bits: bytearray = self.__bits
+        for position in self.__positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: object) -> bool:
+        """
+        Check whether a string may have been added to the filter.
+
+        Args:
+            key (object): The string to check.
+
+        Returns:
+            bool: False if the string was certainly not added, True otherwise.
+        """
+        if not isinstance(key, (str, bytes)):
+            return False
+        bits: bytearray = self.__bits
+        for position in self.__positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes used by the bits of the filter."""
+        return len(self.__bits)
+
+    @property
+    def fp_rate(self) -> float:
+        """The expected false positive rate for the strings added so far."""
+        return (
+            1 - math.exp(-self.hash_count * self.count / self.size)
+        ) ** self.hash_count
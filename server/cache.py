@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+This module contains the query result cache of the database, answering the
+most frequent queries without searching the data again. Every result is
+tagged with the version of the snapshot it was computed on, so a reload of the
+search file invalidates the cache without clearing it.
+"""
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict
+from typing import Tuple
+from typing import Union
+
+# the replacement policies the cache supports
+CACHE_POLICIES = ("lru", "tinylfu")
+
+# multiplier spreading the hash of a key over the rows of the sketch
+SKETCH_MULTIPLIER = 0x9E3779B97F4A7C15
+SKETCH_ROWS = 4
+SKETCH_MAX_COUNT = 15
+
+
+class FrequencySketch:
+    """
+    A count-min sketch estimating how often each key was requested recently.
+    Counters saturate at 15 and are all halved once the number of recorded
+    requests reaches ten times the capacity of the cache, so that keys which
+    stopped being requested lose their weight.
+
+    Attributes:
+        width (int): The number of counters per row, a power of two.
+        sample_size (int): The number of recorded requests between two
+                           halvings of the counters.
+        additions (int): The number of requests recorded since the last
+                         halving.
+        __rows (list): The rows of counters.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        Size a sketch for the capacity of a cache.
+
+        Args:
+            capacity (int): The number of entries of the cache.
+        """
+        self.width: int = 1 << max(4 * capacity - 1, 1).bit_length()
+        self.sample_size: int = 10 * max(capacity, 1)
+        self.additions: int = 0
+        self.__rows = [bytearray(self.width) for _ in range(SKETCH_ROWS)]
+
+    def __indexes(self, key: str) -> Tuple[int, ...]:
+        """obtain the counter of a key in every row"""
+        mask: int = self.width - 1
+        digest: int = hash(key) & 0xFFFFFFFFFFFFFFFF
+        return tuple(
+            (((digest + row) * SKETCH_MULTIPLIER) >> (17 + 9 * row)) & mask
+            for row in range(SKETCH_ROWS)
+        )
+
+    def increment(self, key: str) -> None:
+        """
+        Record a request for a key.
+
+        Args:
+            key (str): The requested key.
+        """
+        for row, idx in zip(self.__rows, self.__indexes(key)):
+            if row[idx] < SKETCH_MAX_COUNT:
+                row[idx] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            # age every counter so the sketch follows the current traffic
+            for row in self.__rows:
+                row[:] = bytes(count >> 1 for count in row)
+            self.additions //= 2
+
+    def frequency(self, key: str) -> int:
+        """
+        Estimate the number of recent requests for a key.
+
+        Args:
+            key (str): The key.
+
+        Returns:
+            int: The smallest counter of the key, never below the real count
+                 unless the counters were aged or saturated.
+        """
+        return min(
+            row[idx] for row, idx in zip(self.__rows, self.__indexes(key))
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes used by the counters."""
+        return self.width * SKETCH_ROWS
+
+
+class QueryCache:
+    """
+    A bounded and thread-safe cache of search results.
+
+    The "lru" policy evicts the least recently used entry when the cache is
+    full. The "tinylfu" policy also keeps the recency order but only admits a
+    new key in place of that entry when the key was requested more often
+    recently, so a burst of one-off queries can not flush the popular ones.
+
+    Attributes:
+        capacity (int): The maximum number of entries.
+        policy (str): The replacement policy, "lru" or "tinylfu".
+        hits (int): The number of lookups answered by the cache.
+        misses (int): The number of lookups that were not, including entries
+                      computed on a previous version of the data.
+        evictions (int): The number of entries evicted to make room.
+        rejections (int): The number of results the "tinylfu" policy did not
+                          admit.
+        __entries (OrderedDict): The version and result of every cached
+                                 query, least recently used first.
+        __sketch (FrequencySketch | None): The request frequencies of the
+                                           "tinylfu" policy.
+        __lock (threading.Lock): The lock guarding the entries and counters.
+    """
+
+    __entries: "OrderedDict[str, Tuple[int, bool]]"
+    __sketch: Union[FrequencySketch, None]
+
+    def __init__(self, capacity: int, policy: str = "lru"):
+        """
+        Initialize an empty cache.
+
+        Args:
+            capacity (int): The maximum number of entries, at least 1.
+            policy (str): The replacement policy, "lru" or "tinylfu".
+
+        Raises:
+            ValueError: If the capacity or the policy is invalid.
+        """
+        if capacity < 1:
+            raise ValueError("cache capacity must be at least 1")
+        if policy not in CACHE_POLICIES:
+            raise ValueError(f"cache policy must be one of {CACHE_POLICIES}")
+        self.capacity: int = capacity
+        self.policy: str = policy
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.rejections: int = 0
+        self.__entries = OrderedDict()
+        self.__sketch = (
+            FrequencySketch(capacity) if policy == "tinylfu" else None
+        )
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of cached entries."""
+        return len(self.__entries)
+
+    def get(self, query: str, version: int) -> Union[bool, None]:
+        """
+        Look up the result of a query on a version of the data.
+
+        Args:
+            query (str): The searched string.
+            version (int): The version of the snapshot the query runs on.
+
+        Returns:
+            bool | None: The cached result, or None if the query is not
+                         cached for this version.
+        """
+        with self.__lock:
+            if self.__sketch is not None:
+                self.__sketch.increment(query)
+            entry: Union[Tuple[int, bool], None] = self.__entries.get(query)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(query)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, query: str, version: int, found: bool) -> None:
+        """
+        Cache the result of a query on a version of the data.
+
+        Args:
+            query (str): The searched string.
+            version (int): The version of the snapshot the result was
+                           computed on.
+            found (bool): The result of the search.
+        """
+        with self.__lock:
+            entries = self.__entries
+            if query in entries:
+                # refresh an entry left over from a previous version
+                entries[query] = (version, found)
+                entries.move_to_end(query)
+                return
+            if len(entries) >= self.capacity:
+                victim: str = next(iter(entries))
+                sketch = self.__sketch
+                if sketch is not None:
+                    # admit the query only if it is more popular than the
+                    # entry it would replace
+                    if sketch.frequency(query) <= sketch.frequency(victim):
+                        self.rejections += 1
+                        return
+                del entries[victim]
+                self.evictions += 1
+            entries[query] = (version, found)
+
+    def clear(self) -> None:
+        """Drop every entry, keeping the counters."""
+        with self.__lock:
+            self.__entries.clear()
+
+    @property
+    def hit_ratio(self) -> float:
+        """The share of lookups answered by the cache."""
+        lookups: int = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def nbytes(self) -> int:
+        """An estimate of the number of bytes used by the cache."""
+        with self.__lock:
+            entries = self.__entries
+            # the versions and booleans are shared small objects
+            size: int = sys.getsizeof(entries) + sum(
+                sys.getsizeof(query) + sys.getsizeof(entry)
+                for query, entry in entries.items()
+            )
+        if self.__sketch is not None:
+            size += self.__sketch.nbytes
+        return size
+
+    def stats(self) -> Dict[str, Union[int, float, str]]:
+        """
+        Obtain the counters of the cache for tuning its size.
+
+        Returns:
+            Dict[str, int | float | str]: The policy, the number of entries,
+                                          hits, misses, evictions and
+                                          rejections, the hit ratio and the
+                                          estimated size in bytes.
+        """
+        return {
+            "policy": self.policy,
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "rejections": self.rejections,
+            "hit_ratio": round(self.hit_ratio, 4),
+            "bytes": self.nbytes,
+        }
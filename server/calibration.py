@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+This module contains the start up benchmark of the "auto" algorithm. It times
+every registered search algorithm on a sample of hits and misses drawn from
+the search file and picks the fastest one for the loaded data and hardware.
+"""
+import random
+import time
+from .search_algorithms import algorithm_names
+from .search_algorithms import get_algorithm
+from .search_algorithms import SearchAlgorithm
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Union
+
+
+class Calibration(NamedTuple):
+    """
+    The outcome of a calibration run.
+
+    Attributes:
+        winner (str): The name of the fastest algorithm.
+        lookup_ns (Dict[str, float]): The mean lookup latency of every
+                                      algorithm in nanoseconds.
+        build_ns (Dict[str, int]): The time taken by every algorithm to build
+                                   its index in nanoseconds.
+        score_ns (Dict[str, float]): The cost per query the algorithms were
+                                     ranked by in nanoseconds.
+    """
+
+    winner: str
+    lookup_ns: Dict[str, float]
+    build_ns: Dict[str, int]
+    score_ns: Dict[str, float]
+
+
+def sample_queries(
+    lines: List[str], sample_size: int, seed: int = 0
+) -> List[str]:
+    """
+    Draw a shuffled sample of hits and misses from the lines of a file.
+
+    The misses are hits with an extra character before their newline, so that
+    they sort next to real lines as most missing queries do.
+
+    Args:
+        lines (List[str]): The lines of the search file.
+        sample_size (int): The number of hits, and of misses, to draw.
+        seed (int): The seed of the sample, for repeatable runs.
+
+    Returns:
+        List[str]: The queries, each ending with a newline.
+    """
+    rng = random.Random(seed)
+    hits: List[str] = [
+        line if line.endswith("\n") else f"{line}\n"
+        for line in rng.sample(lines, min(sample_size, len(lines)))
+    ]
+    existing = set(lines)
+    misses: List[str] = [
+        miss
+        for miss in (f"{hit[:-1]}~\n" for hit in hits)
+        if miss not in existing
+    ]
+    queries: List[str] = hits + misses
+    rng.shuffle(queries)
+    return queries
+
+
+def time_lookups(
+    algorithm: SearchAlgorithm,
+    index: object,
+    queries: List[str],
+    budget_ns: int,
+) -> float:
+    """
+    Measure the mean lookup latency of an algorithm on its index.
+
+    Args:
+        algorithm (SearchAlgorithm): The algorithm.
+        index (object): The index built for the algorithm.
+        queries (List[str]): The queries to look up.
+        budget_ns (int): The time after which the measure stops, so that a
+                         slow algorithm does not delay the start up.
+
+    Returns:
+        float: The mean lookup latency in nanoseconds.
+    """
+    search = algorithm.search
+    done: int = 0
+    start: int = time.perf_counter_ns()
+    elapsed: int = 0
+    for query in queries:
+        search(index, query)
+        done += 1
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= budget_ns:
+            break
+    return elapsed / max(done, 1)
+
+
+def calibrate(
+    file_path: Path,
+    include_rebuild: bool = False,
+    queries_per_reload: int = 1000,
+    sample_size: int = 200,
+    budget_ms: float = 200.0,
+) -> Calibration:
+    """
+    Benchmark every registered algorithm on the search file and pick the
+    fastest one.
+
+    Args:
+        file_path (Path): The path to the search file.
+        include_rebuild (bool): Whether the queries rebuild the index when
+                                the search file changed, as with
+                                REREAD_ON_QUERY, in which case the build time
+                                is spread over queries_per_reload queries and
+                                added to the lookup latency of every
+                                algorithm.
+        queries_per_reload (int): The number of queries expected between two
+                                  changes of the search file.
+        sample_size (int): The number of hits, and of misses, looked up.
+        budget_ms (float): The time spent looking up the sample per
+                           algorithm at most, in milliseconds.
+
+    Returns:
+        Calibration: The winner and the measured latencies.
+    """
+    with open(file_path) as file_obj:
+        lines: List[str] = file_obj.readlines()
+    queries: List[str] = sample_queries(lines, sample_size)
+    budget_ns: int = int(budget_ms * 1_000_000)
+
+    lookup_ns: Dict[str, float] = {}
+    build_ns: Dict[str, int] = {}
+    score_ns: Dict[str, float] = {}
+    builder: Union[Callable[[List[str]], Any], None] = None
+    index: Any = None
+    built_ns: int = 0
+    for name in algorithm_names():
+        algorithm: SearchAlgorithm = get_algorithm(name)
+
+        # consecutive algorithms sharing a builder share its index, a single
+        # index is kept in memory at a time
+        if algorithm.index_builder is not builder:
+            builder = index = None
+            start: int = time.perf_counter_ns()
+            # build from a copy as the database does from a fresh read
+            index = algorithm.index_builder(list(lines))
+            built_ns = time.perf_counter_ns() - start
+            builder = algorithm.index_builder
+        build_ns[name] = built_ns
+
+        lookup_ns[name] = time_lookups(algorithm, index, queries, budget_ns)
+        score_ns[name] = lookup_ns[name] + (
+            build_ns[name] / queries_per_reload if include_rebuild else 0
+        )
+
+    winner: str = min(score_ns, key=score_ns.__getitem__)
+    return Calibration(winner, lookup_ns, build_ns, score_ns)
@@ -1,9 +1,123 @@
 #!/usr/bin/env python3
 """This module contains various search algorithms"""
+import hashlib
 import math
+import os
+import sys
+import threading
+import time
 from pathlib import Path
+from typing import Any
 from typing import Callable
+from typing import Collection
+from typing import Dict
+from typing import NamedTuple
+from typing import Sequence
+from typing import Union
 from typing_extensions import List
+from . import logger
+from .bloom import BloomFilter
+from .cache import QueryCache
+from .metrics import Histogram
+from .storage import build_sorted_copy
+from .storage import index_cache_path
+from .storage import IndexCacheError
+from .storage import iter_lines
+from .storage import load_index_cache
+from .storage import MmapIndex
+from .storage import NumpyIndex
+from .storage import PackedIndex
+from .storage import ScanIndex
+from .storage import sort_lines
+from .storage import SortedBlob
+from .storage import write_index_cache
+
+# the structures the data of a database can be held in
+DataIndex = Union[
+    Collection[str], SortedBlob, MmapIndex, ScanIndex, PackedIndex, NumpyIndex
+]
+
+
+class FileIdentity(NamedTuple):
+    """
+    A cheap fingerprint of the search file used to decide whether the data
+    held in memory is stale.
+
+    Attributes:
+        inode (int): The inode number of the file, changes on atomic replace.
+        size (int): The size of the file in bytes.
+        mtime_ns (int): The last modification time of the file in nanoseconds.
+        checksum (str | None): A digest of the file content, only computed
+                              when content verification is enabled.
+    """
+
+    inode: int
+    size: int
+    mtime_ns: int
+    checksum: Union[str, None] = None
+
+
+class Snapshot(NamedTuple):
+    """
+    An immutable view of the data loaded from the search file. A search reads
+    the current snapshot once and works on it alone, so that a reload swapping
+    in a new one is never seen half done.
+
+    Attributes:
+        version (int): The number of loads of the file, starting at 1.
+        data (DataIndex): The data loaded from the file, sorted or indexed.
+        bloom (BloomFilter | None): The Bloom filter holding every line of the
+                                    data, or None if the filter is disabled.
+        identity (FileIdentity | None): The identity of the file the data was
+                                        loaded from.
+    """
+
+    version: int
+    data: DataIndex
+    bloom: Union[BloomFilter, None]
+    identity: Union[FileIdentity, None]
+
+
+def file_checksum(file_path: Path, chunk_size: int = 1 << 20) -> str:
+    """
+    Compute a digest of the content of a file.
+
+    Args:
+        file_path (Path): The path to the file to digest.
+        chunk_size (int): The number of bytes read per iteration.
+
+    Returns:
+        str: The hexadecimal blake2b digest of the file content.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as file_obj:
+        # read the file in chunks to keep memory usage flat
+        for chunk in iter(lambda: file_obj.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_identity(file_path: Path, checksum: bool = False) -> FileIdentity:
+    """
+    Obtain the identity of a file from its stat information.
+
+    Args:
+        file_path (Path): The path to the file.
+        checksum (bool): Whether to include a digest of the file content.
+
+    Returns:
+        FileIdentity: The identity of the file.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    stat = os.stat(file_path)
+    return FileIdentity(
+        stat.st_ino,
+        stat.st_size,
+        stat.st_mtime_ns,
+        file_checksum(file_path) if checksum else None,
+    )
 
 
 class Database:
@@ -14,20 +128,62 @@ class Database:
     Attributes:
         reread_on_query (bool): Whether to reload the data from the file on
                               each query.
+        verify_checksum (bool): Whether to compare a digest of the file
+                              content on top of its stat information when
+                              looking for changes.
+        storage (str): Where the data is held, "memory" for the structure
+                              built by the sorting algorithm, "compact" for a
+                              single bytes blob of the sorted lines and their
+                              offsets, "mmap" for a sorted copy of the file
+                              mapped into memory, "scan" for the file itself
+                              mapped into memory and scanned on every query,
+                              "packed" for records packed into sorted integer
+                              keys or "numpy" for a sorted array of fixed
+                              width lines searched a batch at a time.
+        block_size (int): The approximate number of bytes per block of the
+                              sparse index of the "mmap" storage.
+        index_cache (bool): Whether the "compact" storage is loaded from, and
+                              saved to, an index cache file next to the data
+                              file instead of being sorted on every start.
+        bloom_fp_rate (float | None): The false positive rate of the Bloom
+                              filter checked before every search, None when
+                              the filter is disabled.
+        bloom_max_bytes (int | None): An upper bound on the memory used by
+                              the Bloom filter.
+        bloom_skips (int): The number of searches answered by the filter.
+        bloom_passes (int): The number of searches the filter let through.
+        bloom_false_positives (int): The number of searches the filter let
+                              through for a string that was not found.
+        cache (QueryCache | None): The cache of search results in front of
+                              the data, None when it is disabled.
+        reload_duration (Histogram): The seconds taken by every load of the
+                              data, the first one included.
         __path (Path): The path to the file containing the data.
-        sorting_algorithm (Callable[[List[str]], List[str]]): A function to
-                              sort the data.
-        __data (List[str]): The data loaded from the file, sorted.
+        sorting_algorithm (Callable[[List[str]], Collection[str]]): A function
+                              to sort the data, or to build the index the
+                              search algorithm works on (e.g. frozenset).
+        __snapshot (Snapshot): The data currently served, replaced as a whole
+                              by every reload.
+        __reload_lock (threading.Lock): The lock letting a single thread
+                              rebuild the data at a time.
     """
 
-    __data: List[str]
     __path: Path
+    __snapshot: Snapshot
+    __reload_lock: threading.Lock
 
     def __init__(
         self,
         reread_on_query: bool,
         file_path: Path,
-        sorting_algorithm: Callable[[List[str]], List[str]],
+        sorting_algorithm: Callable[[List[str]], Collection[str]],
+        verify_checksum: bool = False,
+        storage: str = "memory",
+        block_size: int = 4096,
+        index_cache: bool = False,
+        bloom_fp_rate: Union[float, None] = None,
+        bloom_max_bytes: Union[int, None] = None,
+        cache: Union[QueryCache, None] = None,
     ):
         """
         Initializes the Database with the given parameters, reads and sorts
@@ -37,43 +193,359 @@ class Database:
             reread_on_query (bool): Whether to reload the data from the file on
                                   each query.
             file_path (Path): The path to the file containing the data.
-            sorting_algorithm (Callable[[List[str]], List[str]]): A function to
-                                  sort the data.
+            sorting_algorithm (Callable[[List[str]], Collection[str]]): A
+                                  function to sort the data, or to build the
+                                  index searched by the algorithm.
+            verify_checksum (bool): Whether to compare a digest of the file
+                                  content when the stat information of the
+                                  file is unchanged.
+            storage (str): Where the data is held, "memory", "compact",
+                                  "mmap", "scan", "packed" or "numpy". The
+                                  sorting algorithm is only used by the
+                                  "memory" storage, the others compare the
+                                  lines as bytes or packed keys.
+            block_size (int): The approximate number of bytes per block of
+                                  the sparse index of the "mmap" storage.
+            index_cache (bool): Whether to load the "compact" storage from an
+                                  index cache file, building it if it is
+                                  missing, stale or corrupt.
+            bloom_fp_rate (float | None): The false positive rate of a Bloom
+                                  filter rejecting missing strings before
+                                  they are searched, None to disable it.
+            bloom_max_bytes (int | None): An upper bound on the memory used
+                                  by the Bloom filter.
+            cache (QueryCache | None): A cache of search results consulted
+                                  before the data, its entries are tied to
+                                  the version of the data they were found in.
         """
         self.reread_on_query: bool = reread_on_query
+        self.verify_checksum: bool = verify_checksum
+        self.storage: str = storage
+        self.block_size: int = block_size
+        self.index_cache: bool = index_cache
+        self.bloom_fp_rate: Union[float, None] = bloom_fp_rate
+        self.bloom_max_bytes: Union[int, None] = bloom_max_bytes
+        self.bloom_skips: int = 0
+        self.bloom_passes: int = 0
+        self.bloom_false_positives: int = 0
+        self.cache: Union[QueryCache, None] = cache
+        self.reload_duration: Histogram = Histogram(
+            "search_reload_duration_seconds",
+            "Seconds taken to load the search file.",
+        )
         self.__path: Path = file_path
-        self.sorting_algorithm: Callable[[List[str]], List[str]] = (
+        self.sorting_algorithm: Callable[[List[str]], Collection[str]] = (
             sorting_algorithm
         )
-        self.__data = []
+        self.__snapshot = Snapshot(0, [], None, None)
+        self.__reload_lock = threading.Lock()
         self.reload()
 
+    @property
+    def path(self) -> Path:
+        """The path to the file containing the data."""
+        return self.__path
+
+    @property
+    def identity(self) -> Union[FileIdentity, None]:
+        """The identity of the file the current data was loaded from."""
+        return self.__snapshot.identity
+
+    @property
+    def snapshot(self) -> Snapshot:
+        """The data currently served."""
+        return self.__snapshot
+
     def search(
         self,
-        search_algo: Callable[[List[str], str], bool],
+        search_algo: Callable[[Any, str], bool],
         search_str: str = "",
+        refresh: bool = True,
     ):
         """
         Search for the existence of a string in the data using a designated
         search algorithm.
 
         Args:
-            search_algo (Callable[[List[str], str], bool]): The search
-                                algorithm function to use.
+            search_algo (Callable[[Any, str], bool]): The search
+                                algorithm function to use, it must accept the
+                                index built by the sorting algorithm.
             search_str (str): The string to search for.
+            refresh (bool): Whether to check the file for changes first when
+                                rereading on query, False when the caller
+                                refreshed the data itself, e.g. once for a
+                                batch of queries.
 
         Returns:
             bool: True if the string is found, False otherwise.
         """
-        if self.reread_on_query:
-            self.reload()  # Reload data if reread_on_query is True
+        if self.reread_on_query and refresh:
+            self.refresh()  # Reload data if the file changed since last load
+        snapshot: Snapshot = self.__snapshot
+        cache: Union[QueryCache, None] = self.cache
+        if cache is None:
+            return self.__lookup(snapshot, search_algo, search_str)
+
+        # a result cached for an older snapshot counts as a miss
+        cached: Union[bool, None] = cache.get(search_str, snapshot.version)
+        if cached is not None:
+            return cached
+        found: bool = self.__lookup(snapshot, search_algo, search_str)
+        cache.put(search_str, snapshot.version, found)
+        return found
+
+    def search_many(
+        self,
+        search_algo: Callable[[Any, str], bool],
+        search_strs: Sequence[str],
+        refresh: bool = True,
+    ) -> List[bool]:
+        """
+        Search for the existence of a batch of strings in the data, the file
+        being checked for changes once for the whole batch. The "numpy"
+        storage resolves the batch in a single vectorized search.
+
+        Args:
+            search_algo (Callable[[Any, str], bool]): The search
+                                algorithm function to use for storages that
+                                can not search a batch at once.
+            search_strs (Sequence[str]): The strings to search for.
+            refresh (bool): Whether to check the file for changes first when
+                            rereading on query.
+
+        Returns:
+            List[bool]: For every string, True if it is found, False
+                        otherwise.
+        """
+        if self.reread_on_query and refresh:
+            self.refresh()  # Reload data if the file changed since last load
+        # the whole batch is answered from the same snapshot
+        snapshot: Snapshot = self.__snapshot
+        if isinstance(snapshot.data, NumpyIndex):
+            return snapshot.data.search_many(search_strs).tolist()
+        return [
+            self.__lookup(snapshot, search_algo, search_str)
+            for search_str in search_strs
+        ]
+
+    def __lookup(
+        self,
+        snapshot: Snapshot,
+        search_algo: Callable[[Any, str], bool],
+        search_str: str,
+    ) -> bool:
+        """search a snapshot for a string, through its Bloom filter"""
+        # the counters are updated without a lock to keep it off the query
+        # path, they may be slightly off under concurrent queries
+        bloom: Union[BloomFilter, None] = snapshot.bloom
+        if bloom is not None:
+            if search_str not in bloom:
+                self.bloom_skips += 1
+                return False
+            self.bloom_passes += 1
+
+        # every storage but "memory" runs its own search
+        if self.storage != "memory":
+            found: bool = search_str in snapshot.data
+        else:
+            found = search_algo(snapshot.data, search_str)
+        if bloom is not None and not found:
+            self.bloom_false_positives += 1
+        return found
+
+    def bloom_stats(self) -> Dict[str, Union[int, float]]:
+        """
+        Obtain the counters of the Bloom filter for tuning its size.
+
+        Returns:
+            Dict[str, int | float]: The number of skipped, passed and falsely
+                                    passed searches, the size of the filter
+                                    in bytes and its expected false positive
+                                    rate.
+        """
+        bloom: Union[BloomFilter, None] = self.__snapshot.bloom
+        return {
+            "skips": self.bloom_skips,
+            "passes": self.bloom_passes,
+            "false_positives": self.bloom_false_positives,
+            "bytes": bloom.nbytes if bloom is not None else 0,
+            "expected_fp_rate": bloom.fp_rate if bloom is not None else 0.0,
+        }
+
+    def memory_footprint(self) -> int:
+        """
+        Estimate the number of bytes used to hold the data.
+
+        Returns:
+            int: The size of the storage structure, including every line for
+                 the "memory" storage and the mapped file otherwise.
+        """
+        data: DataIndex = self.__snapshot.data
+        if isinstance(
+            data, (SortedBlob, MmapIndex, ScanIndex, PackedIndex, NumpyIndex)
+        ):
+            return data.nbytes
+        return sys.getsizeof(data) + sum(sys.getsizeof(line) for line in data)
+
+    def is_stale(self) -> bool:
+        """
+        Check whether the file changed since the data was last loaded.
+
+        Returns:
+            bool: True if the file identity differs from the loaded one.
+        """
+        if not self.__path.is_file():
+            raise FileNotFoundError("Cannot find search file")
+        current: FileIdentity = file_identity(self.__path)
+        loaded: Union[FileIdentity, None] = self.__snapshot.identity
+        if loaded is None or current[:3] != loaded[:3]:
+            return True
 
-        return search_algo(self.__data, search_str)
+        # the stat information can not see an in-place rewrite of the same
+        # size within the timestamp granularity, the digest can
+        if self.verify_checksum:
+            return file_checksum(self.__path) != loaded.checksum
+        return False
+
+    def refresh(self) -> bool:
+        """
+        Reload the data only if the file changed since it was last loaded.
+
+        Concurrent calls are coalesced, a single thread rebuilds the data
+        while the others wait for it and then use the new snapshot instead of
+        rebuilding it again.
+
+        Returns:
+            bool: True if this call reloaded the data, False otherwise.
+        """
+        # the version is read before the check so that a reload finishing in
+        # between is noticed below
+        version: int = self.__snapshot.version
+        if not self.is_stale():
+            return False
+        with self.__reload_lock:
+            if self.__snapshot.version != version and not self.is_stale():
+                return False  # another thread reloaded the change
+            self.__rebuild()
+        return True
 
     def reload(self) -> None:
         """method to read the file into memory again"""
+        with self.__reload_lock:
+            self.__rebuild()
+
+    def __rebuild(self) -> None:
+        """read the file and swap in a new snapshot, under the reload lock"""
         if not self.__path.is_file():
             raise FileNotFoundError("Cannot find search file")
-        with open(self.__path) as file_obj:
-            data = file_obj.readlines()
-            self.__data = self.sorting_algorithm(data)  # sort the data
+        start: int = time.perf_counter_ns()
+
+        # take the identity before reading so that a change made while the
+        # file is being read is picked up by the next refresh
+        identity = file_identity(self.__path, self.verify_checksum)
+        data: DataIndex
+        if self.storage == "scan":
+            # mapping the file is all there is to load
+            data = ScanIndex(self.__path)
+        elif self.storage == "packed":
+            data = PackedIndex(self.__path)
+        elif self.storage == "numpy":
+            data = NumpyIndex(self.__path)
+        elif self.storage == "mmap":
+            # a mapping still used by a search is closed once released
+            data = MmapIndex(
+                build_sorted_copy(self.__path, identity), self.block_size
+            )
+        elif self.storage == "compact":
+            data = (
+                self.__load_index_cache(identity)
+                if self.index_cache
+                else SortedBlob.from_file(self.__path)
+            )
+        else:
+            with open(self.__path) as file_obj:
+                # sort the data or build the index
+                data = self.sorting_algorithm(file_obj.readlines())
+
+        # a single assignment publishes the data with its filter, searches
+        # still holding the previous snapshot finish on it
+        self.__snapshot = Snapshot(
+            self.__snapshot.version + 1,
+            data,
+            self.__build_bloom(data),
+            identity,
+        )
+        self.reload_duration.observe(time.perf_counter_ns() - start)
+
+    def __build_bloom(self, data: DataIndex) -> Union[BloomFilter, None]:
+        """
+        Build the Bloom filter of freshly loaded data.
+
+        Args:
+            data (DataIndex): The data.
+
+        Returns:
+            BloomFilter | None: The filter holding every line of the data, or
+                                None if the filter is disabled.
+        """
+        if self.bloom_fp_rate is None:
+            return None
+        if isinstance(data, (MmapIndex, ScanIndex, PackedIndex, NumpyIndex)):
+            # stream the lines of the file the index was built from
+            return BloomFilter.from_items(
+                iter_lines(data.path),
+                sum(1 for _ in iter_lines(data.path)),
+                self.bloom_fp_rate,
+                self.bloom_max_bytes,
+            )
+        if isinstance(data, SortedBlob):
+            return BloomFilter.from_items(
+                (data.record(idx) for idx in range(len(data))),
+                len(data),
+                self.bloom_fp_rate,
+                self.bloom_max_bytes,
+            )
+        return BloomFilter.from_items(
+            data, len(data), self.bloom_fp_rate, self.bloom_max_bytes
+        )
+
+    def __load_index_cache(self, identity: FileIdentity) -> SortedBlob:
+        """
+        Load the sorted lines from the index cache file, rebuilding it when it
+        does not match the content of the data file.
+
+        Args:
+            identity (FileIdentity): The identity of the data file.
+
+        Returns:
+            SortedBlob: The sorted lines, backed by the mapping of the cache
+                        file unless it could not be written.
+        """
+        cache_path: Path = index_cache_path(self.__path)
+
+        # hash the content that gets sorted so the cache matches it exactly
+        with open(self.__path, "rb") as file_obj:
+            content: bytes = file_obj.read()
+        size: int = len(content)
+        digest: bytes = hashlib.blake2b(content, digest_size=16).digest()
+        try:
+            return load_index_cache(cache_path, size, digest)
+        except IndexCacheError as e:
+            logger.info(f"rebuilding index cache '{cache_path}': {e}")
+
+        lines: List[bytes] = sort_lines(content)
+        del content
+        try:
+            write_index_cache(
+                cache_path, lines, size, identity.mtime_ns, digest
+            )
+            return load_index_cache(cache_path, size, digest)
+        except (OSError, IndexCacheError) as e:
+            # keep serving from memory when the cache can not be written
+            logger.error(
+                "{"
+                f"index_cache_error: {str(e)}, "
+                "action: serving sorted lines from memory"
+                "}"
+            )
+            return SortedBlob.from_lines(lines)
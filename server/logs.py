@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+This module contains the log pipeline of the server. The threads serving the
+clients only put their records on a queue, a single background thread formats
+them and writes them to the console and to the log file, flushing both at a
+fixed interval rather than after every record. A record is only formatted by
+the background thread, so the arguments of a record that is not logged are
+never formatted at all.
+"""
+import atexit
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler
+from pathlib import Path
+from typing import List
+from typing import Union
+
+# number of records waiting to be written at most, records logged while the
+# queue is full are dropped rather than blocking the caller
+LOG_QUEUE_SIZE = 100_000
+
+# the levels LOG_LEVEL accepts
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+# the records of a query and of a batch of the binary protocol, formatted by
+# the pipeline thread only
+QUERY_LOG_FORMAT = (
+    "{client_ip: %s, comm_port: %s, query: %s, duration(ms): %s}"
+)
+BATCH_LOG_FORMAT = (
+    "{client_ip: %s, comm_port: %s, batch: %s, found: %s, duration(ms): %s}"
+)
+
+
+class DeferredFlush:
+    """
+    A handler mixin leaving the flushes of its stream to the log pipeline,
+    logging flushes a stream after every record otherwise.
+    """
+
+    def flush(self) -> None:
+        """skip the flush following every record"""
+
+    def sync(self) -> None:
+        """flush the records written so far"""
+        try:
+            super().flush()  # type: ignore
+        except (OSError, ValueError):
+            pass  # the stream was closed, e.g. at exit
+
+
+class DeferredStreamHandler(DeferredFlush, logging.StreamHandler):
+    """A stream handler flushed by the log pipeline."""
+
+
+class DeferredFileHandler(DeferredFlush, logging.FileHandler):
+    """A file handler flushed by the log pipeline."""
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    A queue handler dropping the records it can not queue instead of
+    blocking, and leaving them unformatted.
+
+    Attributes:
+        dropped (int): The number of records dropped.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        """
+        Initialize a handler putting records on a queue.
+
+        Args:
+            log_queue (queue.Queue): The queue of the log pipeline.
+        """
+        super().__init__(log_queue)
+        self.dropped: int = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Queue the record as is, it is formatted by the pipeline thread.
+
+        Args:
+            record (logging.LogRecord): The record.
+
+        Returns:
+            logging.LogRecord: The same record.
+        """
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """
+        Put a record on the queue, dropping it if the queue is full.
+
+        Args:
+            record (logging.LogRecord): The record.
+        """
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """
+    The background thread writing the records of a logger.
+
+    Attributes:
+        handlers (List[logging.Handler]): The handlers writing the records.
+        flush_interval (float): The number of seconds between two flushes of
+                                the handlers.
+        queue_handler (DroppingQueueHandler): The handler of the logger,
+                                              putting its records on the
+                                              queue.
+        __queue (queue.Queue): The queue of the records, that of the queue
+                               handler.
+        __thread (threading.Thread | None): The pipeline thread, once
+                                            started.
+    """
+
+    def __init__(
+        self,
+        handlers: List[logging.Handler],
+        flush_interval: float = 1.0,
+        queue_size: int = LOG_QUEUE_SIZE,
+    ):
+        """
+        Initialize a pipeline writing to handlers.
+
+        Args:
+            handlers (List[logging.Handler]): The handlers writing the
+                                              records.
+            flush_interval (float): The number of seconds between two flushes
+                                    of the handlers.
+            queue_size (int): The number of records waiting to be written at
+                              most.
+        """
+        self.handlers: List[logging.Handler] = handlers
+        self.flush_interval: float = flush_interval
+        self.__queue: queue.Queue = queue.Queue(queue_size)
+        self.queue_handler: DroppingQueueHandler = DroppingQueueHandler(
+            self.__queue
+        )
+        self.__queue_size: int = queue_size
+        self.__thread: Union[threading.Thread, None] = None
+
+    def start(self) -> None:
+        """
+        Start the pipeline thread, and again in every forked child since
+        threads do not survive a fork.
+        """
+        self.__start_thread()
+        if hasattr(os, "register_at_fork"):
+            # flush before forking and hold the handlers until the fork is
+            # done, so the child does not write the buffered records of the
+            # parent again
+            os.register_at_fork(
+                before=self.__hold_handlers,
+                after_in_parent=self.__release_handlers,
+                after_in_child=self.__restart_in_child,
+            )
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """
+        Write the queued records, stop the pipeline thread and flush the
+        handlers, warning of the records dropped while the queue was full.
+        """
+        thread: Union[threading.Thread, None] = self.__thread
+        if thread is None:
+            return
+        self.__thread = None
+        self.__queue.put(None)  # wake the thread and stop it
+        thread.join()
+        dropped: int = self.queue_handler.dropped
+        if dropped:
+            self.__write(
+                logging.makeLogRecord(
+                    {
+                        "levelno": logging.WARNING,
+                        "levelname": logging.getLevelName(logging.WARNING),
+                        "msg": f"{dropped} log records dropped, the log "
+                        "queue was full",
+                    }
+                )
+            )
+        self.sync()
+
+    def sync(self) -> None:
+        """
+        Flush the records written so far by the handlers.
+        """
+        for handler in self.handlers:
+            sync = getattr(handler, "sync", handler.flush)
+            handler.acquire()
+            try:
+                sync()
+            finally:
+                handler.release()
+
+    def __hold_handlers(self) -> None:
+        """flush the handlers and keep the pipeline thread from writing to
+        them until the fork is done"""
+        for handler in self.handlers:
+            handler.acquire()
+            getattr(handler, "sync", handler.flush)()
+
+    def __release_handlers(self) -> None:
+        """let the pipeline thread write to the handlers again"""
+        for handler in self.handlers:
+            try:
+                handler.release()
+            except RuntimeError:
+                pass  # the lock was recreated by logging in a forked child
+
+    def __start_thread(self) -> None:
+        """start the thread writing the queued records"""
+        self.__thread = threading.Thread(
+            target=self.__run, name="log-pipeline", daemon=True
+        )
+        self.__thread.start()
+
+    def __restart_in_child(self) -> None:
+        """give a forked child a new queue and thread, the queue of the
+        parent may be locked by its pipeline thread"""
+        self.__release_handlers()
+        if self.__thread is None:
+            return
+        self.__queue = queue.Queue(self.__queue_size)
+        self.queue_handler.queue = self.__queue
+        self.queue_handler.dropped = 0
+        self.__start_thread()
+
+    def __run(self) -> None:
+        """write the queued records, flushing the handlers every interval"""
+        log_queue: queue.Queue = self.__queue
+        deadline: float = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                record = log_queue.get(
+                    timeout=max(deadline - time.monotonic(), 0.0)
+                )
+            except queue.Empty:
+                record = False
+            if record is None:
+                break
+            if record:
+                self.__write(record)
+            if time.monotonic() >= deadline:
+                self.sync()
+                deadline = time.monotonic() + self.flush_interval
+
+    def __write(self, record: logging.LogRecord) -> None:
+        """write a record to the handlers of its level"""
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+def create_pipeline(
+    log_file: Path,
+    log_format: str,
+    flush_interval: float,
+    console: bool = True,
+) -> LogPipeline:
+    """
+    Create the pipeline writing to the console and to the log file.
+
+    Args:
+        log_file (Path): The path to the log file.
+        log_format (str): The format of the records.
+        flush_interval (float): The number of seconds between two flushes.
+        console (bool): Whether the records are also written to the console.
+
+    Returns:
+        LogPipeline: The pipeline, not started.
+    """
+    formatter = logging.Formatter(log_format)
+    handlers: List[logging.Handler] = [DeferredFileHandler(log_file)]
+    if console:
+        handlers.insert(0, DeferredStreamHandler(sys.stderr))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return LogPipeline(handlers, flush_interval)
+
+
+def sample(rate: float) -> bool:
+    """
+    Decide whether to log a query.
+
+    Args:
+        rate (float): The share of the queries logged.
+
+    Returns:
+        bool: True to log the query.
+    """
+    return rate >= 1.0 or random.random() < rate
@@ -0,0 +1,670 @@
+#!/usr/bin/env python3
+"""
+This module contains the metrics of the server: counters, gauges and latency
+histograms kept in process and exposed in the Prometheus text format, over
+HTTP on an optional local port or in the log on SIGHUP.
+
+Recording a value must not slow the queries down, so counters and histograms
+keep a cell per thread which only that thread writes, without any lock. The
+cells are summed when the metrics are collected. Histograms are log-linear
+(as in HdrHistogram): every power of two is split into 2 ** sub_bucket_bits
+buckets of equal width, so every value is recorded within a fixed relative
+error (6.25% with the default 4 bits) whatever its magnitude, in a bounded
+number of buckets.
+"""
+import math
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Union
+
+# content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# number of linear buckets per power of two of a histogram, as a power of two
+SUB_BUCKET_BITS = 4
+
+# values recorded by a histogram are capped to 2 ** MAX_VALUE_BITS - 1, about
+# 4.9 hours in nanoseconds
+MAX_VALUE_BITS = 44
+
+# the quantiles reported when the metrics are dumped
+DUMP_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Counter:
+    """
+    A counter that only goes up, incremented without a lock.
+
+    Attributes:
+        name (str): The name of the counter, ending with "_total".
+        help (str): The description of the counter.
+        key (str): The key of the counter in a registry, its name.
+        __local (threading.local): The cell of the calling thread.
+        __cells (List[List[int]]): The cell of every thread which counted.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        """
+        Initialize a counter at zero.
+
+        Args:
+            name (str): The name of the counter.
+            help (str): The description of the counter.
+        """
+        self.name: str = name
+        self.help: str = help
+        self.key: str = name
+        self.__local = threading.local()
+        self.__cells: List[List[int]] = []
+        self.__lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        """
+        Add to the counter.
+
+        Args:
+            amount (int): The amount added.
+        """
+        try:
+            self.__local.cell[0] += amount
+        except AttributeError:
+            self.__new_cell()[0] += amount
+
+    @property
+    def value(self) -> int:
+        """The sum of the counts of every thread."""
+        with self.__lock:
+            cells: List[List[int]] = list(self.__cells)
+        return sum(cell[0] for cell in cells)
+
+    def samples(self) -> List[Tuple[str, Union[int, float]]]:
+        """
+        Collect the counter.
+
+        Returns:
+            List[Tuple[str, int | float]]: The sample of the counter.
+        """
+        return [(self.name, self.value)]
+
+    def __new_cell(self) -> List[int]:
+        """give the calling thread its own cell, kept after it exits"""
+        cell: List[int] = [0]
+        with self.__lock:
+            self.__cells.append(cell)
+        self.__local.cell = cell
+        return cell
+
+
+class Gauge:
+    """
+    A value which goes up and down, read from a function when collected.
+
+    Attributes:
+        name (str): The name of the gauge.
+        help (str): The description of the gauge.
+        key (str): The key of the gauge in a registry, its name.
+        func (Callable[[], int | float]): The function returning its value.
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self, name: str, help: str, func: Callable[[], Union[int, float]]
+    ):
+        """
+        Initialize a gauge.
+
+        Args:
+            name (str): The name of the gauge.
+            help (str): The description of the gauge.
+            func (Callable[[], int | float]): The function returning its
+                                              value.
+        """
+        self.name: str = name
+        self.help: str = help
+        self.key: str = name
+        self.func: Callable[[], Union[int, float]] = func
+
+    @property
+    def value(self) -> Union[int, float]:
+        """The current value of the gauge."""
+        return self.func()
+
+    def samples(self) -> List[Tuple[str, Union[int, float]]]:
+        """
+        Collect the gauge.
+
+        Returns:
+            List[Tuple[str, int | float]]: The sample of the gauge.
+        """
+        return [(self.name, self.value)]
+
+
+class Histogram:
+    """
+    A log-linear histogram of integer values, recorded without a lock.
+
+    Attributes:
+        name (str): The name of the histogram.
+        help (str): The description of the histogram.
+        labels (Dict[str, str]): The labels telling apart the histograms of
+                                 the same name.
+        key (str): The key of the histogram in a registry, its name and
+                   labels.
+        scale (float): The number of recorded units per exposed unit, 1e9 for
+                       durations recorded in nanoseconds and exposed in
+                       seconds.
+        sub_bucket_bits (int): The number of linear buckets per power of two,
+                               as a power of two.
+        size (int): The number of buckets.
+        __local (threading.local): The cell of the calling thread.
+        __cells (List[List[int]]): The cell of every thread which recorded a
+                                   value, the count of every bucket followed
+                                   by the sum of the values.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        scale: float = 1e9,
+        sub_bucket_bits: int = SUB_BUCKET_BITS,
+        labels: Union[Dict[str, str], None] = None,
+    ):
+        """
+        Initialize an empty histogram.
+
+        Args:
+            name (str): The name of the histogram.
+            help (str): The description of the histogram.
+            scale (float): The number of recorded units per exposed unit.
+            sub_bucket_bits (int): The number of linear buckets per power of
+                                   two, as a power of two.
+            labels (Dict[str, str] | None): The labels telling apart the
+                                            histograms of the same name.
+        """
+        self.name: str = name
+        self.help: str = help
+        self.labels: Dict[str, str] = labels or {}
+        self.key: str = name + (
+            f"{{{self.__label_pairs()}}}" if self.labels else ""
+        )
+        self.scale: float = scale
+        self.sub_bucket_bits: int = sub_bucket_bits
+        self.size: int = self.bucket(2**MAX_VALUE_BITS - 1) + 1
+        self.__linear_bits: int = sub_bucket_bits + 1
+        self.__local = threading.local()
+        self.__cells: List[List[int]] = []
+        self.__lock = threading.Lock()
+
+    def bucket(self, value: int) -> int:
+        """
+        Find the bucket of a value.
+
+        Args:
+            value (int): The value, not negative.
+
+        Returns:
+            int: The index of its bucket.
+        """
+        # values below 2 ** (sub_bucket_bits + 1) have a bucket each, above
+        # the top sub_bucket_bits + 1 bits of a value pick its bucket within
+        # the buckets of its power of two
+        shift: int = value.bit_length() - self.sub_bucket_bits - 1
+        if shift <= 0:
+            return value
+        return (shift << self.sub_bucket_bits) + (value >> shift)
+
+    def bounds(self, index: int) -> Tuple[int, int]:
+        """
+        Compute the range of the values of a bucket.
+
+        Args:
+            index (int): The index of the bucket.
+
+        Returns:
+            Tuple[int, int]: The lowest and the highest value of the bucket.
+        """
+        shift: int = (index >> self.sub_bucket_bits) - 1
+        if shift <= 0:
+            return index, index
+        lowest: int = (index - (shift << self.sub_bucket_bits)) << shift
+        return lowest, lowest + (1 << shift) - 1
+
+    def observe(self, value: int, count: int = 1) -> None:
+        """
+        Record a value.
+
+        Args:
+            value (int): The value, e.g. a duration in nanoseconds. Negative
+                         values are recorded as 0, values beyond the last
+                         bucket in the last bucket.
+            count (int): The number of times the value is recorded.
+        """
+        try:
+            cell: List[int] = self.__local.cell
+        except AttributeError:
+            cell = self.__new_cell()
+        # the bucket is found inline, this runs for every query
+        if 0 <= value < 1 << MAX_VALUE_BITS:
+            shift: int = value.bit_length() - self.__linear_bits
+            if shift <= 0:
+                cell[value] += count
+            else:
+                cell[
+                    (shift << self.sub_bucket_bits) + (value >> shift)
+                ] += count
+        else:
+            value = 0 if value < 0 else (1 << MAX_VALUE_BITS) - 1
+            cell[self.bucket(value)] += count
+        cell[-1] += value * count
+
+    def counts(self) -> Tuple[List[int], int]:
+        """
+        Merge the cells of every thread.
+
+        Returns:
+            Tuple[List[int], int]: The count of every bucket and the sum of
+                                   the values recorded.
+        """
+        with self.__lock:
+            cells: List[List[int]] = list(self.__cells)
+        merged: List[int] = [sum(counts) for counts in zip(*cells)]
+        if not merged:
+            return [0] * self.size, 0
+        return merged[:-1], merged[-1]
+
+    @property
+    def count(self) -> int:
+        """The number of values recorded."""
+        return sum(self.counts()[0])
+
+    def quantile(self, q: float) -> Union[float, None]:
+        """
+        Estimate a quantile of the values recorded.
+
+        Args:
+            q (float): The quantile, between 0 and 1.
+
+        Returns:
+            float | None: The highest value of the bucket holding the
+                          quantile in exposed units, None when nothing was
+                          recorded.
+        """
+        counts, _ = self.counts()
+        total: int = sum(counts)
+        if not total:
+            return None
+        rank: int = max(math.ceil(q * total), 1)
+        seen: int = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return self.bounds(index)[1] / self.scale
+        return None  # unreachable, seen ends at total
+
+    def samples(self) -> List[Tuple[str, Union[int, float]]]:
+        """
+        Collect the histogram as the cumulative buckets of the Prometheus
+        text format, leaving out the buckets which hold no value.
+
+        Returns:
+            List[Tuple[str, int | float]]: The samples of the histogram.
+        """
+        counts, total_sum = self.counts()
+        pairs: str = self.__label_pairs()
+        bucket: str = (
+            f"{self.name}_bucket{{{pairs},le="
+            if pairs
+            else (f"{self.name}_bucket{{le=")
+        )
+        labels: str = f"{{{pairs}}}" if pairs else ""
+        samples: List[Tuple[str, Union[int, float]]] = []
+        cumulative: int = 0
+        for index, count in enumerate(counts):
+            if count:
+                cumulative += count
+                upper: float = self.bounds(index)[1] / self.scale
+                samples.append((f'{bucket}"{upper:.9g}"}}', cumulative))
+        samples.append((f'{bucket}"+Inf"}}', cumulative))
+        samples.append((f"{self.name}_sum{labels}", total_sum / self.scale))
+        samples.append((f"{self.name}_count{labels}", cumulative))
+        return samples
+
+    def summary(self) -> Dict[str, Union[int, float, None]]:
+        """
+        Summarize the histogram for the log.
+
+        Returns:
+            Dict[str, int | float | None]: The number of values, their mean
+                                           and their DUMP_QUANTILES, in
+                                           exposed units.
+        """
+        counts, total_sum = self.counts()
+        total: int = sum(counts)
+        summary: Dict[str, Union[int, float, None]] = {"count": total}
+        summary["mean"] = (
+            float(f"{total_sum / total / self.scale:.4g}") if total else None
+        )
+        for q in DUMP_QUANTILES:
+            value: Union[float, None] = self.quantile(q)
+            summary[f"p{q * 100:g}"] = (
+                None if value is None else float(f"{value:.4g}")
+            )
+        return summary
+
+    def __label_pairs(self) -> str:
+        """format the labels as in the Prometheus text format"""
+        return ",".join(
+            f'{key}="{value}"' for key, value in self.labels.items()
+        )
+
+    def __new_cell(self) -> List[int]:
+        """give the calling thread its own cell, kept after it exits"""
+        cell: List[int] = [0] * (self.size + 1)
+        with self.__lock:
+            self.__cells.append(cell)
+        self.__local.cell = cell
+        return cell
+
+
+# the kinds of metrics a registry holds
+Metric = Union[Counter, Gauge, Histogram]
+
+
+class MetricsRegistry:
+    """
+    The metrics of a process, by key.
+
+    Attributes:
+        metrics (Dict[str, Metric]): The metrics registered, in order, by
+                                     name and labels.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty registry.
+        """
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Add a metric, replacing any metric of the same name and labels.
+
+        Args:
+            metric (Metric): The metric.
+
+        Returns:
+            Metric: The same metric.
+        """
+        self.metrics[metric.key] = metric
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        """
+        Create and register a counter.
+
+        Args:
+            name (str): The name of the counter, ending with "_total".
+            help (str): The description of the counter.
+
+        Returns:
+            Counter: The counter.
+        """
+        return self.register(Counter(name, help))  # type: ignore
+
+    def gauge(
+        self, name: str, help: str, func: Callable[[], Union[int, float]]
+    ) -> Gauge:
+        """
+        Create and register a gauge.
+
+        Args:
+            name (str): The name of the gauge.
+            help (str): The description of the gauge.
+            func (Callable[[], int | float]): The function returning its
+                                              value.
+
+        Returns:
+            Gauge: The gauge.
+        """
+        return self.register(Gauge(name, help, func))  # type: ignore
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        scale: float = 1e9,
+        labels: Union[Dict[str, str], None] = None,
+    ) -> Histogram:
+        """
+        Create and register a histogram.
+
+        Args:
+            name (str): The name of the histogram.
+            help (str): The description of the histogram.
+            scale (float): The number of recorded units per exposed unit.
+            labels (Dict[str, str] | None): The labels telling apart the
+                                            histograms of the same name.
+
+        Returns:
+            Histogram: The histogram.
+        """
+        return self.register(
+            Histogram(name, help, scale, labels=labels)
+        )  # type: ignore
+
+    def exposition(self) -> str:
+        """
+        Render every metric in the Prometheus text format.
+
+        Returns:
+            str: The metrics, one sample per line.
+        """
+        # the metrics of the same name but other labels form a family, with
+        # a single description followed by the samples of all of them
+        families: Dict[str, List[Metric]] = {}
+        for metric in list(self.metrics.values()):
+            families.setdefault(metric.name, []).append(metric)
+        lines: List[str] = []
+        for name, family in families.items():
+            lines.append(f"# HELP {name} {family[0].help}")
+            lines.append(f"# TYPE {name} {family[0].kind}")
+            for metric in family:
+                for sample, value in metric.samples():
+                    lines.append(f"{sample} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, object]:
+        """
+        Summarize every metric for the log.
+
+        Returns:
+            Dict[str, object]: The value of every counter and gauge and the
+                               summary of every histogram, by key.
+        """
+        return {
+            name: (
+                metric.summary()
+                if isinstance(metric, Histogram)
+                else metric.value
+            )
+            for name, metric in list(self.metrics.items())
+        }
+
+
+class SearchMetrics(MetricsRegistry):
+    """
+    The metrics of a search server process.
+
+    Attributes:
+        connections (Counter): The connections accepted.
+        rejected (Counter): The connections turned away at capacity.
+        queries (Counter): The queries answered, batch keys included.
+        found (Counter): The queries answered with a match.
+        batches (Counter): The batches of the binary protocol answered.
+        bytes_in (Counter): The bytes read from the clients.
+        bytes_out (Counter): The bytes of answers sent to the clients.
+        query_latency (Histogram): The seconds from the read completing a
+                                   query to the write of its answer.
+        search_duration (Histogram): The seconds spent searching a query or
+                                     a batch.
+    """
+
+    def __init__(self):
+        """
+        Initialize the metrics at zero.
+        """
+        super().__init__()
+        self.connections: Counter = self.counter(
+            "search_connections_total", "Connections accepted."
+        )
+        self.rejected: Counter = self.counter(
+            "search_connections_rejected_total",
+            "Connections turned away because the server was at capacity.",
+        )
+        self.queries: Counter = self.counter(
+            "search_queries_total", "Queries answered, batch keys included."
+        )
+        self.found: Counter = self.counter(
+            "search_queries_found_total", "Queries answered with a match."
+        )
+        self.batches: Counter = self.counter(
+            "search_batches_total", "Batches of the binary protocol answered."
+        )
+        self.bytes_in: Counter = self.counter(
+            "search_received_bytes_total", "Bytes read from the clients."
+        )
+        self.bytes_out: Counter = self.counter(
+            "search_sent_bytes_total", "Bytes of answers sent to the clients."
+        )
+        self.query_latency: Histogram = self.histogram(
+            "search_query_latency_seconds",
+            "Seconds from the read completing a query to the write of its "
+            "answer.",
+        )
+        self.search_duration: Histogram = self.histogram(
+            "search_search_duration_seconds",
+            "Seconds spent searching a query or a batch.",
+        )
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    A request handler serving the routes and the commands of a MetricsServer.
+    """
+
+    def do_GET(self) -> None:
+        """
+        Answer a GET request from the routes of the server.
+        """
+        self.__answer(self.server.routes)  # type: ignore
+
+    def do_POST(self) -> None:
+        """
+        Answer a POST request from the commands of the server.
+        """
+        self.__answer(self.server.commands)  # type: ignore
+
+    def log_message(self, format: str, *args) -> None:
+        """skip the access log of every scrape"""
+
+    def __answer(
+        self, routes: Dict[str, Callable[[], Tuple[str, bytes]]]
+    ) -> None:
+        """answer from the route of the path, 404 without one"""
+        path: str = self.path.split("?", 1)[0]
+        route: Union[Callable[[], Tuple[str, bytes]], None] = routes.get(path)
+        if route is None:
+            self.send_error(404)
+            return
+        content_type, body = route()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """
+    An HTTP server exposing a registry on /metrics from a background thread.
+
+    Attributes:
+        registry (MetricsRegistry): The metrics exposed.
+        routes (Dict[str, Callable[[], Tuple[str, bytes]]]): The function
+            returning the content type and the body of every path served.
+        commands (Dict[str, Callable[[], Tuple[str, bytes]]]): The same for
+            the paths served to POST requests, the admin commands.
+        __thread (threading.Thread | None): The serving thread, once started.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self, server_address: Tuple[str, int], registry: MetricsRegistry
+    ):
+        """
+        Initialize a metrics server, bound but not serving.
+
+        Args:
+            server_address (tuple): The address as a (host, port) tuple.
+            registry (MetricsRegistry): The metrics exposed.
+        """
+        super().__init__(server_address, MetricsHandler)
+        self.registry: MetricsRegistry = registry
+        self.routes: Dict[str, Callable[[], Tuple[str, bytes]]] = {
+            "/metrics": lambda: (
+                CONTENT_TYPE,
+                self.registry.exposition().encode(),
+            ),
+        }
+        self.commands: Dict[str, Callable[[], Tuple[str, bytes]]] = {}
+        self.__thread: Union[threading.Thread, None] = None
+
+    def start(self) -> None:
+        """
+        Serve from a background thread.
+        """
+        self.__thread = threading.Thread(
+            target=self.serve_forever, name="metrics", daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop serving and close the socket.
+        """
+        if self.__thread is not None:
+            self.shutdown()
+            self.__thread.join()
+            self.__thread = None
+        self.server_close()
+
+
+def dump_on_signal(dump: Callable[[], None], signum: int = signal.SIGHUP):
+    """
+    Call a function on a signal, from a new thread so that it may take the
+    locks the interrupted main thread holds (e.g. those of the logger).
+    Must be called from the main thread.
+
+    Args:
+        dump (Callable[[], None]): The function dumping the metrics.
+        signum (int): The signal.
+    """
+    signal.signal(
+        signum,
+        lambda signum, frame: threading.Thread(
+            target=dump, name="metrics-dump", daemon=True
+        ).start(),
+    )
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+This module contains the pre-fork supervisor that spreads the search work over
+several processes, so that it is not serialized by the GIL of a single one.
+
+The supervisor loads the database once and forks the workers from it. The
+pages holding the index are then shared copy-on-write between every process
+until a worker reloads a changed search file.
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from . import logger
+from .async_server import AsyncServer
+from .database import Database
+from .metrics import dump_on_signal
+from .profiling import profile_on_signal
+from .server import SearchService
+from .server import Server
+from .server import TCPHandler
+from .setup import LoadEnv
+from ssl import SSLContext
+from types import FrameType
+from typing import Dict
+from typing import Tuple
+from typing import Union
+
+# prctl option delivering a signal on the death of the parent, see prctl(2)
+PR_SET_PDEATHSIG = 1
+
+# seconds given to the workers to exit on shutdown before they are killed
+SHUTDOWN_TIMEOUT = 10.0
+
+# seconds to wait before restarting a worker that died, so that a worker
+# failing on start does not make the supervisor spin
+RESTART_DELAY = 1.0
+
+
+def set_parent_death_signal(signum: int) -> None:
+    """
+    Ask the kernel to send a signal to the calling process when its parent
+    dies, so that workers do not outlive a supervisor that was killed. Only
+    available on Linux, a no-op elsewhere.
+
+    Args:
+        signum (int): The signal to receive.
+    """
+    if not sys.platform.startswith("linux"):
+        return
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.prctl(PR_SET_PDEATHSIG, signum, 0, 0, 0)
+    except (OSError, AttributeError):
+        pass
+
+
+def run_worker(
+    server_address: Tuple[str, int],
+    env_vars_obj: LoadEnv,
+    database: Database,
+    listen_socket: Union[socket.socket, None],
+    ssl_context: Union[SSLContext, None] = None,
+) -> None:
+    """
+    Serve clients from a forked worker process until it receives SIGTERM,
+    logging its metrics on SIGHUP and profiling itself between SIGUSR1 and
+    SIGUSR2.
+
+    Args:
+        server_address (tuple): The server address as a (host, port) tuple.
+        env_vars_obj (LoadEnv): An object containing environment variables.
+        database (Database): The database loaded by the supervisor.
+        listen_socket (socket | None): The socket inherited from the
+                                       supervisor, None to bind the port with
+                                       SO_REUSEPORT.
+        ssl_context (SSLContext | None): The context created by the
+                                         supervisor, None when SSL is
+                                         disabled.
+    """
+    reuse_port: bool = listen_socket is None
+    if env_vars_obj.ENGINE == "asyncio":
+        server = AsyncServer(
+            server_address,
+            env_vars_obj,
+            database=database,
+            listen_socket=listen_socket,
+            reuse_port=reuse_port,
+            ssl_context=ssl_context,
+        )
+        dump_on_signal(server.dump_metrics)
+        profile_on_signal(server.profiler)
+
+        async def serve() -> None:
+            """serve until SIGTERM cancels the serving task"""
+            task = asyncio.current_task()
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGTERM, task.cancel  # type: ignore
+            )
+            await server.serve_forever()
+
+        try:
+            asyncio.run(serve())
+        except asyncio.CancelledError:
+            pass
+        return
+
+    with Server(
+        server_address,
+        TCPHandler,
+        env_vars_obj,
+        database=database,
+        listen_socket=listen_socket,
+        reuse_port=reuse_port,
+        ssl_context=ssl_context,
+    ) as threaded_server:
+
+        def stop(signum: int, frame: Union[FrameType, None]) -> None:
+            """stop serving, from another thread as shutdown() waits for the
+            serving loop to exit"""
+            threading.Thread(target=threaded_server.shutdown).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        dump_on_signal(threaded_server.dump_metrics)
+        profile_on_signal(threaded_server.profiler)
+        threaded_server.serve_forever()
+
+
+class Supervisor:
+    """
+    A process forking and watching over a number of worker processes serving
+    the same port.
+
+    Attributes:
+        server_address (Tuple[str, int]): The (host, port) the workers serve.
+        env_vars_obj (LoadEnv): The environment variables of the server.
+        workers (int): The number of worker processes.
+        reuse_port (bool): Whether each worker binds the port with
+                           SO_REUSEPORT, the workers accept from a socket
+                           bound by the supervisor otherwise.
+        pids (Dict[int, int]): The worker slot of every live worker process.
+        __stopping (bool): Whether a shutdown was requested.
+    """
+
+    def __init__(
+        self,
+        server_address: Tuple[str, int],
+        env_vars_obj: LoadEnv,
+        workers: int,
+    ):
+        """
+        Initialize a new supervisor.
+
+        Args:
+            server_address (tuple): The server address as a (host, port) tuple.
+            env_vars_obj (LoadEnv): An object containing environment variables.
+            workers (int): The number of worker processes.
+        """
+        self.server_address: Tuple[str, int] = server_address
+        self.env_vars_obj: LoadEnv = env_vars_obj
+        self.workers: int = workers
+        self.reuse_port: bool = hasattr(socket, "SO_REUSEPORT")
+        self.pids: Dict[int, int] = {}
+        self.__stopping: bool = False
+        self.__supervisor_pid: int = os.getpid()
+        self.__database: Union[Database, None] = None
+        self.__listen_socket: Union[socket.socket, None] = None
+        self.__ssl_context: Union[SSLContext, None] = None
+
+    def run(self) -> None:
+        """
+        Load the database, fork the workers and restart any of them that
+        dies until SIGTERM or SIGINT is received, then stop them all. A
+        SIGHUP, SIGUSR1 or SIGUSR2 is passed on to every worker.
+        """
+        self.__supervisor_pid = os.getpid()
+        service = SearchService()
+        service.configure(self.env_vars_obj)
+        self.__database = service.load_database()
+        # a single context means a single session ticket key, so a client
+        # resumes its session whichever worker accepts its next connection
+        self.__ssl_context = service.load_ssl_context()
+        if not self.reuse_port:
+            self.__listen_socket = socket.create_server(
+                self.server_address, backlog=self.env_vars_obj.LISTEN_BACKLOG
+            )
+
+        # move every object loaded so far out of the collector's reach, so
+        # that collections in the workers do not write to their pages
+        gc.freeze()
+
+        signal.signal(signal.SIGTERM, self.__stop)
+        signal.signal(signal.SIGINT, self.__stop)
+        signal.signal(signal.SIGHUP, self.__forward)
+        signal.signal(signal.SIGUSR1, self.__forward)
+        signal.signal(signal.SIGUSR2, self.__forward)
+        for slot in range(self.workers):
+            self.__spawn(slot)
+        logger.info(
+            f"supervisor {os.getpid()} started {self.workers} workers "
+            f"({'SO_REUSEPORT' if self.reuse_port else 'shared socket'})"
+        )
+
+        while not self.__stopping:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            dead_slot: Union[int, None] = self.pids.pop(pid, None)
+            if dead_slot is None or self.__stopping:
+                continue
+            logger.error(
+                "{"
+                f"worker_exit: {pid}, "
+                f"status: {status}, "
+                "action: restarting worker"
+                "}"
+            )
+            time.sleep(RESTART_DELAY)
+            if not self.__stopping:
+                self.__spawn(dead_slot)
+
+        self.__shutdown()
+
+    def __spawn(self, slot: int) -> None:
+        """fork a worker process for a slot"""
+        pid: int = os.fork()
+        if pid:
+            self.pids[pid] = slot
+            return
+
+        # in the worker, serve until stopped and never return to the caller
+        exit_code: int = 0
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGHUP, signal.SIG_DFL)
+            signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+            signal.signal(signal.SIGUSR2, signal.SIG_DFL)
+            set_parent_death_signal(signal.SIGTERM)
+            if os.getppid() != self.__supervisor_pid:
+                return  # the supervisor died before the signal was set
+            env_vars_obj: LoadEnv = self.env_vars_obj
+            if env_vars_obj.METRICS_PORT is not None:
+                # every worker serves its own metrics on the next port
+                env_vars_obj = env_vars_obj.model_copy(
+                    update={"METRICS_PORT": env_vars_obj.METRICS_PORT + slot}
+                )
+            run_worker(
+                self.server_address,
+                env_vars_obj,
+                self.__database,  # type: ignore
+                self.__listen_socket,
+                self.__ssl_context,
+            )
+        except BaseException as e:
+            logger.error(f"worker {os.getpid()} failed: {e!r}")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def __stop(self, signum: int, frame: Union[FrameType, None]) -> None:
+        """request a shutdown of the supervisor and of its workers"""
+        self.__stopping = True
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def __forward(self, signum: int, frame: Union[FrameType, None]) -> None:
+        """pass a signal on to every worker"""
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def __shutdown(self) -> None:
+        """wait for the workers to exit, killing the ones that do not"""
+        self.__stop(signal.SIGTERM, None)
+        deadline: float = time.monotonic() + SHUTDOWN_TIMEOUT
+        while self.pids and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self.pids.pop(pid, None)
+            else:
+                time.sleep(0.05)
+        for pid in list(self.pids):
+            logger.error(f"worker {pid} did not exit in time, killing it")
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self.pids.clear()
+        if self.__listen_socket is not None:
+            self.__listen_socket.close()
+        logger.info("supervisor stopped")
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+This module contains the on demand profiler of the server. A running instance
+is profiled from a signal or an admin command without restarting it, in one
+of two modes:
+
+cprofile: a deterministic cProfile session of the threads serving the
+          clients, written in the pstats format
+sampler: a statistical sampler reading the stack of every thread from
+         sys._current_frames at a fixed interval, written as collapsed stacks
+         (one "frame;frame;... count" line per stack, as read by flamegraph.pl
+         and speedscope)
+
+Nothing is installed while the profiler is off, so it then costs nothing.
+"""
+import cProfile
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from . import logger
+from pathlib import Path
+from types import CodeType
+from types import FrameType
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Set
+from typing import Union
+
+# the modes PROFILE_MODE accepts
+PROFILE_MODES = ("cprofile", "sampler")
+
+# from Python 3.12 a cProfile session covers every thread of the process, as
+# it is built on sys.monitoring, before that it only covers the thread that
+# enabled it
+PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+class Profiler:
+    """
+    A profiler started and stopped on demand, writing a file per session.
+
+    Attributes:
+        directory (Path): The directory the profiles are written to.
+        mode (str): The mode of the sessions, one of PROFILE_MODES.
+        interval (float): Seconds between two samples of the sampler.
+        hook (Callable[[], None] | None): The function the serving threads
+                                          call before every read while they
+                                          have to enable or disable their own
+                                          cProfile session, None otherwise.
+        __lock (threading.Lock): Serializes the starts and the stops.
+        __started (float | None): The time.time() of the start of the
+                                  session, None when off.
+        __session (int): The number of sessions started.
+        __profile (cProfile.Profile | None): The process wide session.
+        __profiles (List[cProfile.Profile]): The session of every thread
+                                             profiling itself.
+        __enabled (Set[int]): The ident of every thread whose own session is
+                              enabled.
+        __local (threading.local): The session of the calling thread, and
+                                   the number of the session it belongs to.
+        __sampler (threading.Thread | None): The thread of the sampler.
+        __stop (threading.Event): Set to stop the sampler.
+        __stacks (Dict[str, int]): The number of samples of every stack.
+    """
+
+    def __init__(self, directory: Path, mode: str, interval: float = 0.01):
+        """
+        Initialize a profiler, off.
+
+        Args:
+            directory (Path): The directory the profiles are written to.
+            mode (str): The mode of the sessions, one of PROFILE_MODES.
+            interval (float): Seconds between two samples of the sampler.
+        """
+        self.directory: Path = directory
+        self.mode: str = mode
+        self.interval: float = interval
+        self.hook: Union[Callable[[], None], None] = None
+        self.__lock = threading.Lock()
+        self.__started: Union[float, None] = None
+        self.__session: int = 0
+        self.__profile: Union[cProfile.Profile, None] = None
+        self.__profiles: List[cProfile.Profile] = []
+        self.__enabled: Set[int] = set()
+        self.__local = threading.local()
+        self.__sampler: Union[threading.Thread, None] = None
+        self.__stop = threading.Event()
+        self.__stacks: Dict[str, int] = {}
+
+    @property
+    def running(self) -> bool:
+        """Whether a session is running."""
+        return self.__started is not None
+
+    def start(self) -> bool:
+        """
+        Start a session unless one is running.
+
+        Returns:
+            bool: Whether a session was started.
+        """
+        with self.__lock:
+            if self.__started is not None:
+                return False
+            self.__started = time.time()
+            self.__session += 1
+            if self.mode == "sampler":
+                self.__stacks = {}
+                self.__stop.clear()
+                self.__sampler = threading.Thread(
+                    target=self.__sample, name="profiler", daemon=True
+                )
+                self.__sampler.start()
+            elif PROFILES_ALL_THREADS:
+                self.__profile = cProfile.Profile()
+                self.__profile.enable()
+            else:
+                # every serving thread enables its own session on its next
+                # read, the threads waiting for a client join once it sends
+                self.__profiles = []
+                self.hook = self.__follow
+        logger.info(f"profiler started ({self.mode})")
+        return True
+
+    def stop(self) -> Union[Path, None]:
+        """
+        Stop the running session and write its profile.
+
+        Returns:
+            Path | None: The file the profile was written to, None when no
+                         session was running.
+        """
+        with self.__lock:
+            if self.__started is None:
+                return None
+            started: str = time.strftime(
+                "%Y%m%d-%H%M%S", time.localtime(self.__started)
+            )
+            name: str = f"profile-{os.getpid()}-{started}"
+            self.__started = None
+            # the threads that exited never disable their session
+            self.__enabled &= {
+                thread.ident for thread in threading.enumerate()  # type: ignore
+            }
+            if not self.__enabled:
+                self.hook = None
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if self.mode == "sampler":
+                self.__stop.set()
+                self.__sampler.join()  # type: ignore
+                self.__sampler = None
+                path: Path = self.directory / f"{name}.collapsed"
+                with open(path, "w") as file:
+                    for stack, count in sorted(self.__stacks.items()):
+                        file.write(f"{stack} {count}\n")
+            else:
+                profiles: List[cProfile.Profile] = self.__profiles
+                if PROFILES_ALL_THREADS:
+                    self.__profile.disable()  # type: ignore
+                    profiles = [self.__profile]  # type: ignore
+                    self.__profile = None
+                self.__profiles = []
+                path = self.directory / f"{name}.pstats"
+                self.__dump(profiles, path)
+        logger.info(f"profiler stopped, profile written to {path}")
+        return path
+
+    def __follow(self) -> None:
+        """enable the session of the calling thread while one is running,
+        disable it once it stopped"""
+        local = self.__local
+        profile: Union[cProfile.Profile, None] = getattr(
+            local, "profile", None
+        )
+        if (
+            profile is not None
+            and self.__started is not None
+            and local.session == self.__session
+        ):
+            return  # the thread is profiled already
+        with self.__lock:
+            if profile is not None and (
+                self.__started is None or local.session != self.__session
+            ):
+                # the session of the thread stopped
+                profile.disable()
+                profile = local.profile = None
+                self.__enabled.discard(threading.get_ident())
+            if profile is None and self.__started is not None:
+                profile = local.profile = cProfile.Profile()
+                local.session = self.__session
+                self.__profiles.append(profile)
+                self.__enabled.add(threading.get_ident())
+                profile.enable()
+            if not self.__enabled and self.__started is None:
+                self.hook = None
+
+    def __dump(self, profiles: List[cProfile.Profile], path: Path) -> None:
+        """merge the sessions of the threads into a pstats file"""
+        stats = pstats.Stats()
+        for profile in profiles:
+            # read without disabling the session, pstats would disable it
+            # from the calling thread while it runs in another, the thread
+            # running it disables it on its next read
+            profile.snapshot_stats()
+            part = pstats.Stats()
+            part.stats = profile.stats  # type: ignore
+            part.get_top_level_stats()
+            stats.add(part)
+        stats.dump_stats(path)
+
+    def __sample(self) -> None:
+        """count the stacks of the other threads until stopped"""
+        own: int = threading.get_ident()
+        labels: Dict[CodeType, str] = {}
+        while not self.__stop.wait(self.interval):
+            names: Dict[Union[int, None], str] = {
+                thread.ident: thread.name for thread in threading.enumerate()
+            }
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack: List[str] = []
+                current: Union[FrameType, None] = frame
+                while current is not None:
+                    code: CodeType = current.f_code
+                    label: Union[str, None] = labels.get(code)
+                    if label is None:
+                        label = labels[code] = (
+                            f"{code.co_name} "
+                            f"({code.co_filename}:{code.co_firstlineno})"
+                        )
+                    stack.append(label)
+                    current = current.f_back
+                stack.append(names.get(ident, str(ident)))
+                key: str = ";".join(reversed(stack))
+                self.__stacks[key] = self.__stacks.get(key, 0) + 1
+
+
+def profile_on_signal(
+    profiler: Profiler,
+    start: int = signal.SIGUSR1,
+    stop: int = signal.SIGUSR2,
+) -> None:
+    """
+    Start and stop the sessions of a profiler on signals, from a new thread
+    so that they may take the locks the interrupted main thread holds (e.g.
+    those of the logger). Must be called from the main thread.
+
+    Args:
+        profiler (Profiler): The profiler.
+        start (int): The signal starting a session.
+        stop (int): The signal stopping it and writing its profile.
+    """
+    signal.signal(
+        start,
+        lambda signum, frame: threading.Thread(
+            target=profiler.start, name="profiler-start", daemon=True
+        ).start(),
+    )
+    signal.signal(
+        stop,
+        lambda signum, frame: threading.Thread(
+            target=profiler.stop, name="profiler-stop", daemon=True
+        ).start(),
+    )
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+This module contains the framing of the query protocols shared by the server
+engines.
+
+In the text protocol a query is a line terminated by a newline and every
+query is answered by a line in the order received, so a client may send many
+queries back to back and read the answers as they come. Clients written for
+the first version of the protocol send a single unterminated query per packet
+and wait for its answer. A connection whose first packet holds no newline is
+served that way, every packet read being one query. As a first query split
+over several packets would then be taken for several, the framer can instead
+defer the decision until a newline follows, the server answering the first
+query as one of the first version once nothing followed it for the
+LEGACY_TIMEOUT setting.
+
+A connection starting with the BINARY_MAGIC byte, which can not start a UTF-8
+text query, speaks the binary batch protocol instead. Every request frame is
+a 4 bytes key count followed by the keys, each prefixed by its 2 bytes length
+and without a newline. Every response frame is the 4 bytes key count followed
+by a bitmap with one bit per key, set when the key exists, the first key
+being the lowest bit of the first byte. Integers are big endian.
+"""
+import struct
+from typing import List
+from typing import Sequence
+from typing import Union
+
+# number of bytes read from a connection at once
+READ_SIZE = 65536
+
+# longest query accepted, a connection sending a longer line is closed
+MAX_QUERY_SIZE = 65536
+
+# the answers to a query
+FOUND = b"STRING EXISTS\n"
+NOT_FOUND = b"STRING NOT FOUND\n"
+
+# the answer to a connection turned away because the server is at capacity
+BUSY = b"SERVER BUSY\n"
+
+# first byte of a connection speaking the binary batch protocol
+BINARY_MAGIC = b"\xb5"
+
+# most keys accepted in a single binary request frame
+MAX_BATCH_SIZE = 1_000_000
+
+# most bytes of keys, with their lengths, accepted in a single binary request
+# frame, the keys of a frame being held until its last one is read
+MAX_FRAME_BYTES = 16 << 20
+
+# the integers of the binary frames
+COUNT = struct.Struct(">I")
+KEY_SIZE = struct.Struct(">H")
+
+# maps the found flags of a batch to the digits of its bitmap
+_BIT_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+
+
+class QueryFramer:
+    """
+    Split the bytes read from a connection into queries.
+
+    Attributes:
+        max_query_size (int): The longest query accepted in bytes.
+        defer_legacy (bool): Whether a first packet without a newline is kept
+                             until more follows it or it expires, instead of
+                             being taken for a query of the first version at
+                             once.
+        legacy (bool | None): Whether the client sends one unterminated query
+                              per packet, None until decided.
+        __buffer (bytes): The start of a query whose end was not read yet.
+    """
+
+    def __init__(
+        self, max_query_size: int = MAX_QUERY_SIZE, defer_legacy: bool = False
+    ):
+        """
+        Initialize a framer for a new connection.
+
+        Args:
+            max_query_size (int): The longest query accepted in bytes.
+            defer_legacy (bool): Whether to keep a first packet without a
+                                 newline until more follows it or it expires.
+        """
+        self.max_query_size: int = max_query_size
+        self.defer_legacy: bool = defer_legacy
+        self.legacy: Union[bool, None] = None
+        self.__buffer: bytes = b""
+
+    @property
+    def partial(self) -> bool:
+        """Whether the start of a query was read but not its end."""
+        return bool(self.__buffer)
+
+    @property
+    def undecided(self) -> bool:
+        """Whether a first query was read without a newline and deferred, the
+        version of the protocol the client speaks being unknown until more
+        follows it or it expires."""
+        return self.legacy is None and bool(self.__buffer)
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """
+        Frame the bytes read from the connection.
+
+        Args:
+            data (bytes): The bytes read.
+
+        Returns:
+            List[bytes]: The queries completed by the bytes read, in order,
+                         stripped of their newline, surrounding white space
+                         and trailing null bytes.
+
+        Raises:
+            ValueError: If a query is longer than max_query_size.
+        """
+        if self.legacy is None and not self.defer_legacy:
+            self.legacy = b"\n" not in data
+        if self.legacy:
+            return [data.strip().strip(b"\x00")]
+
+        lines: List[bytes] = (self.__buffer + data).split(b"\n")
+        # the last piece is the start of the next query, empty if the bytes
+        # read end on a newline
+        self.__buffer = lines.pop()
+        if len(self.__buffer) > self.max_query_size:
+            raise ValueError(f"query longer than {self.max_query_size} bytes")
+        if lines:
+            self.legacy = False
+        return [line.strip().strip(b"\x00") for line in lines]
+
+    def expire(self) -> List[bytes]:
+        """
+        Take a deferred first query for a query of the first version of the
+        protocol, once nothing followed it in time. Every packet read
+        afterwards is one query.
+
+        Returns:
+            List[bytes]: The query, stripped of its surrounding white space
+                         and trailing null bytes.
+        """
+        self.legacy = True
+        query: bytes = self.__buffer
+        self.__buffer = b""
+        return [query.strip().strip(b"\x00")]
+
+
+class BatchFramer:
+    """
+    Split the bytes read from a binary connection into batches of keys. Keys
+    are parsed as they arrive so that a large frame is not scanned again on
+    every read.
+
+    Attributes:
+        max_batch_size (int): The most keys accepted in a frame.
+        max_frame_bytes (int): The most bytes of keys, with their lengths,
+                               accepted in a frame.
+        __buffer (bytes): The bytes read but not parsed yet.
+        __pending (int | None): The number of keys of the current frame not
+                                read yet, None between two frames.
+        __keys (List[str]): The keys of the current frame read so far.
+        __frame_bytes (int): The bytes of the keys of the current frame read
+                             so far, with their lengths.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_frame_bytes: int = MAX_FRAME_BYTES,
+    ):
+        """
+        Initialize a framer for a new connection.
+
+        Args:
+            max_batch_size (int): The most keys accepted in a frame.
+            max_frame_bytes (int): The most bytes of keys, with their
+                                   lengths, accepted in a frame.
+        """
+        self.max_batch_size: int = max_batch_size
+        self.max_frame_bytes: int = max_frame_bytes
+        self.__buffer: bytes = b""
+        self.__pending: Union[int, None] = None
+        self.__keys: List[str] = []
+        self.__frame_bytes: int = 0
+
+    @property
+    def partial(self) -> bool:
+        """Whether the start of a frame was read but not its end."""
+        return bool(self.__buffer) or self.__pending is not None
+
+    def feed(self, data: bytes) -> List[List[str]]:
+        """
+        Frame the bytes read from the connection.
+
+        Args:
+            data (bytes): The bytes read.
+
+        Returns:
+            List[List[str]]: The batches completed by the bytes read, in
+                             order, every key ending with a newline as the
+                             lines of the search file do.
+
+        Raises:
+            ValueError: If a frame holds more than max_batch_size keys or
+                        more than max_frame_bytes bytes of keys.
+            UnicodeDecodeError: If a key is not valid UTF-8.
+        """
+        buffer: bytes = self.__buffer + data if self.__buffer else data
+        end: int = len(buffer)
+        pos: int = 0
+        batches: List[List[str]] = []
+        while True:
+            if self.__pending is None:
+                if end - pos < COUNT.size:
+                    break
+                (self.__pending,) = COUNT.unpack_from(buffer, pos)
+                pos += COUNT.size
+                if self.__pending > self.max_batch_size:
+                    raise ValueError(
+                        f"batch larger than {self.max_batch_size} keys"
+                    )
+
+            # read the keys of the frame received so far
+            keys: List[str] = self.__keys
+            pending: int = self.__pending
+            while pending and end - pos >= KEY_SIZE.size:
+                (size,) = KEY_SIZE.unpack_from(buffer, pos)
+                start: int = pos + KEY_SIZE.size
+                # rejected from its length, before its bytes are buffered
+                if self.__frame_bytes + KEY_SIZE.size + size > (
+                    self.max_frame_bytes
+                ):
+                    raise ValueError(
+                        f"batch larger than {self.max_frame_bytes} bytes"
+                    )
+                if end - start < size:
+                    break
+                keys.append(f"{buffer[start : start + size].decode()}\n")
+                pos = start + size
+                self.__frame_bytes += KEY_SIZE.size + size
+                pending -= 1
+            self.__pending = pending
+            if pending:
+                break
+
+            batches.append(keys)
+            self.__keys = []
+            self.__pending = None
+            self.__frame_bytes = 0
+        self.__buffer = buffer[pos:]
+        return batches
+
+
+def encode_batch(keys: Sequence[str]) -> bytes:
+    """
+    Encode a binary request frame.
+
+    Args:
+        keys (Sequence[str]): The keys to look up, without newline.
+
+    Returns:
+        bytes: The frame.
+    """
+    parts: List[bytes] = [COUNT.pack(len(keys))]
+    for key in keys:
+        raw: bytes = key.encode()
+        parts.append(KEY_SIZE.pack(len(raw)))
+        parts.append(raw)
+    return b"".join(parts)
+
+
+def encode_bitmap(found: Sequence[bool]) -> bytes:
+    """
+    Encode a binary response frame.
+
+    Args:
+        found (Sequence[bool]): Whether each key of the batch exists.
+
+    Returns:
+        bytes: The frame.
+    """
+    count: int = len(found)
+    # the digits of the bitmap read as a little endian integer, built at C
+    # speed from the flags in reverse order
+    digits: bytes = bytes(found[::-1]).translate(_BIT_DIGITS)
+    bits: int = int(digits, 2) if count else 0
+    return COUNT.pack(count) + bits.to_bytes((count + 7) // 8, "little")
+
+
+def decode_bitmap(frame: bytes) -> List[bool]:
+    """
+    Decode a binary response frame.
+
+    Args:
+        frame (bytes): The frame, count included.
+
+    Returns:
+        List[bool]: Whether each key of the batch exists.
+    """
+    (count,) = COUNT.unpack_from(frame)
+    bitmap: bytes = frame[COUNT.size : COUNT.size + (count + 7) // 8]
+    return [bool(byte >> bit & 1) for byte in bitmap for bit in range(8)][
+        :count
+    ]
+
+
+def bitmap_size(count: int) -> int:
+    """
+    Compute the size of a binary response frame.
+
+    Args:
+        count (int): The number of keys of the batch.
+
+    Returns:
+        int: The size of the frame in bytes, count included.
+    """
+    return COUNT.size + (count + 7) // 8
@@ -2,7 +2,14 @@
 """This module contains various search algorithms"""
 import math
 from bisect import bisect_left
+from collections.abc import Sequence
+from typing import AbstractSet
+from typing import Any
+from typing import Callable
+from typing import Dict
 from typing import List
+from typing import NamedTuple
+from typing import Union
 
 
 class SearchAlgorithmError(TypeError):
@@ -16,24 +23,48 @@ class SearchAlgorithmError(TypeError):
 # Custom error object for argument type errors
 arg_error_obj = SearchAlgorithmError(
     "Argument type to function is wrong, function takes arguments of "
-    "type 'List' and 'str' respectively"
+    "type 'Sequence' and 'str' respectively"
 )
 
+# Custom error object for argument type errors of the set based algorithms
+set_arg_error_obj = SearchAlgorithmError(
+    "Argument type to function is wrong, function takes arguments of "
+    "type 'FrozenSet' and 'str' respectively"
+)
+
+
+def is_sequence(sorted_arr: object) -> bool:
+    """
+    Check whether an object can be searched by the index based algorithms.
+
+    Args:
+        sorted_arr (object): The object to check.
+
+    Returns:
+        bool: True for any sequence of strings supporting len() and integer
+              indexing (list, tuple, compact blob), False for a string or
+              bytes, which are sequences of characters.
+    """
+    return isinstance(sorted_arr, Sequence) and not isinstance(
+        sorted_arr, (str, bytes, bytearray)
+    )
+
 
-def bisect_search(sorted_arr: List[str], search_str: str) -> bool:
+def bisect_search(sorted_arr: Sequence[str], search_str: str) -> bool:
     """
     Implementation of the binary search algorithm using the bisect_left
     function of python bisect module
 
     Args:
-        sorted_arr (List[str]): The sorted List of strings to search through.
+        sorted_arr (Sequence[str]): The sorted sequence of strings to search
+                                    through.
         search_str (str): The string to search for.
 
     Returns:
         bool: True if the search string is found in the sorted array, False
             otherwise.
     """
-    if not isinstance(sorted_arr, list) or not isinstance(search_str, str):
+    if not is_sequence(sorted_arr) or not isinstance(search_str, str):
         raise arg_error_obj
 
     idx: int = bisect_left(sorted_arr, search_str)
@@ -43,134 +74,247 @@ def bisect_search(sorted_arr: List[str], search_str: str) -> bool:
         return False
 
 
-def jump_search(sorted_arr: List[str], search_str: str) -> bool:
+def jump_search(sorted_arr: Sequence[str], search_str: str) -> bool:
     """
     Implementation of the jump search algorithm.
 
     Args:
-        sorted_arr (List[str]): The sorted List of strings to search through.
+        sorted_arr (Sequence[str]): The sorted sequence of strings to search
+                                    through.
         search_str (str): The string to search for.
 
     Returns:
         bool: True if the search string is found in the sorted array, False
             otherwise.
     """
-    if not isinstance(sorted_arr, list) or not isinstance(search_str, str):
+    if not is_sequence(sorted_arr) or not isinstance(search_str, str):
         raise arg_error_obj
 
     # check if the last element in the sorted array is less than the
     # search string
     arr_size: int = len(sorted_arr)
-    if (not sorted_arr) or (search_str > sorted_arr[-1]):
+    if (not arr_size) or (search_str > sorted_arr[arr_size - 1]):
         return False
 
     # obtain the block size for each sub-array
-    block_size: int = int(math.sqrt(arr_size))
-
-    # iterate over each block in the array
-    for min_idx in range(0, arr_size, block_size):
-        # obtain the maximum index of a block
-        max_idx: int = min_idx + block_size - 1
-        # guard against over indexing error
-        if max_idx >= arr_size:
-            max_idx = arr_size - 1
-
-        # check if the maximum element in the block is less than
-        # the search string
-        if sorted_arr[max_idx] < search_str:
-            continue
-        else:
-            if search_str in sorted_arr[min_idx : (max_idx + 1)]:
-                return True  # search string found in array
-
-    return False  # search string not in array
-
-
-def binary_search_recurse(sorted_arr: List[str], search_str: str) -> bool:
+    block_size: int = math.isqrt(arr_size)
+
+    # jump to the first block whose maximum element is not less than the
+    # search string, it is the only block that can hold it
+    max_idx: int = arr_size - 1
+    for block_end in range(block_size - 1, arr_size, block_size):
+        if sorted_arr[block_end] >= search_str:
+            max_idx = block_end
+            break
+    min_idx: int = max_idx // block_size * block_size
+
+    # scan that block in place rather than copying it
+    try:
+        sorted_arr.index(search_str, min_idx, max_idx + 1)
+    except ValueError:
+        return False  # search string not in array
+    return True  # search string found in array
+
+
+def binary_search_recurse(
+    sorted_arr: Sequence[str],
+    search_str: str,
+    lo: int = 0,
+    hi: Union[int, None] = None,
+) -> bool:
     """
-    Implementation of the binary search algorithm using recursion.
+    Implementation of the binary search algorithm using recursion. Each call
+    narrows the [lo, hi) bounds of the searched range instead of slicing the
+    array.
 
     Args:
-        sorted_arr (List[str]): The sorted List of strings to search through.
+        sorted_arr (Sequence[str]): The sorted sequence of strings to search
+                                    through.
         search_str (str): The string to search for.
+        lo (int): The first index of the searched range.
+        hi (int | None): The index past the end of the searched range, the
+                         length of the array if None.
 
     Returns:
         bool: True if the search string is found in the sorted array, False
             otherwise.
     """
-    if not isinstance(sorted_arr, list) or not isinstance(search_str, str):
+    if not is_sequence(sorted_arr) or not isinstance(search_str, str):
         raise arg_error_obj
-
-    # check for empty List
-    if not sorted_arr:
+    if hi is None:
+        hi = len(sorted_arr)
+    return _binary_search_range(sorted_arr, search_str, lo, hi)
+
+
+def _binary_search_range(
+    sorted_arr: Sequence[str], search_str: str, lo: int, hi: int
+) -> bool:
+    """search the [lo, hi) range of a sorted array, the arguments being
+    already checked"""
+    # check for an empty range
+    if lo >= hi:
         return False
 
-    # get the size of the sorted array
-    arr_size: int = len(sorted_arr)
-
-    # base condition
-    if (sorted_arr) and (arr_size == 1):
-        if sorted_arr[0] == search_str:
-            return True
-        else:
-            return False
-
-    # divide the array into 2
-    mid_idx: int = arr_size // 2
-
-    # compare the search_string against the maximum of the left array
-    if search_str <= sorted_arr[mid_idx - 1]:
-        return binary_search_recurse(sorted_arr[:(mid_idx)], search_str)
-
-    # compare the search_string against the maximum of the right array
-    elif search_str >= sorted_arr[mid_idx]:
-        return binary_search_recurse(sorted_arr[mid_idx:], search_str)
-    return False
+    # compare the search string against the middle of the range
+    mid_idx: int = (lo + hi) // 2
+    mid_str: str = sorted_arr[mid_idx]
+    if search_str == mid_str:
+        return True
+    elif search_str < mid_str:
+        return _binary_search_range(sorted_arr, search_str, lo, mid_idx)
+    return _binary_search_range(sorted_arr, search_str, mid_idx + 1, hi)
 
 
-def binary_search_iter(sorted_arr: List[str], search_str: str) -> bool:
+def binary_search_iter(sorted_arr: Sequence[str], search_str: str) -> bool:
     """
-    Implementation of the binary search algorithm using recursion.
+    Implementation of the binary search algorithm using iteration over the
+    [lo, hi) bounds of the searched range.
 
     Args:
-        sorted_arr (List[str]): The sorted List of strings to search through.
+        sorted_arr (Sequence[str]): The sorted sequence of strings to search
+                                    through.
         search_str (str): The string to search for.
 
     Returns:
         bool: True if the search string is found in the sorted array, False
            otherwise.
     """
-    if not isinstance(sorted_arr, list) or not isinstance(search_str, str):
+    if not is_sequence(sorted_arr) or not isinstance(search_str, str):
         raise arg_error_obj
-    # return false for null array
-    if not sorted_arr:
-        return False
 
-    while True:
-        arr_size: int = len(sorted_arr)  # get the size of the sorted array
-        mid_idx: int = arr_size // 2  # get the middle of the array
-        if sorted_arr[mid_idx] == search_str:
+    lo: int = 0
+    hi: int = len(sorted_arr)
+    while lo < hi:
+        mid_idx: int = (lo + hi) // 2  # get the middle of the range
+        mid_str: str = sorted_arr[mid_idx]
+        if mid_str == search_str:
             return True
-        elif arr_size > 1:
-            if search_str <= sorted_arr[mid_idx - 1]:
-                sorted_arr = sorted_arr[:mid_idx]
-            else:
-                sorted_arr = sorted_arr[mid_idx:]
+        elif search_str < mid_str:
+            hi = mid_idx
         else:
-            return False
+            lo = mid_idx + 1
+    return False
 
 
-def python_linear_search(sorted_arr: List[str], search_str: str) -> bool:
+def python_linear_search(sorted_arr: Sequence[str], search_str: str) -> bool:
     """
     Implementation of python native linear search algorithm
     Args:
-        sorted_arr (List[str]): The sorted List of strings to search through.
+        sorted_arr (Sequence[str]): The sorted sequence of strings to search
+                                    through.
         search_str (str): The string to search for.
 
     Returns:
         bool: True if the search string is found in the sorted array, False
            otherwise.
     """
-    if not isinstance(sorted_arr, list) or not isinstance(search_str, str):
+    if not is_sequence(sorted_arr) or not isinstance(search_str, str):
         raise arg_error_obj
     return search_str in sorted_arr
+
+
+def hash_search(hash_set: AbstractSet[str], search_str: str) -> bool:
+    """
+    Implementation of an exact match lookup in a hash set. The data does not
+    need to be sorted, it has to be loaded into a set or frozenset instead.
+
+    Args:
+        hash_set (AbstractSet[str]): The set of strings to search through.
+        search_str (str): The string to search for.
+
+    Returns:
+        bool: True if the search string is found in the set, False otherwise.
+    """
+    if not isinstance(hash_set, (set, frozenset)) or not isinstance(
+        search_str, str
+    ):
+        raise set_arg_error_obj
+    return search_str in hash_set
+
+
+class SearchAlgorithm(NamedTuple):
+    """
+    A search algorithm registered under the name the ALGORITHM environment
+    variable selects it by.
+
+    Attributes:
+        name (str): The name of the algorithm.
+        search (Callable[[Any, str], bool]): The search function, taking the
+                                             index and the string to find.
+        index_builder (Callable[[List[str]], Any]): The function building the
+                                             index searched by the algorithm
+                                             out of the lines of the file.
+    """
+
+    name: str
+    search: Callable[[Any, str], bool]
+    index_builder: Callable[[List[str]], Any]
+
+
+# the registered algorithms by name, in registration order
+_registry: Dict[str, SearchAlgorithm] = {}
+
+
+def register_algorithm(
+    name: str,
+    search: Callable[[Any, str], bool],
+    index_builder: Callable[[List[str]], Any] = sorted,
+) -> SearchAlgorithm:
+    """
+    Register a search algorithm so that it can be selected by name.
+
+    Args:
+        name (str): The name of the algorithm.
+        search (Callable[[Any, str], bool]): The search function.
+        index_builder (Callable[[List[str]], Any]): The function building the
+                                             index searched by the algorithm,
+                                             a sorted list by default.
+
+    Returns:
+        SearchAlgorithm: The registered algorithm.
+
+    Raises:
+        ValueError: If an algorithm is already registered under the name.
+    """
+    if name in _registry:
+        raise ValueError(f"search algorithm '{name}' is already registered")
+    algorithm = SearchAlgorithm(name, search, index_builder)
+    _registry[name] = algorithm
+    return algorithm
+
+
+def get_algorithm(name: str) -> SearchAlgorithm:
+    """
+    Obtain a registered search algorithm.
+
+    Args:
+        name (str): The name of the algorithm.
+
+    Returns:
+        SearchAlgorithm: The algorithm.
+
+    Raises:
+        ValueError: If no algorithm is registered under the name.
+    """
+    try:
+        return _registry[name]
+    except KeyError:
+        raise ValueError(f"Value must be one of {algorithm_names()}") from None
+
+
+def algorithm_names() -> List[str]:
+    """
+    Obtain the names of the registered search algorithms.
+
+    Returns:
+        List[str]: The names, in registration order.
+    """
+    return list(_registry)
+
+
+register_algorithm("jump", jump_search)
+register_algorithm("recursive", binary_search_recurse)
+register_algorithm("iterative", binary_search_iter)
+register_algorithm("bisect", bisect_search)
+register_algorithm("linear", python_linear_search)
+register_algorithm("hash", hash_search, frozenset)
@@ -3,45 +3,392 @@
 This module contains the server script to configure and run the server.
 It defines the Server and TCPHandler classes for handling incoming requests.
 """
+import io
+import select
+import socket
 import socketserver
+import sys
+import threading
 import time
+from . import log_pipeline
 from . import logger
 from .search_algorithms import *
+from .cache import QueryCache
+from .calibration import calibrate
+from .calibration import Calibration
 from .database import Database
+from .metrics import MetricsServer
+from .metrics import SearchMetrics
+from .profiling import Profiler
+from .protocol import BUSY
+from .protocol import READ_SIZE
+from .session import call
+from .session import Received
+from .session import run_sync
+from .session import Session
 from .setup import LoadEnv
-from datetime import datetime
+from .tls import create_ssl_context
+from .tls import HandshakeCounter
+from .tracing import SlowQueryLog
+from .tracing import Tracer
+from .watcher import FileWatcher
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from ssl import create_default_context
-from ssl import Purpose
 from ssl import SSLContext
+from ssl import SSLError
+from ssl import SSLSocket
 from typing import Any
 from typing import Callable
+from typing import cast
+from typing import Dict
+from typing import List
 from typing import Tuple
 from typing import Union
 
-algorithms = {
-    "jump": jump_search,
-    "recursive": binary_search_recurse,
-    "iterative": binary_search_iter,
-    "bisect": bisect_search,
-    "linear": python_linear_search,
-}
 
-
-class Server(socketserver.ThreadingTCPServer):
+class SearchService:
     """
-    A subclass of ThreadingMixIn TCPServer to instantiate a server that listens
-    for incoming requests, starting new connection to the server in a new
-    thread.
+    The configuration and the database shared by the server engines, loaded
+    from the environment variables.
 
     Attributes:
         ssl (bool): Whether SSL is enabled.
         certfile (Path or None): Path to the SSL certificate file.
         keyfile (Path or None): Path to the SSL key file.
+        handshake_timeout (float): Seconds a client has to complete the TLS
+        handshake.
+        tls_session_tickets (int): Number of TLS 1.3 session tickets issued
+        per full handshake, 0 to disable session tickets.
+        tls_ecdh_curve (str or None): The key exchange curve, None for the
+        defaults.
+        tls_ciphers (str or None): The TLS 1.2 cipher list, None for the
+        defaults.
+        handshakes (HandshakeCounter): The full and resumed TLS handshakes.
+        listen_backlog (int): The length of the queue of connections waiting
+        to be accepted.
+        max_connections (int): The number of connections served or waiting
+        for a thread at once, more are turned away.
+        max_threads (int): The number of threads serving connections.
+        idle_timeout (float): Seconds a connection may wait between two
+        queries.
+        read_timeout (float): Seconds a client has to finish sending a query
+        it started, or to read an answer.
+        log_sample_rate (float): The share of the queries logged.
+        metrics (SearchMetrics): The counters and histograms of the service.
+        slow_log (SlowQueryLog | None): The thresholds of the slow query log,
+        None when it is disabled.
+        tracer (Tracer): The stage histograms of the requests, logging a
+        sample of them as spans and the slow ones to the slow query log.
+        metrics_address (Tuple[str, int] | None): The (host, port) the
+        metrics are served on, None when they are not.
+        metrics_server (MetricsServer | None): The server exposing the
+        metrics, once the database is opened.
+        profiler (Profiler): The profiler started and stopped on demand, from
+        SIGUSR1 and SIGUSR2 or from the admin commands of the metrics server.
         reread_on_query (bool): Whether to reload data from the file on each
         query.
+        reload_checksum (bool): Whether to verify the file content digest when
+        looking for changes.
+        reload_watch (bool): Whether to keep the data fresh from a background
+        watcher thread instead of checking the file on each query.
+        reload_poll_interval (float): Seconds between two polls of the file.
+        storage (str): Where the search strings are held.
+        mmap_block_size (int): Bytes per block of the "mmap" storage index.
+        index_cache (bool): Whether the "compact" storage is persisted to an
+        index cache file next to the data file.
+        bloom_fp_rate (float | None): The false positive rate of the Bloom
+        filter in front of the database, None when it is disabled.
+        bloom_max_bytes (int | None): Memory budget of the Bloom filter.
+        cache_size (int): Number of query results cached, 0 when disabled.
+        cache_policy (str): Replacement policy of the result cache.
+        algorithm_name (str): The configured search algorithm, "auto" when it
+        is picked by a benchmark on activation.
+        auto_queries_per_reload (int): The number of queries "auto" spreads
+        the time to rebuild the index over when rereading.
+        legacy_timeout (float): The seconds a first query without a newline
+        waits for the rest of its line, 0 to answer it at once.
         linuxpath (Path): Path to the data file.
         debug (Path): Debugging options.
+        algorithm (Callable[[Any, str], bool]): The search algorithm.
+        index_builder (Callable[[List[str]], Any]): The function building the
+        index searched by the algorithm.
+        watcher (FileWatcher | None): The thread reloading the data when
+        the search file changes, None when queries check it themselves.
+        database (Database): The database, once opened.
+    """
+
+    def configure(self, env_vars_obj: LoadEnv) -> None:
+        """
+        Read the configuration of the service from the environment variables.
+
+        Args:
+            env_vars_obj (LoadEnv): An object containing environment variables.
+        """
+        self.ssl: bool = env_vars_obj.SSL
+        self.certfile: Union[Path, None] = env_vars_obj.CERTFILE
+        self.keyfile: Union[Path, None] = env_vars_obj.KEYFILE
+        self.handshake_timeout: float = env_vars_obj.HANDSHAKE_TIMEOUT
+        self.tls_session_tickets: int = env_vars_obj.TLS_SESSION_TICKETS
+        self.tls_ecdh_curve: Union[str, None] = env_vars_obj.TLS_ECDH_CURVE
+        self.tls_ciphers: Union[str, None] = env_vars_obj.TLS_CIPHERS
+        self.handshakes: HandshakeCounter = HandshakeCounter()
+        self.listen_backlog: int = env_vars_obj.LISTEN_BACKLOG
+        self.max_connections: int = env_vars_obj.MAX_CONNECTIONS
+        self.max_threads: int = env_vars_obj.MAX_THREADS
+        self.idle_timeout: float = env_vars_obj.IDLE_TIMEOUT
+        self.read_timeout: float = env_vars_obj.READ_TIMEOUT
+        self.log_sample_rate: float = env_vars_obj.LOG_SAMPLE_RATE
+        self.metrics: SearchMetrics = SearchMetrics()
+        self.metrics.gauge(
+            "search_log_dropped_records",
+            "Log records dropped because the log queue was full.",
+            lambda: log_pipeline.queue_handler.dropped,
+        )
+        self.slow_log: Union[SlowQueryLog, None] = (
+            SlowQueryLog(
+                int(env_vars_obj.SLOW_QUERY_MS * 1e6),
+                (
+                    int(env_vars_obj.SLOW_STAGE_MS * 1e6)
+                    if env_vars_obj.SLOW_STAGE_MS is not None
+                    else None
+                ),
+                env_vars_obj.ALGORITHM,
+            )
+            if env_vars_obj.SLOW_QUERY_LOG is not None
+            else None
+        )
+        self.tracer: Tracer = Tracer(
+            self.metrics, env_vars_obj.TRACE_SAMPLE_RATE, self.slow_log
+        )
+        self.metrics_address: Union[Tuple[str, int], None] = (
+            (str(env_vars_obj.METRICS_HOST), env_vars_obj.METRICS_PORT)
+            if env_vars_obj.METRICS_PORT is not None
+            else None
+        )
+        self.metrics_server: Union[MetricsServer, None] = None
+        self.profiler: Profiler = Profiler(
+            env_vars_obj.PROFILE_DIR,
+            env_vars_obj.PROFILE_MODE,
+            env_vars_obj.PROFILE_INTERVAL,
+        )
+        self.reread_on_query: bool = env_vars_obj.REREAD_ON_QUERY
+        self.reload_checksum: bool = env_vars_obj.RELOAD_CHECKSUM
+        self.reload_watch: bool = env_vars_obj.RELOAD_WATCH
+        self.reload_poll_interval: float = env_vars_obj.RELOAD_POLL_INTERVAL
+        self.watcher: Union[FileWatcher, None] = None
+        self.storage: str = env_vars_obj.STORAGE
+        self.mmap_block_size: int = env_vars_obj.MMAP_BLOCK_SIZE
+        self.index_cache: bool = env_vars_obj.INDEX_CACHE
+        self.bloom_fp_rate: Union[float, None] = (
+            env_vars_obj.BLOOM_FP_RATE if env_vars_obj.BLOOM_FILTER else None
+        )
+        self.bloom_max_bytes: Union[int, None] = env_vars_obj.BLOOM_MAX_BYTES
+        self.cache_size: int = env_vars_obj.CACHE_SIZE
+        self.cache_policy: str = env_vars_obj.CACHE_POLICY
+        self.linuxpath: Path = env_vars_obj.LINUXPATH
+        self.debug: Path = env_vars_obj.DEBUG
+        self.algorithm_name: str = env_vars_obj.ALGORITHM
+        self.legacy_timeout: float = env_vars_obj.LEGACY_TIMEOUT
+        self.auto_queries_per_reload: int = (
+            env_vars_obj.AUTO_QUERIES_PER_RELOAD
+        )
+
+        # "auto" searches with bisect until calibrated on activation
+        algorithm: SearchAlgorithm = get_algorithm(
+            "bisect" if self.algorithm_name == "auto" else self.algorithm_name
+        )
+        self.algorithm: Callable[[Any, str], bool] = algorithm.search
+        self.index_builder: Callable[[List[str]], Any] = (
+            algorithm.index_builder
+        )
+
+    def load_ssl_context(self) -> Union[SSLContext, None]:
+        """
+        Create the SSL context of the service if SSL is enabled.
+
+        Returns:
+            SSLContext | None: The context, None when SSL is disabled.
+        """
+        if not self.ssl:
+            return None
+        return create_ssl_context(
+            self.certfile,
+            self.keyfile,
+            session_tickets=self.tls_session_tickets,
+            ecdh_curve=self.tls_ecdh_curve,
+            ciphers=self.tls_ciphers,
+        )
+
+    def load_database(self) -> Database:
+        """
+        Load the search file into a new database, picking the algorithm first
+        when it is "auto".
+
+        Returns:
+            Database: The database, checking the file on each query only when
+                      rereading without the file watcher.
+        """
+        # when watching, the watcher thread reloads the data so queries do
+        # not have to check the file themselves
+        watch: bool = self.reread_on_query and self.reload_watch
+        if self.algorithm_name == "auto" and self.storage == "memory":
+            # queries only rebuild the index when they reread the file
+            self.__calibrate(self.reread_on_query and not watch)
+
+        database: Database = Database(
+            self.reread_on_query and not watch,
+            self.linuxpath,
+            self.index_builder,
+            verify_checksum=self.reload_checksum,
+            storage=self.storage,
+            block_size=self.mmap_block_size,
+            index_cache=self.index_cache,
+            bloom_fp_rate=self.bloom_fp_rate,
+            bloom_max_bytes=self.bloom_max_bytes,
+            cache=(
+                QueryCache(self.cache_size, self.cache_policy)
+                if self.cache_size
+                else None
+            ),
+        )
+        logger.info(
+            f"loaded search file into {self.storage} storage "
+            f"({database.memory_footprint()} bytes)"
+        )
+        if self.bloom_fp_rate is not None:
+            logger.info(f"bloom filter enabled {database.bloom_stats()}")
+        if database.cache is not None:
+            logger.info(
+                f"query cache enabled ({self.cache_size} {self.cache_policy})"
+            )
+        return database
+
+    def open_database(self, database: Union[Database, None] = None) -> None:
+        """
+        Make the database available to the service, loading it unless one was
+        loaded beforehand, and start the file watcher and the metrics server
+        if enabled.
+
+        Args:
+            database (Database | None): A database loaded before the service
+                                        was started, e.g. by the pre-fork
+                                        supervisor, None to load it here.
+        """
+        # make the read file data available to the server instance
+        self.database: Database = (
+            database if database is not None else self.load_database()
+        )
+        if self.reread_on_query and self.reload_watch:
+            self.watcher = FileWatcher(
+                self.database, self.reload_poll_interval
+            )
+            self.watcher.start()
+
+        self.metrics.register(self.database.reload_duration)
+        if self.metrics_address is not None:
+            self.metrics_server = MetricsServer(
+                self.metrics_address, self.metrics
+            )
+            self.metrics_server.commands.update(
+                {
+                    "/profile/start": self.__start_profiler,
+                    "/profile/stop": self.__stop_profiler,
+                }
+            )
+            self.metrics_server.start()
+            logger.info(
+                "serving metrics on "
+                f"http://{self.metrics_address[0]}:"
+                f"{self.metrics_server.server_address[1]}/metrics"
+            )
+
+    def close_database(self) -> None:
+        """
+        Stop the file watcher, the metrics server and the profiler if they are
+        running and log the query cache and TLS handshake counters.
+        """
+        if self.watcher is not None:
+            self.watcher.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        # write the profile of a session left running
+        self.profiler.stop()
+        database: Union[Database, None] = getattr(self, "database", None)
+        if database is not None and database.cache is not None:
+            logger.info(f"query cache {database.cache.stats()}")
+        if self.ssl:
+            logger.info(f"tls handshakes {self.handshakes.stats()}")
+
+    def dump_metrics(self) -> None:
+        """
+        Log a summary of the metrics, e.g. on SIGHUP.
+        """
+        logger.info(f"metrics {self.metrics.summary()}")
+
+    def __start_profiler(self) -> Tuple[str, bytes]:
+        """start profiling, the /profile/start admin command"""
+        if not self.profiler.start():
+            return "text/plain", b"profiler already running\n"
+        return (
+            "text/plain",
+            f"profiler started ({self.profiler.mode})\n".encode(),
+        )
+
+    def __stop_profiler(self) -> Tuple[str, bytes]:
+        """stop profiling, the /profile/stop admin command"""
+        path: Union[Path, None] = self.profiler.stop()
+        if path is None:
+            return "text/plain", b"profiler not running\n"
+        return "text/plain", f"profile written to {path}\n".encode()
+
+    def __calibrate(self, include_rebuild: bool) -> None:
+        """
+        Benchmark every registered algorithm on the search file and lock in
+        the fastest one.
+
+        Args:
+            include_rebuild (bool): Whether the queries rebuild the index, the
+                                    build time then counts against every
+                                    algorithm, spread over
+                                    auto_queries_per_reload queries.
+        """
+        result: Calibration = calibrate(
+            self.linuxpath, include_rebuild, self.auto_queries_per_reload
+        )
+        algorithm: SearchAlgorithm = get_algorithm(result.winner)
+        if self.slow_log is not None:
+            self.slow_log.algorithm = result.winner
+        self.algorithm = algorithm.search
+        self.index_builder = algorithm.index_builder
+        latencies: str = ", ".join(
+            f"{name}: {lookup / 1000:.2f}us lookup "
+            f"{result.build_ns[name] / 1_000_000:.1f}ms build"
+            for name, lookup in result.lookup_ns.items()
+        )
+        logger.info(
+            f"auto algorithm picked '{result.winner}' "
+            f"(rebuild {'included' if include_rebuild else 'excluded'}) "
+            f"{{{latencies}}}"
+        )
+
+
+class Server(SearchService, socketserver.ThreadingTCPServer):
+    """
+    A subclass of ThreadingMixIn TCPServer to instantiate a server that listens
+    for incoming requests, serving every connection from a bounded pool of
+    threads. The configuration and the database are those of SearchService.
+
+    Attributes:
+        reuse_port (bool): Whether the socket is bound with SO_REUSEPORT.
+        ssl_context (SSLContext | None): The context wrapping every accepted
+        connection, None when SSL is disabled.
+        request_queue_size (int): The listen backlog of the server socket.
+        executor (ThreadPoolExecutor): The threads serving the connections,
+        connections wait in its queue while they are all busy, for the read
+        timeout at most.
+        __requests (Dict[Tuple[str, int], socket]): The socket of every
+        connection served or waiting, by client address.
     """
 
     def __init__(
@@ -52,6 +399,10 @@ class Server(socketserver.ThreadingTCPServer):
             socketserver.StreamRequestHandler,
         ],
         env_vars_obj: LoadEnv,
+        database: Union[Database, None] = None,
+        listen_socket: Union[socket.socket, None] = None,
+        reuse_port: bool = False,
+        ssl_context: Union[SSLContext, None] = None,
     ):
         """
         Initialize a new server instance.
@@ -60,102 +411,357 @@ class Server(socketserver.ThreadingTCPServer):
             server_address (tuple): The server address as a (host, port) tuple.
             RequestHandlerClass (Callable): The request handler class to use.
             env_vars_obj (LoadEnv): An object containing environment variables.
+            database (Database | None): A database loaded beforehand, None to
+                                        load it on activation.
+            listen_socket (socket | None): A bound socket to accept from,
+                                           e.g. inherited from a supervisor,
+                                           None to bind a new one.
+            reuse_port (bool): Whether to bind with SO_REUSEPORT so that
+                               several processes listen on the same port.
+            ssl_context (SSLContext | None): A context created beforehand,
+                                             e.g. by the supervisor so that
+                                             its workers share the session
+                                             ticket key, None to create it
+                                             on activation.
         """
-        self.ssl: bool = env_vars_obj.SSL
-        self.certfile: Union[Path, None] = env_vars_obj.CERTFILE
-        self.keyfile: Union[Path, None] = env_vars_obj.KEYFILE
-        self.reread_on_query: bool = env_vars_obj.REREAD_ON_QUERY
-        self.linuxpath: Path = env_vars_obj.LINUXPATH
-        self.debug: Path = env_vars_obj.DEBUG
-        self.algorithm: Callable[[List[str], str], bool] = algorithms[
-            env_vars_obj.ALGORITHM
-        ]
-        self.daemon_threads: bool = True
+        self.configure(env_vars_obj)
+        self.metrics.gauge(
+            "search_open_connections",
+            "Connections served or waiting for a thread.",
+            lambda: self.open_connections,
+        )
+        self.request_queue_size: int = self.listen_backlog
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=self.max_threads, thread_name_prefix="connection"
+        )
+        self.reuse_port: bool = reuse_port
+        self.__requests: Dict[Tuple[str, int], Any] = {}
+        self.__requests_lock = threading.Lock()
+        self.ssl_context: Union[SSLContext, None] = ssl_context
+        self.__database: Union[Database, None] = database
+
+        if listen_socket is None:
+            super().__init__(server_address, RequestHandlerClass)
+            return
+
+        # accept from the given socket instead of binding a new one
+        super().__init__(
+            server_address, RequestHandlerClass, bind_and_activate=False
+        )
+        self.socket.close()
+        self.socket = listen_socket
+        self.server_address = listen_socket.getsockname()
+        try:
+            self.server_activate()
+        except BaseException:
+            self.server_close()
+            raise
 
-        super().__init__(server_address, RequestHandlerClass)
+    def server_bind(self) -> None:
+        """
+        Bind the server socket, sharing its port with the other workers when
+        reuse_port is set.
+        """
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
 
     def server_activate(self) -> None:
         """
         Activate the server instance, initialize the database, and set up SSL
         if enabled.
         """
-        # make the read file data available to the server instance
-        self.database: Database = Database(
-            self.reread_on_query, self.linuxpath, sorted
-        )
+        self.open_database(self.__database)
+        self.__database = None  # the service holds it from now on
 
-        # secure the server if SSL authentication is set to True
-        if self.ssl:
-            context: SSLContext = create_default_context(Purpose.CLIENT_AUTH)
-            secret = (self.certfile, self.keyfile)
-            context.load_cert_chain(*secret)  # type: ignore
-            self.socket = context.wrap_socket(self.socket, server_side=True)
+        # secure the server if SSL authentication is set to True, the
+        # listening socket stays plain and every accepted connection is
+        # wrapped by the thread handling it
+        if self.ssl_context is None:
+            self.ssl_context = self.load_ssl_context()
 
         # activate the TCP server
         super().server_activate()
         logger.info("server is up and running, waiting for client sockets")
 
+    @property
+    def open_connections(self) -> int:
+        """The number of connections served or waiting for a thread."""
+        return len(self.__requests)
+
+    def process_request(
+        self, request: Any, client_address: Tuple[str, int]
+    ) -> None:
+        """
+        Queue a connection for the thread pool, or turn it away if
+        max_connections connections are already open. A queued connection
+        no thread picked up within the read timeout is turned away then.
+
+        Args:
+            request (socket): The accepted connection.
+            client_address (tuple): The address of the client.
+        """
+        with self.__requests_lock:
+            accepted: bool = len(self.__requests) < self.max_connections
+            if accepted:
+                self.__requests[client_address] = request
+        if not accepted:
+            self.metrics.rejected.inc()
+            self.reject_request(request, client_address)
+            return
+        self.metrics.connections.inc()
+        try:
+            self.executor.submit(
+                self.__serve, request, client_address, time.monotonic()
+            )
+        except RuntimeError:
+            # the pool was shut down by server_close
+            self.__forget(client_address)
+            self.shutdown_request(request)
+
+    def reject_request(
+        self, request: Any, client_address: Tuple[str, int]
+    ) -> None:
+        """
+        Answer a connection the server has no capacity for and close it.
+        The answer is only sent on plain connections, a TLS client sees its
+        connection closed.
+
+        Args:
+            request (socket): The accepted connection.
+            client_address (tuple): The address of the client.
+        """
+        logger.error(
+            "{"
+            f"client_ip: {client_address[0]}, "
+            f"open_connections: {self.open_connections}, "
+            "action: server busy, closing connection to client"
+            "}"
+        )
+        if self.ssl_context is None:
+            try:
+                # the answer fits in the socket buffer, never wait on it
+                request.setblocking(False)
+                request.send(BUSY)
+            except OSError:
+                pass
+        self.shutdown_request(request)
+
+    def __serve(
+        self, request: Any, client_address: Tuple[str, int], queued: float
+    ) -> None:
+        """serve a connection in a pool thread, then forget it"""
+        try:
+            # the client waited for a thread longer than it is given to send
+            # a query, it is turned away rather than served late
+            if time.monotonic() - queued > self.read_timeout:
+                self.metrics.rejected.inc()
+                self.reject_request(request, client_address)
+                return
+            self.process_request_thread(request, client_address)
+        finally:
+            self.__forget(client_address)
+
+    def __forget(self, client_address: Tuple[str, int]) -> None:
+        """stop tracking a closed connection"""
+        with self.__requests_lock:
+            self.__requests.pop(client_address, None)
+
+    def handle_error(
+        self, request: Any, client_address: Tuple[str, int]
+    ) -> None:
+        """
+        Log a connection dropped for exceeding its timeouts, or going away,
+        without a traceback. Other errors are reported by the base class.
+
+        Args:
+            request (socket): The connection.
+            client_address (tuple): The address of the client.
+        """
+        error: Union[BaseException, None] = sys.exc_info()[1]
+        if isinstance(error, socket.timeout):
+            logger.info(
+                "{"
+                f"client_ip: {client_address[0]}, "
+                f"comm_port: {client_address[1]}, "
+                "client_error: timed out, "
+                "action: closing connection to client"
+                "}"
+            )
+        elif not isinstance(error, ConnectionError):
+            super().handle_error(request, client_address)
+
+    def finish_request(
+        self, request: Any, client_address: Tuple[str, int]
+    ) -> None:
+        """
+        Perform the TLS handshake of a connection if SSL is enabled, then
+        handle it. This runs in the thread of the connection, so a slow
+        handshake never holds up the accept loop.
+
+        Args:
+            request (socket): The accepted connection.
+            client_address (tuple): The address of the client.
+        """
+        context: Union[SSLContext, None] = self.ssl_context
+        if context is None:
+            super().finish_request(request, client_address)
+            return
+
+        try:
+            tls_request: SSLSocket = context.wrap_socket(
+                request, server_side=True, do_handshake_on_connect=False
+            )
+        except OSError:
+            request.close()
+            return
+        with self.__requests_lock:
+            if client_address in self.__requests:
+                self.__requests[client_address] = tls_request
+        try:
+            # bound the handshake so an idle client can not hold the thread
+            tls_request.settimeout(self.handshake_timeout)
+            tls_request.do_handshake()
+            tls_request.settimeout(None)
+            self.handshakes.record(tls_request)
+        except (SSLError, OSError) as e:
+            logger.error(
+                "{"
+                f"client_ip: {client_address[0]}, "
+                f"handshake_error: {str(e) or type(e).__name__}, "
+                "action: closing connection to client"
+                "}"
+            )
+            tls_request.close()
+            return
+        try:
+            super().finish_request(tls_request, client_address)
+        finally:
+            # the plain socket was detached by the wrap, close the TLS one
+            self.shutdown_request(tls_request)
+
+    def server_close(self) -> None:
+        """
+        Stop the file watcher if one is running, log the query cache
+        counters, close the server socket and end every open connection.
+        """
+        self.close_database()
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        # wake the threads waiting on their client so that the pool winds
+        # down instead of holding the process until the idle timeout
+        with self.__requests_lock:
+            requests: List[Any] = list(self.__requests.values())
+            self.__requests.clear()
+        for request in requests:
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
 
 class TCPHandler(socketserver.StreamRequestHandler):
     """
     A subclass of StreamRequestHandler to handle incoming client requests.
+
+    Attributes:
+        __poller (select.poll): Waits for the client to send something.
     """
 
+    def setup(self) -> None:
+        """
+        Set up the streams of the connection and the poller of its socket.
+        """
+        super().setup()
+        # the buffered stream of the socket, read with read1
+        self.rfile: io.BufferedReader = cast(io.BufferedReader, self.rfile)
+        self.__poller = select.poll()
+        self.__poller.register(self.connection, select.POLLIN)
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Wait for the client to send something, without reading it.
+
+        Args:
+            timeout (float): The seconds to wait.
+
+        Returns:
+            bool: Whether the client sent something, or closed the
+                  connection, in time.
+        """
+        connection = self.connection
+        # the bytes TLS decrypted already are read without waiting, the
+        # buffer of rfile is always empty as read1 reads past it
+        return (
+            isinstance(connection, SSLSocket) and connection.pending() > 0
+        ) or bool(self.__poller.poll(timeout * 1000))
+
+    async def read(
+        self, partial: bool, timeout: Union[float, None] = None
+    ) -> Union[Received, None]:
+        """
+        Read whatever the client sent so far, with at most one recv. The wait
+        for the client is kept out of the timing of the read.
+
+        Args:
+            partial (bool): Whether the client started a query it did not
+                            finish, it then has the read timeout to send the
+                            rest instead of the idle timeout.
+            timeout (float | None): The seconds to wait instead, if given.
+
+        Returns:
+            Received | None: The bytes read, empty once the client closed the
+                             connection, None if nothing was received within
+                             the timeout given.
+
+        Raises:
+            socket.timeout: If nothing was received in time.
+        """
+        server = self.server
+        connection = self.connection
+        if timeout is not None and not self.wait(timeout):
+            return None
+        if not self.wait(
+            server.read_timeout if partial else server.idle_timeout  # type: ignore
+        ):
+            raise socket.timeout("timed out")
+        # the rest of a TLS record may still be on its way
+        connection.settimeout(server.read_timeout)  # type: ignore
+        # let a cProfile session reach the thread, None unless profiling
+        hook: Union[Callable[[], None], None] = (
+            server.profiler.hook  # type: ignore
+        )
+        if hook is not None:
+            hook()
+        recv_start: int = time.perf_counter_ns()
+        data: bytes = self.rfile.read1(READ_SIZE)
+        return Received(data, recv_start, time.perf_counter_ns())
+
+    async def write(self, data: bytes) -> None:
+        """
+        Send answers to the client, which has the read timeout to take them.
+
+        Args:
+            data (bytes): The answers.
+
+        Raises:
+            socket.timeout: If the client does not read the answers in time.
+        """
+        self.connection.settimeout(self.server.read_timeout)  # type: ignore
+        self.wfile.write(data)
+
     def handle(self) -> None:
         """
         Handle a request sent to the server.
         Continuously read and process data from the client until the connection
         is closed.
         """
-        # supply the database object to the request handler
-        database = self.server.database  # type: ignore
-        client_ip = self.client_address[0]
-        comm_port = self.client_address[1]
-        algorithm = self.server.algorithm  # type: ignore
-
-        while True:
-            try:
-                # fetch the request query and strip off \x00 from the end
-                req_data = self.request.recv(1024).strip().strip(b"\x00")
-                # time request was recieved
-                query_time = datetime.now().isoformat()
-                process_start = time.time()
-
-                # decode the recieved data packet
-                req_str = req_data.decode()
-
-                if not req_str:
-                    break
-
-                # search the database wether the search string exists
-                if req_str and database.search(algorithm, f"{req_str}\n"):
-                    self.request.sendall(b"STRING EXISTS\n")
-                else:
-                    self.request.sendall(b"STRING NOT FOUND\n")
-                resp_time = datetime.now().isoformat()
-                # time response was sent
-                process_end = time.time()
-                duration = round((process_end - process_start) * 1000, 2)
-
-                log_message = (
-                    "{"
-                    f"client_ip: {client_ip}, "
-                    f"comm_port: {comm_port}, "
-                    f"query: {req_data}, "
-                    f"time: {query_time}, "
-                    f"duration(ms): {duration}"
-                    "}"
-                )
-                # print to the tcp output using the logging module
-                logger.debug(log_message)
-
-            # catch undecodable bytes query error
-            except UnicodeDecodeError as e:
-                err_msg = (
-                    "{"
-                    f"client_error: {str(e)}, "
-                    f"action: closing connection to client"
-                    "}"
-                )
-                logger.error(err_msg)
-                break  # break out of the loop
+        # the steps block the thread of the connection, they never suspend
+        session: Session = Session(
+            self.server,  # type: ignore
+            self.client_address,
+            self.read,
+            self.write,
+            call,
+        )
+        run_sync(session.serve())
@@ -2,8 +2,13 @@
 """
 This module starts up the server waiting for client connection
 """
+import asyncio
 from . import env_vars
 from . import logger
+from .async_server import AsyncServer
+from .metrics import dump_on_signal
+from .profiling import profile_on_signal
+from .prefork import Supervisor
 from .server import Server
 from .server import TCPHandler
 from pydantic_core import ValidationError
@@ -12,10 +17,22 @@ if __name__ == "__main__":
     try:
         # env_vars: LoadEnv = LoadEnv()  # type: ignore
         server_addr = (str(env_vars.HOST), env_vars.PORT)
-        with Server(server_addr, TCPHandler, env_vars) as server:
-            # activate the server and leave it running until closed
-            # print("Server is up and running")
-            server.serve_forever()
+        if env_vars.WORKERS > 1:
+            # fork the workers from a supervisor sharing the loaded data
+            Supervisor(server_addr, env_vars, env_vars.WORKERS).run()
+        elif env_vars.ENGINE == "asyncio":
+            # serve every client from a single event loop
+            async_server = AsyncServer(server_addr, env_vars)
+            dump_on_signal(async_server.dump_metrics)  # log them on SIGHUP
+            profile_on_signal(async_server.profiler)  # SIGUSR1 and SIGUSR2
+            asyncio.run(async_server.serve_forever())
+        else:
+            with Server(server_addr, TCPHandler, env_vars) as server:
+                dump_on_signal(server.dump_metrics)  # log them on SIGHUP
+                profile_on_signal(server.profiler)  # SIGUSR1 and SIGUSR2
+                # activate the server and leave it running until closed
+                # print("Server is up and running")
+                server.serve_forever()
 
     # catch operating system error
     except OSError as OSE:
@@ -24,4 +41,6 @@ if __name__ == "__main__":
     # catch keyboard interrupt signal
     except KeyboardInterrupt as k:
         logger.info("SIGINT recieved, shutting down server.....")
-        server.server_close()
+        # the event loop closes the asyncio server as it is cancelled
+        if env_vars.ENGINE != "asyncio" and env_vars.WORKERS == 1:
+            server.server_close()
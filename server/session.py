@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+This module contains the processing of the requests of a connection, shared
+by the server engines. A Session frames and decodes what the client sends,
+searches the database, answers and traces every request through the read and
+write steps of its engine, so that an engine only does the I/O of its
+connections.
+
+The steps are coroutines. The asyncio engine awaits them from its event loop,
+the threaded engine blocks in them and runs the session with run_sync.
+"""
+import logging
+import time
+from . import logger
+from .logs import BATCH_LOG_FORMAT
+from .logs import QUERY_LOG_FORMAT
+from .logs import sample
+from .protocol import BatchFramer
+from .protocol import BINARY_MAGIC
+from .protocol import encode_bitmap
+from .protocol import FOUND
+from .protocol import NOT_FOUND
+from .protocol import QueryFramer
+from .tracing import Span
+from functools import partial
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Coroutine
+from typing import List
+from typing import NamedTuple
+from typing import Tuple
+from typing import TYPE_CHECKING
+from typing import TypeVar
+from typing import Union
+
+if TYPE_CHECKING:
+    from .server import SearchService
+
+T = TypeVar("T")
+
+
+class Received(NamedTuple):
+    """
+    The bytes returned by one read of a connection.
+
+    Attributes:
+        data (bytes): The bytes read, empty once the client closed the
+                      connection.
+        start (int): The perf_counter_ns() of the start of the read, once
+                     the client sent something.
+        end (int): The perf_counter_ns() of the end of the read.
+    """
+
+    data: bytes
+    start: int
+    end: int
+
+
+# Read whatever the client sent so far. The first argument tells whether the
+# client started a query it did not finish, the second the seconds to wait
+# instead of the timeouts of the service, the read then returning None if
+# nothing came in time.
+ReadStep = Callable[
+    [bool, Union[float, None]], Awaitable[Union[Received, None]]
+]
+
+# Send answers to the client.
+WriteStep = Callable[[bytes], Awaitable[None]]
+
+# Run a blocking call, e.g. off the event loop.
+OffloadStep = Callable[[Callable[[], Any]], Awaitable[Any]]
+
+
+async def call(function: Callable[[], T]) -> T:
+    """
+    Run a blocking call where it is, the offload step of the threaded engine.
+
+    Args:
+        function (Callable[[], T]): The call.
+
+    Returns:
+        T: Its result.
+    """
+    return function()
+
+
+def run_sync(coroutine: Coroutine[Any, Any, T]) -> T:
+    """
+    Run a coroutine whose steps never suspend, e.g. a session over a
+    blocking socket, without an event loop.
+
+    Args:
+        coroutine (Coroutine): The coroutine.
+
+    Returns:
+        T: Its result.
+
+    Raises:
+        RuntimeError: If the coroutine suspended.
+    """
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coroutine.close()
+    raise RuntimeError("a blocking session awaited an event loop")
+
+
+class Session:
+    """
+    The requests of a client connection, from its first read until it is
+    closed or sends a faulty request.
+
+    Attributes:
+        service (SearchService): The configuration and the database.
+        client_address (Tuple[str, int]): The address of the client.
+        read (ReadStep): Reads from the client.
+        write (WriteStep): Writes to the client.
+        offload (OffloadStep): Runs the reloads and the batch lookups.
+        span (Span | None): The stages of the request in progress, None
+                            between two requests.
+        recv_end (int): The perf_counter_ns() of the end of the last read.
+    """
+
+    def __init__(
+        self,
+        service: "SearchService",
+        client_address: Tuple[str, int],
+        read: ReadStep,
+        write: WriteStep,
+        offload: OffloadStep,
+    ):
+        """
+        Initialize a new session.
+
+        Args:
+            service (SearchService): The configuration and the database.
+            client_address (tuple): The address of the client.
+            read (ReadStep): The read step of the engine.
+            write (WriteStep): The write step of the engine.
+            offload (OffloadStep): The step running blocking calls.
+        """
+        self.service: "SearchService" = service
+        self.client_address: Tuple[str, int] = client_address
+        self.read: ReadStep = read
+        self.write: WriteStep = write
+        self.offload: OffloadStep = offload
+        self.span: Union[Span, None] = None
+        self.recv_end: int = 0
+
+    async def serve(self) -> None:
+        """
+        Answer the client until it closes the connection, the first byte it
+        sends telling the protocol of the connection.
+
+        Raises:
+            Exception: Whatever the steps raise, e.g. on timeouts.
+        """
+        first: Received = await self.read(False, None)  # type: ignore
+        if first.data[:1] == BINARY_MAGIC:
+            await self.serve_batches(first._replace(data=first.data[1:]))
+        else:
+            await self.serve_queries(first)
+
+    def receive(self, received: Received) -> Span:
+        """
+        Account for the bytes of the last read, starting a request unless
+        they continue one.
+
+        Args:
+            received (Received): The bytes read.
+
+        Returns:
+            Span: The stages of the request the bytes belong to.
+        """
+        span: Union[Span, None] = self.span
+        if span is None:
+            span = self.span = Span(received.start)
+        span.recv += received.end - received.start
+        self.recv_end = received.end
+        self.service.metrics.bytes_in.inc(len(received.data))
+        return span
+
+    async def answer(
+        self, responses: List[bytes], queries: int, found: int
+    ) -> None:
+        """
+        Send the answers of the current request, ending it, and count them.
+
+        Args:
+            responses (List[bytes]): The answers, in order.
+            queries (int): The number of queries answered.
+            found (int): The number of queries answered with a match.
+        """
+        service = self.service
+        metrics = service.metrics
+        span: Span = self.span  # type: ignore
+        self.span = None
+        payload: bytes = b"".join(responses)
+        send_start: int = time.perf_counter_ns()
+        await self.write(payload)
+        end: int = time.perf_counter_ns()
+        span.send = end - send_start
+        span.queries = queries
+        service.tracer.finish(span, self.client_address, end)
+        # the latency of the queries runs from the read completing them
+        metrics.query_latency.observe(end - self.recv_end, queries)
+        metrics.queries.inc(queries)
+        metrics.found.inc(found)
+        metrics.bytes_out.inc(len(payload))
+
+    def reject(self, error: ValueError) -> None:
+        """
+        Log a faulty request, which ends the connection.
+
+        Args:
+            error (ValueError): What is wrong with the request.
+        """
+        logger.error(
+            "{"
+            f"client_error: {str(error)}, "
+            f"action: closing connection to client"
+            "}"
+        )
+
+    async def serve_queries(self, received: Received) -> None:
+        """
+        Answer the newline terminated queries of the client, or the single
+        unterminated query of a client of the first version of the protocol.
+
+        Args:
+            received (Received): The first read of the connection.
+        """
+        service = self.service
+        database = service.database
+        client_ip, comm_port = self.client_address[:2]
+        algorithm = service.algorithm
+        sample_rate: float = service.log_sample_rate
+        log_queries: bool = logger.isEnabledFor(logging.DEBUG)
+        search_duration = service.metrics.search_duration
+        legacy_timeout: float = service.legacy_timeout
+        framer: QueryFramer = QueryFramer(defer_legacy=legacy_timeout > 0)
+
+        # None once a first query without a newline expired
+        current: Union[Received, None] = received
+        while current is None or current.data:
+            span: Span = (
+                self.receive(current) if current is not None else self.span  # type: ignore
+            )
+            # frame and decode the queries completed by the data read, a
+            # faulty one ends the connection once those preceding it are
+            # answered
+            decode_start: int = time.perf_counter_ns()
+            queries: List[str] = []
+            error: Union[ValueError, None] = None
+            try:
+                for req_data in (
+                    framer.feed(current.data)
+                    if current is not None
+                    else framer.expire()
+                ):
+                    queries.append(req_data.decode())
+            except ValueError as e:
+                error = e
+            decode_end: int = time.perf_counter_ns()
+            span.decode += decode_end - decode_start
+
+            # check the search file once for all the queries
+            if queries and database.reread_on_query:
+                span.reloaded = await self.offload(database.refresh)
+                span.reload = time.perf_counter_ns() - decode_end
+            # the version of the data the queries are searched in
+            span.version = database.snapshot.version
+
+            # answer every query and send the answers together
+            responses: List[bytes] = []
+            search_total: int = 0
+            try:
+                for req_str in queries:
+                    # time request was recieved
+                    process_start = time.perf_counter_ns()
+
+                    # search the database wether the search string exists
+                    if req_str and database.search(
+                        algorithm, f"{req_str}\n", refresh=False
+                    ):
+                        responses.append(FOUND)
+                    else:
+                        responses.append(NOT_FOUND)
+                    process_end = time.perf_counter_ns()
+                    search_duration.observe(process_end - process_start)
+                    search_total += process_end - process_start
+
+                    # log a sample of the queries, the record is only
+                    # formatted by the log pipeline thread
+                    if log_queries and sample(sample_rate):
+                        logger.debug(
+                            QUERY_LOG_FORMAT,
+                            client_ip,
+                            comm_port,
+                            req_str,
+                            round((process_end - process_start) / 1e6, 2),
+                        )
+            finally:
+                # answer the queries preceding a faulty one
+                if responses:
+                    span.search = search_total
+                    span.strings = queries
+                    await self.answer(
+                        responses, len(responses), responses.count(FOUND)
+                    )
+            # catch undecodable bytes and overlong query errors
+            if error is not None:
+                self.reject(error)
+                return
+            # a deferred first query without a newline is taken for one of
+            # the first version of the protocol once nothing followed it for
+            # the legacy timeout
+            current = await self.read(
+                framer.partial, legacy_timeout if framer.undecided else None
+            )
+
+    async def serve_batches(self, received: Received) -> None:
+        """
+        Answer the batches of a client speaking the binary protocol until the
+        connection is closed. The batches are looked up with the offload
+        step so that a large one does not stall the other connections of the
+        asyncio engine.
+
+        Args:
+            received (Received): The bytes of the first read after the
+                                 protocol byte.
+        """
+        service = self.service
+        database = service.database
+        client_ip, comm_port = self.client_address[:2]
+        algorithm = service.algorithm
+        sample_rate: float = service.log_sample_rate
+        log_batches: bool = logger.isEnabledFor(logging.DEBUG)
+        metrics = service.metrics
+
+        framer: BatchFramer = BatchFramer()
+        while True:
+            span: Span = self.receive(received)
+            decode_start: int = time.perf_counter_ns()
+            try:
+                batches: List[List[str]] = framer.feed(received.data)
+            # catch undecodable keys and oversized batch errors
+            except ValueError as e:
+                self.reject(e)
+                return
+            stage_end: int = time.perf_counter_ns()
+            span.decode += stage_end - decode_start
+            if batches and database.reread_on_query:
+                span.reloaded = await self.offload(database.refresh)
+                reload_end: int = time.perf_counter_ns()
+                span.reload = reload_end - stage_end
+                stage_end = reload_end
+            # the version of the data the queries are searched in
+            span.version = database.snapshot.version
+
+            responses: List[bytes] = []
+            keys_count: int = 0
+            found_count: int = 0
+            for keys in batches:
+                process_start = time.perf_counter_ns()
+                # the whole batch is looked up from a single snapshot
+                found: List[bool] = await self.offload(
+                    partial(
+                        database.search_many, algorithm, keys, refresh=False
+                    )
+                )
+                responses.append(encode_bitmap(found))
+                process_end = time.perf_counter_ns()
+                metrics.search_duration.observe(process_end - process_start)
+                keys_count += len(keys)
+                found_count += sum(found)
+                if log_batches and sample(sample_rate):
+                    logger.debug(
+                        BATCH_LOG_FORMAT,
+                        client_ip,
+                        comm_port,
+                        len(keys),
+                        sum(found),
+                        round((process_end - process_start) / 1e6, 2),
+                    )
+            if responses:
+                span.search = time.perf_counter_ns() - stage_end
+                span.strings = batches
+                # every key of a batch waits for the whole batch
+                await self.answer(responses, keys_count, found_count)
+                metrics.batches.inc(len(responses))
+            received = await self.read(framer.partial, None)  # type: ignore
+            if not received.data:
+                break
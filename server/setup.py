@@ -3,7 +3,9 @@
 This module sets up and configures the server environment variables, ensuring
 they are loaded and validated correctly.
 """
+import importlib.util
 import logging
+import ssl
 from pathlib import Path
 from pydantic import Field
 from pydantic import field_validator
@@ -11,6 +13,8 @@ from pydantic import ValidationInfo
 from pydantic_settings import BaseSettings
 from pydantic_settings import SettingsConfigDict
 from pydantic.networks import IPvAnyAddress
+from .logs import LOG_LEVELS
+from .search_algorithms import algorithm_names
 from typing import Union
 from typing_extensions import Annotated
 
@@ -22,31 +26,152 @@ class LoadEnv(BaseSettings):
 
     Attributes:
         HOST (IPvAnyAddress): The IP address on which the server runs.
-        PORT (Annotated[int, Field(gt=0, lt=65535)]): The port number on which
+        PORT (Annotated[int, Field(gt=0, le=65535)]): The port number on which
                                                       the server runs.
-        TEST_PORT (Annotated[int, Field(gt=0, lt=65535)]): The port number on
+        TEST_PORT (Annotated[int, Field(gt=0, le=65535)]): The port number on
                                                       which the test servers
                                                       run.
         LINUXPATH (Path): The path to the Linux search file.
+        ENGINE (str): The server engine, "threading" for a thread per
+                      connection or "asyncio" for an event loop.
+        WORKERS (int): The number of server processes, more than one forks
+                       them from a supervisor sharing the loaded data.
+        LISTEN_BACKLOG (int): The length of the queue of connections waiting
+                              to be accepted.
+        MAX_CONNECTIONS (int): The number of connections open at once per
+                               process, more are answered "SERVER BUSY".
+        MAX_THREADS (int): The number of threads serving connections in the
+                           "threading" engine.
+        IDLE_TIMEOUT (float): The number of seconds a connection may stay
+                              idle between two queries.
+        READ_TIMEOUT (float): The number of seconds a client has to finish
+                              sending a query, or to read an answer.
+        LEGACY_TIMEOUT (float): The number of seconds a first query without
+                                a newline waits for the rest of its line
+                                before it is answered as a query of the
+                                first version of the protocol, 0 to answer
+                                it at once.
         SSL (bool): Whether SSL is enabled or not.
         REREAD_ON_QUERY (bool): Whether to reload the search string file
                                 momentarily.
+        RELOAD_CHECKSUM (bool): Whether to compare a digest of the search
+                                file content, on top of its inode, size and
+                                modification time, when looking for changes.
+        RELOAD_WATCH (bool): Whether to watch the search file in a background
+                             thread instead of checking it on every query.
+        RELOAD_POLL_INTERVAL (float): The number of seconds between two checks
+                                      of the search file when it is polled.
         CERTFILE (Path | None): The path to the SSL certificate file.
         KEYFILE (Path | None): The path to the SSL key file.
-        ALGORITHM (str): The search algorithm to use
+        HANDSHAKE_TIMEOUT (float): The number of seconds a client has to
+                                   complete the TLS handshake.
+        TLS_SESSION_TICKETS (int): The number of TLS 1.3 session tickets
+                                   issued per full handshake, 0 to disable
+                                   session tickets.
+        TLS_ECDH_CURVE (str | None): The curve of the key exchange, None for
+                                     the OpenSSL defaults.
+        TLS_CIPHERS (str | None): The OpenSSL cipher list of TLS 1.2, None
+                                  for the defaults.
+        ALGORITHM (str): The search algorithm to use, "auto" to benchmark
+                         them all on start up
+        AUTO_QUERIES_PER_RELOAD (int): The number of queries expected between
+                                       two changes of the search file, over
+                                       which "auto" spreads the time to
+                                       rebuild the index when rereading.
+        STORAGE (str): Where the search strings are held, "memory",
+                       "compact", "mmap", "scan", "packed" or "numpy"
+        MMAP_BLOCK_SIZE (int): The approximate number of bytes per block of
+                               the sparse index of the "mmap" storage.
+        INDEX_CACHE (bool): Whether the "compact" storage is persisted to an
+                            index cache file next to the search file and
+                            loaded from it on the next start.
+        BLOOM_FILTER (bool): Whether a Bloom filter rejects missing search
+                             strings before the search algorithm runs.
+        BLOOM_FP_RATE (float): The target false positive rate of the Bloom
+                               filter.
+        BLOOM_MAX_BYTES (int | None): An upper bound on the memory used by
+                                      the Bloom filter.
+        CACHE_SIZE (int): The number of query results kept in the result
+                          cache, 0 to disable the cache.
+        CACHE_POLICY (str): The replacement policy of the result cache, "lru"
+                            or "tinylfu".
+        LOG_LEVEL (str): The lowest level of the records logged, "DEBUG"
+                         logs every query.
+        LOG_SAMPLE_RATE (float): The share of the queries logged at the
+                                 "DEBUG" level.
+        LOG_FLUSH_INTERVAL (float): The number of seconds between two
+                                    flushes of the log file.
+        TRACE_SAMPLE_RATE (float): The share of the requests logged as
+                                   spans with the time of their stages.
+        SLOW_QUERY_LOG (Path | None): The path to the slow query log file,
+                                      None to disable the slow query log.
+        SLOW_QUERY_MS (float): The number of milliseconds a request takes
+                               at most before it is written to the slow
+                               query log.
+        SLOW_STAGE_MS (float | None): The number of milliseconds a request
+                                      spends in any of its stages at most
+                                      before it is written to the slow query
+                                      log, None for no limit per stage.
+        METRICS_HOST (IPvAnyAddress): The IP address the metrics are served
+                                      on.
+        METRICS_PORT (int | None): The port the metrics are served on in the
+                                   Prometheus text format, None to only dump
+                                   them on SIGHUP. Every worker takes the
+                                   next port.
+        PROFILE_DIR (Path): The directory the profiles are written to.
+        PROFILE_MODE (str): The profiler started by SIGUSR1 or the admin
+                            command, "sampler" or "cprofile".
+        PROFILE_INTERVAL (float): The number of seconds between two samples
+                                  of the "sampler" profiler.
         DEBUG (Path): The path to the debug log file.
     """
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
     HOST: IPvAnyAddress
-    PORT: Annotated[int, Field(gt=0, lt=65535)]
-    TEST_PORT: Annotated[int, Field(gt=0, lt=65535)]
+    PORT: Annotated[int, Field(gt=0, le=65535)]
+    TEST_PORT: Annotated[int, Field(gt=0, le=65535)]
     LINUXPATH: Path
+    ENGINE: str = "threading"
+    WORKERS: Annotated[int, Field(ge=1)] = 1
+    LISTEN_BACKLOG: Annotated[int, Field(ge=1)] = 128
+    MAX_CONNECTIONS: Annotated[int, Field(ge=1)] = 1024
+    MAX_THREADS: Annotated[int, Field(ge=1)] = 64
+    IDLE_TIMEOUT: Annotated[float, Field(gt=0)] = 300.0
+    READ_TIMEOUT: Annotated[float, Field(gt=0)] = 10.0
+    LEGACY_TIMEOUT: Annotated[float, Field(ge=0)] = 0.0
     SSL: bool = True
     REREAD_ON_QUERY: bool = False
+    RELOAD_CHECKSUM: bool = False
+    RELOAD_WATCH: bool = False
+    RELOAD_POLL_INTERVAL: Annotated[float, Field(gt=0)] = 1.0
     CERTFILE: Union[Path, None] = None
     KEYFILE: Union[Path, None] = None
+    HANDSHAKE_TIMEOUT: Annotated[float, Field(gt=0)] = 5.0
+    TLS_SESSION_TICKETS: Annotated[int, Field(ge=0)] = 2
+    TLS_ECDH_CURVE: Union[str, None] = None
+    TLS_CIPHERS: Union[str, None] = None
     ALGORITHM: str
+    AUTO_QUERIES_PER_RELOAD: Annotated[int, Field(ge=1)] = 1000
+    STORAGE: str = "memory"
+    MMAP_BLOCK_SIZE: Annotated[int, Field(gt=0)] = 4096
+    INDEX_CACHE: bool = False
+    BLOOM_FILTER: bool = False
+    BLOOM_FP_RATE: Annotated[float, Field(gt=0, lt=1)] = 0.01
+    BLOOM_MAX_BYTES: Union[Annotated[int, Field(gt=0)], None] = None
+    CACHE_SIZE: Annotated[int, Field(ge=0)] = 0
+    CACHE_POLICY: str = "lru"
+    LOG_LEVEL: str = "DEBUG"
+    LOG_SAMPLE_RATE: Annotated[float, Field(ge=0, le=1)] = 1.0
+    LOG_FLUSH_INTERVAL: Annotated[float, Field(gt=0)] = 1.0
+    TRACE_SAMPLE_RATE: Annotated[float, Field(ge=0, le=1)] = 0.0
+    SLOW_QUERY_LOG: Union[Path, None] = None
+    SLOW_QUERY_MS: Annotated[float, Field(gt=0)] = 10.0
+    SLOW_STAGE_MS: Union[Annotated[float, Field(gt=0)], None] = None
+    METRICS_HOST: IPvAnyAddress = "127.0.0.1"  # type: ignore
+    METRICS_PORT: Union[Annotated[int, Field(gt=0, le=65535)], None] = None
+    PROFILE_DIR: Path = Path("profiles")
+    PROFILE_MODE: str = "sampler"
+    PROFILE_INTERVAL: Annotated[float, Field(gt=0)] = 0.01
     DEBUG: Path
 
     @field_validator("LINUXPATH", mode="before")
@@ -109,12 +234,52 @@ class LoadEnv(BaseSettings):
             return path_str
         return None
 
+    @field_validator("TLS_ECDH_CURVE")
+    @classmethod
+    def validate_tls_ecdh_curve(cls, value: Union[str, None]):
+        """
+        Validates that the curve is known to OpenSSL
+
+        Args:
+            value (str | None): The curve name
+
+        Returns:
+            str | None: The validated curve name, None for the defaults
+        """
+        if not value:
+            return None
+        try:
+            ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER).set_ecdh_curve(value)
+        except ValueError:
+            raise ValueError(f"Unknown elliptic curve '{value}'")
+        return value
+
+    @field_validator("TLS_CIPHERS")
+    @classmethod
+    def validate_tls_ciphers(cls, value: Union[str, None]):
+        """
+        Validates that the cipher list selects at least one cipher
+
+        Args:
+            value (str | None): The OpenSSL cipher list
+
+        Returns:
+            str | None: The validated cipher list, None for the defaults
+        """
+        if not value:
+            return None
+        try:
+            ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER).set_ciphers(value)
+        except ssl.SSLError:
+            raise ValueError(f"No cipher can be selected by '{value}'")
+        return value
+
     @field_validator("ALGORITHM")
     @classmethod
     def validate_algorithm(cls, value: str):
         """
         Validates that the search algorithm values is among the defined
-        search algorithms
+        search algorithms, or "auto" to pick the fastest one on start up
 
         Args:
             value (str): The search algorithm value
@@ -122,11 +287,139 @@ class LoadEnv(BaseSettings):
         Returns:
             str: The validated algorithm value
         """
-        algorithms = ["jump", "bisect", "recursive", "iterative", "linear"]
+        algorithms = algorithm_names() + ["auto"]
         if value not in algorithms:
             raise ValueError(f"Value must be one of {algorithms}")
         return value
 
+    @field_validator("ENGINE")
+    @classmethod
+    def validate_engine(cls, value: str):
+        """
+        Validates that the engine value is among the defined engines
+
+        Args:
+            value (str): The engine value
+
+        Returns:
+            str: The validated engine value
+        """
+        engines = ["threading", "asyncio"]
+        if value not in engines:
+            raise ValueError(f"Value must be one of {engines}")
+        return value
+
+    @field_validator("STORAGE")
+    @classmethod
+    def validate_storage(cls, value: str):
+        """
+        Validates that the storage value is among the defined storages
+
+        Args:
+            value (str): The storage value
+
+        Returns:
+            str: The validated storage value
+        """
+        storages = ["memory", "compact", "mmap", "scan", "packed", "numpy"]
+        if value not in storages:
+            raise ValueError(f"Value must be one of {storages}")
+        if value == "numpy" and importlib.util.find_spec("numpy") is None:
+            raise ValueError("STORAGE 'numpy' requires the numpy package")
+        return value
+
+    @field_validator("INDEX_CACHE")
+    @classmethod
+    def validate_index_cache(cls, value: bool, info: ValidationInfo) -> bool:
+        """
+        Validates that the index cache is only enabled with the storage it
+        persists.
+
+        Args:
+            value (bool): Whether the index cache is enabled.
+            info (ValidationInfo): Pydantic validation information.
+
+        Returns:
+            bool: The validated index cache value.
+        """
+        storage: Union[str, None] = info.data.get("STORAGE")
+        if value and storage is not None and storage != "compact":
+            raise ValueError("INDEX_CACHE requires STORAGE to be 'compact'")
+        return value
+
+    @field_validator("CACHE_POLICY")
+    @classmethod
+    def validate_cache_policy(cls, value: str):
+        """
+        Validates that the cache policy value is among the defined policies
+
+        Args:
+            value (str): The cache policy value
+
+        Returns:
+            str: The validated cache policy value
+        """
+        policies = ["lru", "tinylfu"]
+        if value not in policies:
+            raise ValueError(f"Value must be one of {policies}")
+        return value
+
+    @field_validator("LOG_LEVEL")
+    @classmethod
+    def validate_log_level(cls, value: str):
+        """
+        Validates that the log level value is among the defined levels
+
+        Args:
+            value (str): The log level value
+
+        Returns:
+            str: The validated log level value, in upper case
+        """
+        if value.upper() not in LOG_LEVELS:
+            raise ValueError(f"Value must be one of {list(LOG_LEVELS)}")
+        return value.upper()
+
+    @field_validator("METRICS_PORT")
+    @classmethod
+    def validate_metrics_port(
+        cls, value: Union[int, None], info: ValidationInfo
+    ) -> Union[int, None]:
+        """
+        Validates that the metrics port of every worker is a valid port.
+
+        Args:
+            value (int | None): The metrics port of the first worker.
+            info (ValidationInfo): Pydantic validation information.
+
+        Returns:
+            int | None: The validated metrics port.
+        """
+        workers: Union[int, None] = info.data.get("WORKERS")
+        if value is not None and workers is not None:
+            if value + workers - 1 > 65535:
+                raise ValueError(
+                    f"METRICS_PORT leaves no port for {workers} workers"
+                )
+        return value
+
+    @field_validator("PROFILE_MODE")
+    @classmethod
+    def validate_profile_mode(cls, value: str):
+        """
+        Validates that the profile mode value is among the defined modes
+
+        Args:
+            value (str): The profile mode value
+
+        Returns:
+            str: The validated profile mode value
+        """
+        modes = ["cprofile", "sampler"]
+        if value not in modes:
+            raise ValueError(f"Value must be one of {modes}")
+        return value
+
     @field_validator("DEBUG", mode="before")
     @classmethod
     def validate_debug_path(cls, path_str: Union[str, None]) -> str:
@@ -0,0 +1,891 @@
+#!/usr/bin/env python3
+"""
+This module contains the storage backends used by the database to hold the
+search strings outside of a Python list.
+"""
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left
+from bisect import bisect_right
+from collections.abc import Sequence
+from itertools import accumulate
+from pathlib import Path
+from typing import Iterator
+from typing import TYPE_CHECKING
+from typing import List
+from typing import Sequence as SequenceType
+from typing import Union
+
+# numpy is only required by the "numpy" storage, type checkers always see it
+if TYPE_CHECKING:
+    import numpy as np
+else:
+    try:
+        import numpy as np
+    except ImportError:  # pragma: no cover
+        np = None
+
+
+# number of bytes copied at once into the private copy of the "scan" storage
+COPY_CHUNK_SIZE = 1 << 20
+
+
+def sorted_copy_path(file_path: Path) -> Path:
+    """
+    Obtain the path of the sorted copy of a search file.
+
+    Args:
+        file_path (Path): The path to the search file.
+
+    Returns:
+        Path: The path of the sorted copy, next to the search file.
+    """
+    return file_path.with_name(file_path.name + ".sorted")
+
+
+def sort_lines(content: bytes) -> List[bytes]:
+    """
+    Split the content of a file into lines and sort them.
+
+    Every line keeps its trailing newline, which is added to the last line if
+    the content does not end with one, so that all lines compare the same way.
+
+    Args:
+        content (bytes): The content of the file.
+
+    Returns:
+        List[bytes]: The sorted lines of the file.
+    """
+    lines: List[bytes] = [line + b"\n" for line in content.split(b"\n")]
+    # drop the empty piece following the last newline
+    if not content or content.endswith(b"\n"):
+        lines.pop()
+    lines.sort()
+    return lines
+
+
+def iter_lines(file_path: Path) -> Iterator[bytes]:
+    """
+    Iterate over the lines of a file as bytes without loading it.
+
+    Args:
+        file_path (Path): The path to the file to read.
+
+    Returns:
+        Iterator[bytes]: The lines of the file, each ending with a newline.
+    """
+    with open(file_path, "rb") as file_obj:
+        for line in file_obj:
+            yield line if line.endswith(b"\n") else line + b"\n"
+
+
+def read_sorted_lines(file_path: Path) -> List[bytes]:
+    """
+    Read the lines of a file as bytes and sort them.
+
+    Args:
+        file_path (Path): The path to the file to read.
+
+    Returns:
+        List[bytes]: The sorted lines of the file, see sort_lines.
+    """
+    with open(file_path, "rb") as file_obj:
+        return sort_lines(file_obj.read())
+
+
+def sorted_identity_path(file_path: Path) -> Path:
+    """
+    Obtain the path of the file recording which search file the sorted copy
+    was built from.
+
+    Args:
+        file_path (Path): The path to the search file.
+
+    Returns:
+        Path: The path of the identity file, next to the sorted copy.
+    """
+    return file_path.with_name(file_path.name + ".sorted.id")
+
+
+def build_sorted_copy(
+    file_path: Path, identity: Union[SequenceType[object], None] = None
+) -> Path:
+    """
+    Write a sorted copy of a search file next to it, unless an up to date
+    copy already exists.
+
+    The copy is up to date when the identity (inode, size and modification
+    time) recorded with it is that of the search file, so a file replaced
+    with an older or preserved modification time (rsync -t, cp -p, mv) is
+    sorted again.
+
+    Args:
+        file_path (Path): The path to the search file.
+        identity (Sequence | None): The identity of the search file starting
+                                    with its inode, size and modification
+                                    time in nanoseconds, e.g. a FileIdentity,
+                                    None to stat the file.
+
+    Returns:
+        Path: The path of the sorted copy.
+    """
+    copy_path: Path = sorted_copy_path(file_path)
+    identity_path: Path = sorted_identity_path(file_path)
+    if identity is None:
+        stat = os.stat(file_path)
+        identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    stamp: str = " ".join(str(field) for field in identity[:3])
+
+    try:
+        if copy_path.is_file() and identity_path.read_text() == stamp:
+            return copy_path
+    except OSError:
+        pass  # no identity recorded, e.g. a copy from an older version
+
+    # drop the identity first so that a copy being replaced is never taken
+    # for the copy of the current file, and write to temporary files so that
+    # a running server never maps a half written copy
+    identity_path.unlink(missing_ok=True)
+    tmp_path: Path = copy_path.with_name(f"{copy_path.name}.{os.getpid()}")
+    tmp_path.write_bytes(b"".join(read_sorted_lines(file_path)))
+    os.replace(tmp_path, copy_path)
+    tmp_path = identity_path.with_name(f"{identity_path.name}.{os.getpid()}")
+    tmp_path.write_text(stamp)
+    os.replace(tmp_path, identity_path)
+    return copy_path
+
+
+class MmapIndex:
+    """
+    A sorted file mapped into memory and searched through a sparse block
+    index, the first line of every block of about block_size bytes being the
+    only data kept in Python objects.
+
+    Attributes:
+        path (Path): The path to the sorted file.
+        block_size (int): The approximate number of bytes in a block.
+        size (int): The size of the sorted file in bytes.
+        __map (mmap.mmap | None): The memory mapping of the sorted file, None
+                                  when the file is empty.
+        __offsets (List[int]): The offset of the first line of every block.
+        __keys (List[bytes]): The first line of every block.
+    """
+
+    __map: Union[mmap.mmap, None]
+    __offsets: List[int]
+    __keys: List[bytes]
+
+    def __init__(self, file_path: Path, block_size: int = 4096):
+        """
+        Map a sorted file into memory and build its sparse block index.
+
+        Args:
+            file_path (Path): The path to the sorted file.
+            block_size (int): The approximate number of bytes in a block.
+        """
+        self.path: Path = file_path
+        self.block_size: int = block_size
+        self.__map = None
+        self.__offsets = []
+        self.__keys = []
+
+        with open(file_path, "rb") as file_obj:
+            self.size: int = os.fstat(file_obj.fileno()).st_size
+            # an empty file can not be mapped
+            if not self.size:
+                return
+            self.__map = mmap.mmap(
+                file_obj.fileno(), 0, access=mmap.ACCESS_READ
+            )
+
+        # jump block_size bytes ahead and align on the next line start
+        offset: int = 0
+        while offset < self.size:
+            line_end: int = self.__map.find(b"\n", offset)
+            if line_end == -1:
+                line_end = self.size - 1
+            self.__offsets.append(offset)
+            self.__keys.append(self.__map[offset : line_end + 1])
+            next_end: int = self.__map.find(b"\n", offset + block_size)
+            offset = self.size if next_end == -1 else next_end + 1
+
+    def __len__(self) -> int:
+        """Return the number of blocks in the index."""
+        return len(self.__offsets)
+
+    def __contains__(self, search_str: object) -> bool:
+        """
+        Check whether a line exists in the sorted file.
+
+        Args:
+            search_str (object): The line to look for, including its trailing
+                                 newline.
+
+        Returns:
+            bool: True if the line exists, False otherwise.
+        """
+        if not isinstance(search_str, str) or self.__map is None:
+            return False
+        key: bytes = search_str.encode()
+
+        # a key spanning more than one line can never match
+        if not key.endswith(b"\n") or b"\n" in key[:-1]:
+            return False
+
+        # find the block whose first line is the greatest one not above key
+        block: int = bisect_right(self.__keys, key) - 1
+        if block < 0:
+            return False
+        start: int = self.__offsets[block]
+        end: int = (
+            self.__offsets[block + 1]
+            if block + 1 < len(self.__offsets)
+            else self.size
+        )
+
+        # only the pages of a single block are touched by the scan
+        chunk: bytes = self.__map[start:end]
+        return chunk.startswith(key) or (b"\n" + key) in chunk
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes of the sorted file mapped into memory."""
+        return self.size
+
+
+class ScanIndex:
+    """
+    A private copy of the search file mapped into memory and scanned for a
+    line on every lookup, with no parsing, sorting or Python object per line.
+    A lookup is a single memchr class find over the mapping.
+
+    The copy is an unlinked temporary file next to the search file, so that
+    truncating the search file in place can not pull pages from under the
+    mapping (reading them would raise SIGBUS and kill the server). The
+    mapping is reused until the database sees the identity of the file
+    change.
+
+    Attributes:
+        path (Path): The path to the search file.
+        size (int): The size of the copy in bytes.
+        __map (mmap.mmap | None): The memory mapping of the copy, None when
+                                  the file is empty.
+        __last_line (bytes): The last line of the file with a newline added,
+                             when the file does not end with one.
+    """
+
+    __map: Union[mmap.mmap, None]
+    __last_line: bytes
+
+    def __init__(self, file_path: Path):
+        """
+        Copy a search file and map the copy into memory.
+
+        Args:
+            file_path (Path): The path to the search file.
+        """
+        self.path: Path = file_path
+        self.__map = None
+        self.__last_line = b""
+
+        with open(file_path, "rb") as source, tempfile.TemporaryFile(
+            dir=file_path.parent
+        ) as copy:
+            shutil.copyfileobj(source, copy, COPY_CHUNK_SIZE)
+            copy.flush()
+            self.size: int = os.fstat(copy.fileno()).st_size
+            # an empty file can not be mapped
+            if not self.size:
+                return
+            # the mapping keeps the unlinked copy alive once it is closed
+            self.__map = mmap.mmap(copy.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # the last line can not be framed by a newline on both sides
+        if self.__map[-1:] != b"\n":
+            self.__last_line = (
+                self.__map[self.__map.rfind(b"\n") + 1 :] + b"\n"
+            )
+
+    def __contains__(self, search_str: object) -> bool:
+        """
+        Check whether a line exists in the search file.
+
+        Args:
+            search_str (object): The line to look for, including its trailing
+                                 newline.
+
+        Returns:
+            bool: True if the line exists, False otherwise.
+        """
+        if not isinstance(search_str, str) or self.__map is None:
+            return False
+        key: bytes = search_str.encode()
+
+        # a key spanning more than one line can never match
+        if not key.endswith(b"\n") or b"\n" in key[:-1]:
+            return False
+
+        # the first line has no newline in front of it
+        if self.__map[: len(key)] == key or key == self.__last_line:
+            return True
+        return self.__map.find(b"\n" + key) != -1
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes of the copy mapped into memory."""
+        return self.size
+
+
+def offsets_typecode(blob_size: int) -> str:
+    """
+    Obtain the smallest array typecode able to hold the offsets of a blob.
+
+    Args:
+        blob_size (int): The size of the blob in bytes.
+
+    Returns:
+        str: "I" when every offset fits in 4 bytes, "Q" otherwise.
+    """
+    if array("I").itemsize >= 4 and blob_size < 1 << 32:
+        return "I"
+    return "Q"
+
+
+class SortedBlob(Sequence):
+    """
+    The sorted lines of a file held in one contiguous bytes object, the start
+    of every line being recorded in a compact array of offsets. Compared to a
+    list of str this saves the per object overhead of every line.
+
+    Items are the lines decoded to str with their trailing newline, the same
+    way a sorted list of readlines() would hold them. Membership tests run a
+    binary search directly on the bytes without decoding anything.
+
+    The buffer can also be the memory mapping of an index cache file, the
+    offsets then being a view cast over the same mapping.
+
+    Attributes:
+        __blob (bytes | mmap.mmap): The buffer holding the sorted lines joined
+                                    together.
+        __offsets (array | memoryview): The offset of every line in the buffer
+                                        followed by the end of the last line,
+                                        so line i spans
+                                        offsets[i]:offsets[i + 1].
+    """
+
+    __blob: Union[bytes, mmap.mmap]
+    __offsets: Union[array, memoryview]
+
+    def __init__(
+        self,
+        blob: Union[bytes, mmap.mmap],
+        offsets: Union[array, memoryview],
+    ):
+        """
+        Initialize a blob from sorted lines joined together and their offsets.
+
+        Args:
+            blob (bytes | mmap.mmap): The buffer holding the sorted lines
+                                      joined together.
+            offsets (array | memoryview): The offset of every line in the
+                                          buffer followed by the end of the
+                                          last line.
+        """
+        self.__blob = blob
+        self.__offsets = offsets
+
+    @classmethod
+    def from_lines(cls, lines: List[bytes]) -> "SortedBlob":
+        """
+        Build a blob from sorted lines.
+
+        Args:
+            lines (List[bytes]): The sorted lines, each ending with a newline.
+
+        Returns:
+            SortedBlob: The blob holding the lines.
+        """
+        blob: bytes = b"".join(lines)
+        offsets: array = array(offsets_typecode(len(blob)), [0])
+        offsets.extend(accumulate(len(line) for line in lines))
+        return cls(blob, offsets)
+
+    @classmethod
+    def from_file(cls, file_path: Path) -> "SortedBlob":
+        """
+        Build a blob from the lines of a file.
+
+        Args:
+            file_path (Path): The path to the file to read.
+
+        Returns:
+            SortedBlob: The blob holding the sorted lines of the file.
+        """
+        return cls.from_lines(read_sorted_lines(file_path))
+
+    def __len__(self) -> int:
+        """Return the number of lines in the blob."""
+        return len(self.__offsets) - 1
+
+    def __getitem__(self, idx):  # type: ignore
+        """
+        Return the line at an index, or a list of lines for a slice.
+
+        Args:
+            idx (int | slice): The index or slice of the lines.
+
+        Returns:
+            str | List[str]: The decoded line(s) with their trailing newline.
+        """
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("blob index out of range")
+        return self.record(idx).decode()
+
+    def record(self, idx: int) -> bytes:
+        """
+        Return the raw bytes of the line at an index.
+
+        Args:
+            idx (int): The index of the line.
+
+        Returns:
+            bytes: The line with its trailing newline.
+        """
+        return self.__blob[self.__offsets[idx] : self.__offsets[idx + 1]]
+
+    def __contains__(self, search_str: object) -> bool:
+        """
+        Check whether a line exists in the blob with a binary search over the
+        offsets.
+
+        Args:
+            search_str (object): The line to look for, including its trailing
+                                 newline.
+
+        Returns:
+            bool: True if the line exists, False otherwise.
+        """
+        if not isinstance(search_str, str):
+            return False
+        key: bytes = search_str.encode()
+
+        # find the leftmost line not below the key, slicing the blob in place
+        # of calling record() to keep the loop tight
+        blob: Union[bytes, mmap.mmap] = self.__blob
+        offsets: Union[array, memoryview] = self.__offsets
+        low: int = 0
+        high: int = len(offsets) - 1
+        size: int = high
+        while low < high:
+            mid: int = (low + high) // 2
+            if blob[offsets[mid] : offsets[mid + 1]] < key:
+                low = mid + 1
+            else:
+                high = mid
+        return low < size and blob[offsets[low] : offsets[low + 1]] == key
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes used by the lines and their offsets."""
+        offsets: Union[array, memoryview] = self.__offsets
+        lines_size: int = offsets[-1] - offsets[0]
+        return lines_size + offsets.itemsize * len(offsets)
+
+    @property
+    def offsets(self) -> Union[array, memoryview]:
+        """The offset of every line followed by the end of the last line."""
+        return self.__offsets
+
+    @property
+    def blob(self) -> Union[bytes, mmap.mmap]:
+        """The buffer holding the sorted lines joined together."""
+        return self.__blob
+
+
+# number of small integer fields in a packable record such as
+# "3;0;1;28;0;7;5;0;", every field fits in one byte of a 64 bit key
+PACKED_FIELDS = 8
+
+# value of every field spelled canonically (no sign, no leading zero, no
+# blank), a lookup in this table both parses and validates a field
+PACKED_VALUES = {b"%d" % value: value for value in range(256)}
+
+
+def pack_record(line: bytes) -> Union[int, None]:
+    """
+    Pack a record made of semicolon terminated small integers into a 64 bit
+    integer key, one byte per field.
+
+    Only the canonical decimal spelling of a record is packed (no sign, no
+    leading zero, no blank), so that two different lines never share a key.
+
+    Args:
+        line (bytes): The record, with or without its trailing newline.
+
+    Returns:
+        int | None: The packed key, or None if the line is not a record of
+                    PACKED_FIELDS integers between 0 and 255.
+    """
+    if line.endswith(b"\n"):
+        line = line[:-1]
+    fields: List[bytes] = line.split(b";")
+    if len(fields) != PACKED_FIELDS + 1 or fields.pop():
+        return None
+    try:
+        # the table only holds the canonical spelling of 0 to 255
+        packed: bytes = bytes(map(PACKED_VALUES.__getitem__, fields))
+    except KeyError:
+        return None
+    return int.from_bytes(packed, "big")
+
+
+class PackedIndex:
+    """
+    The records of a search file packed into sorted 64 bit integer keys, the
+    lines that are not records being kept aside in a sorted blob so that any
+    file is searched correctly.
+
+    Attributes:
+        path (Path): The path to the search file.
+        __keys (array): The sorted packed keys of the records.
+        __others (SortedBlob): The sorted lines that could not be packed.
+    """
+
+    __keys: array
+    __others: SortedBlob
+
+    def __init__(self, file_path: Path):
+        """
+        Pack the records of a search file.
+
+        Args:
+            file_path (Path): The path to the search file.
+        """
+        self.path: Path = file_path
+        keys: List[int] = []
+        others: List[bytes] = []
+        for line in iter_lines(file_path):
+            key: Union[int, None] = pack_record(line)
+            if key is None:
+                others.append(line)
+            else:
+                keys.append(key)
+        keys.sort()
+        others.sort()
+        self.__keys = array("Q", keys)
+        self.__others = SortedBlob.from_lines(others)
+
+    def __len__(self) -> int:
+        """Return the number of lines in the index."""
+        return len(self.__keys) + len(self.__others)
+
+    def __contains__(self, search_str: object) -> bool:
+        """
+        Check whether a line exists in the search file, packing it the same
+        way as the records.
+
+        Args:
+            search_str (object): The line to look for, including its trailing
+                                 newline.
+
+        Returns:
+            bool: True if the line exists, False otherwise.
+        """
+        if not isinstance(search_str, str) or not search_str.endswith("\n"):
+            return False
+        key: Union[int, None] = pack_record(search_str.encode())
+        if key is None:
+            return search_str in self.__others
+        idx: int = bisect_left(self.__keys, key)
+        return idx < len(self.__keys) and self.__keys[idx] == key
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes used by the keys and the other lines."""
+        keys: array = self.__keys
+        return keys.itemsize * len(keys) + self.__others.nbytes
+
+
+class NumpyIndex:
+    """
+    The sorted lines of a search file held in a NumPy array of fixed width
+    bytes, resolving a whole batch of lookups with a single searchsorted.
+
+    The lines are stored without their trailing newline since NumPy pads
+    fixed width bytes with null bytes.
+
+    Attributes:
+        path (Path): The path to the search file.
+        __keys (np.ndarray): The sorted lines, of dtype S<longest line>.
+    """
+
+    def __init__(self, file_path: Path):
+        """
+        Load the sorted lines of a search file into a NumPy array.
+
+        Args:
+            file_path (Path): The path to the search file.
+
+        Raises:
+            ImportError: If numpy is not installed.
+        """
+        if np is None:
+            raise ImportError("the numpy storage requires the numpy package")
+        self.path: Path = file_path
+        lines: List[bytes] = [line[:-1] for line in iter_lines(file_path)]
+        width: int = max(map(len, lines), default=0) or 1
+        self.__keys = np.sort(np.array(lines, dtype=f"S{width}"))
+
+    def __len__(self) -> int:
+        """Return the number of lines in the index."""
+        return len(self.__keys)
+
+    def __contains__(self, search_str: object) -> bool:
+        """
+        Check whether a line exists in the search file.
+
+        Args:
+            search_str (object): The line to look for, including its trailing
+                                 newline.
+
+        Returns:
+            bool: True if the line exists, False otherwise.
+        """
+        if not isinstance(search_str, str):
+            return False
+        return bool(self.search_many([search_str])[0])
+
+    def search_many(self, search_strs: SequenceType[str]) -> "np.ndarray":
+        """
+        Check whether each line of a batch exists in the search file.
+
+        Args:
+            search_strs (Sequence[str]): The lines to look for, each including
+                                         its trailing newline.
+
+        Returns:
+            np.ndarray: A boolean array, True where the line exists.
+        """
+        keys = self.__keys
+        count: int = len(search_strs)
+        joined: str = "".join(search_strs)
+        if not len(keys) or not joined:
+            return np.zeros(count, dtype=bool)
+
+        # encode the whole batch at once and locate every query in it
+        batch: bytes = joined.encode()
+        if joined.isascii():
+            sizes = np.fromiter(map(len, search_strs), np.int64, count)
+        else:
+            sizes = np.fromiter(
+                (len(query.encode()) for query in search_strs), np.int64, count
+            )
+        ends = np.cumsum(sizes)
+        starts = ends - sizes
+        buffer = np.frombuffer(batch, dtype=np.uint8)
+        newlines: "np.ndarray" = np.concatenate(
+            (np.zeros(1, np.int64), np.cumsum(buffer == 10))
+        )
+
+        # a query that does not end with a newline, holds one elsewhere, ends
+        # with a null byte or is longer than every line can never match
+        valid = (
+            (sizes > 0)
+            & (buffer[np.maximum(ends - 1, 0)] == 10)
+            & (newlines[ends] - newlines[starts] == 1)
+            & ((sizes < 2) | (buffer[np.maximum(ends - 2, 0)] != 0))
+            & (sizes - 1 <= keys.dtype.itemsize)
+        )
+        if not valid.any():
+            return valid
+        if valid.all():
+            lines: List[bytes] = batch.split(b"\n")[:-1]
+        else:
+            lines = [
+                batch[start : end - 1]
+                for start, end in zip(starts.tolist(), ends.tolist())
+            ]
+
+        # the queries share the dtype of the lines so that searchsorted does
+        # not convert the whole array, the longer ones are masked out above
+        queries = np.array(lines, dtype=keys.dtype)
+        idx = np.searchsorted(keys, queries)
+        found = keys[np.minimum(idx, len(keys) - 1)] == queries
+        return valid & (idx < len(keys)) & found
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes used by the array of lines."""
+        return int(self.__keys.nbytes)
+
+
+class IndexCacheError(ValueError):
+    """
+    Error class raised when an index cache file is missing, stale or corrupt.
+    """
+
+    pass
+
+
+# Index cache file layout:
+#   header: magic, format version, size, modification time and digest of the
+#           search file, number of lines, size of an offset, digest of the
+#           payload (offsets and lines)
+#   offsets: number of lines + 1 unsigned integers, absolute positions in the
+#            file of every line followed by the end of the last line
+#   lines: the sorted lines joined together
+INDEX_CACHE_MAGIC = b"SRVIDX"
+INDEX_CACHE_VERSION = 1
+INDEX_CACHE_HEADER = struct.Struct("<6sHQq16sQB7x16s")
+
+
+def index_cache_path(file_path: Path) -> Path:
+    """
+    Obtain the path of the index cache file of a search file.
+
+    Args:
+        file_path (Path): The path to the search file.
+
+    Returns:
+        Path: The path of the index cache file, next to the search file.
+    """
+    return file_path.with_name(file_path.name + ".idx")
+
+
+def write_index_cache(
+    cache_path: Path,
+    lines: List[bytes],
+    source_size: int,
+    source_mtime_ns: int,
+    source_digest: bytes,
+) -> None:
+    """
+    Write the sorted lines of a search file to an index cache file.
+
+    Args:
+        cache_path (Path): The path of the index cache file.
+        lines (List[bytes]): The sorted lines, each ending with a newline.
+        source_size (int): The size of the search file in bytes.
+        source_mtime_ns (int): The modification time of the search file.
+        source_digest (bytes): The 16 bytes digest of the search file.
+    """
+    blob: bytes = b"".join(lines)
+
+    # pick the offset size from the size of the file with 8 bytes offsets
+    typecode: str = offsets_typecode(
+        INDEX_CACHE_HEADER.size + (len(lines) + 1) * 8 + len(blob)
+    )
+    itemsize: int = array(typecode).itemsize
+    lines_start: int = INDEX_CACHE_HEADER.size + (len(lines) + 1) * itemsize
+    offsets: array = array(
+        typecode,
+        accumulate((len(line) for line in lines), initial=lines_start),
+    )
+    payload_digest = hashlib.blake2b(digest_size=16)
+    payload_digest.update(offsets.tobytes())
+    payload_digest.update(blob)
+
+    header: bytes = INDEX_CACHE_HEADER.pack(
+        INDEX_CACHE_MAGIC,
+        INDEX_CACHE_VERSION,
+        source_size,
+        source_mtime_ns,
+        source_digest,
+        len(lines),
+        itemsize,
+        payload_digest.digest(),
+    )
+
+    # write to a temporary file first so that a reader never maps a half
+    # written cache
+    tmp_path: Path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}")
+    with open(tmp_path, "wb") as file_obj:
+        file_obj.write(header)
+        file_obj.write(offsets.tobytes())
+        file_obj.write(blob)
+    os.replace(tmp_path, cache_path)
+
+
+def load_index_cache(
+    cache_path: Path, source_size: int, source_digest: bytes
+) -> SortedBlob:
+    """
+    Map an index cache file into memory after checking that it was built from
+    the current search file and that its content is intact.
+
+    Args:
+        cache_path (Path): The path of the index cache file.
+        source_size (int): The size of the search file in bytes.
+        source_digest (bytes): The 16 bytes digest of the search file.
+
+    Returns:
+        SortedBlob: The sorted lines backed by the mapping of the cache file.
+
+    Raises:
+        IndexCacheError: If the cache file is missing, stale or corrupt.
+    """
+    try:
+        with open(cache_path, "rb") as file_obj:
+            file_size: int = os.fstat(file_obj.fileno()).st_size
+            if file_size < INDEX_CACHE_HEADER.size:
+                raise IndexCacheError("truncated index cache header")
+            cache_map = mmap.mmap(
+                file_obj.fileno(), 0, access=mmap.ACCESS_READ
+            )
+    except OSError as e:
+        raise IndexCacheError(f"unable to open index cache: {e}")
+
+    # a stale or corrupt cache is unmapped at once rather than left to the
+    # garbage collector
+    offsets: Union[memoryview, None] = None
+    try:
+        (
+            magic,
+            version,
+            size,
+            _,
+            digest,
+            count,
+            itemsize,
+            payload_digest,
+        ) = INDEX_CACHE_HEADER.unpack_from(cache_map)
+        if magic != INDEX_CACHE_MAGIC or version != INDEX_CACHE_VERSION:
+            raise IndexCacheError("unknown index cache format")
+        if size != source_size or digest != source_digest:
+            raise IndexCacheError("index cache built from another search file")
+        if itemsize not in (array("I").itemsize, array("Q").itemsize):
+            raise IndexCacheError("invalid offset size in index cache")
+
+        # the payload must fill the file exactly and hash to its digest
+        lines_start: int = INDEX_CACHE_HEADER.size + (count + 1) * itemsize
+        if lines_start > file_size:
+            raise IndexCacheError("truncated index cache offsets")
+        offsets = memoryview(cache_map)[
+            INDEX_CACHE_HEADER.size : lines_start
+        ].cast("I" if itemsize == array("I").itemsize else "Q")
+        if offsets[0] != lines_start or offsets[-1] != file_size:
+            raise IndexCacheError(
+                "index cache size does not match its offsets"
+            )
+        actual_digest: bytes = hashlib.blake2b(
+            memoryview(cache_map)[INDEX_CACHE_HEADER.size :], digest_size=16
+        ).digest()
+        if actual_digest != payload_digest:
+            raise IndexCacheError("index cache content is corrupt")
+    except IndexCacheError:
+        if offsets is not None:
+            offsets.release()
+        cache_map.close()
+        raise
+
+    return SortedBlob(cache_map, offsets)
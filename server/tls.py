@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+This module contains the TLS set up shared by the server engines and a client
+resuming its sessions.
+
+Clients opening a new connection per lookup pay a full handshake every time
+unless they resume an earlier session. The server issues session tickets
+(TLS 1.3 pre-shared keys) and counts the resumed handshakes, ResumingClient
+offers the last session it received on its next connection.
+"""
+import socket
+import threading
+from pathlib import Path
+from ssl import create_default_context
+from ssl import Purpose
+from ssl import OP_NO_TICKET
+from ssl import PROTOCOL_TLS_CLIENT
+from ssl import CERT_NONE
+from ssl import SSLContext
+from ssl import SSLObject
+from ssl import SSLSession
+from ssl import SSLSocket
+from typing import Dict
+from typing import Tuple
+from typing import Union
+
+
+def create_ssl_context(
+    certfile: Union[Path, None],
+    keyfile: Union[Path, None],
+    session_tickets: int = 2,
+    ecdh_curve: Union[str, None] = None,
+    ciphers: Union[str, None] = None,
+) -> SSLContext:
+    """
+    Create the server side SSL context shared by the server engines.
+
+    Args:
+        certfile (Path | None): Path to the SSL certificate file.
+        keyfile (Path | None): Path to the SSL key file.
+        session_tickets (int): The number of TLS 1.3 session tickets issued
+                               after a full handshake, 0 disables the tickets
+                               of every TLS version.
+        ecdh_curve (str | None): The only curve used for the key exchange,
+                                 None for the OpenSSL defaults.
+        ciphers (str | None): An OpenSSL cipher list for TLS 1.2 and below in
+                              order of preference, None for the defaults.
+
+    Returns:
+        SSLContext: The context holding the certificate chain.
+    """
+    context: SSLContext = create_default_context(Purpose.CLIENT_AUTH)
+    context.load_cert_chain(certfile, keyfile)  # type: ignore
+    # the tickets are encrypted with a key of the context, a context shared
+    # by several processes lets any of them resume the sessions of the others
+    # num_tickets (Python 3.8+) is missing from the typeshed SSLContext stubs
+    context.num_tickets = session_tickets  # type: ignore[attr-defined]
+    if not session_tickets:
+        context.options |= OP_NO_TICKET
+    if ecdh_curve is not None:
+        context.set_ecdh_curve(ecdh_curve)
+    if ciphers is not None:
+        context.set_ciphers(ciphers)
+    return context
+
+
+class HandshakeCounter:
+    """
+    Thread safe counters of the full and resumed TLS handshakes of a server.
+
+    Attributes:
+        full (int): The number of full handshakes.
+        resumed (int): The number of handshakes resuming a session.
+    """
+
+    def __init__(self):
+        """
+        Initialize the counters to zero.
+        """
+        self.full: int = 0
+        self.resumed: int = 0
+        self.__lock = threading.Lock()
+
+    def record(self, ssl_object: Union[SSLSocket, SSLObject]) -> None:
+        """
+        Count a completed handshake.
+
+        Args:
+            ssl_object (SSLSocket | SSLObject): The connection that completed
+                                                its handshake.
+        """
+        with self.__lock:
+            if ssl_object.session_reused:
+                self.resumed += 1
+            else:
+                self.full += 1
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """
+        Report the counters.
+
+        Returns:
+            Dict[str, int | float]: The full and resumed handshakes and the
+                                    share of resumed ones.
+        """
+        with self.__lock:
+            total: int = self.full + self.resumed
+            return {
+                "full": self.full,
+                "resumed": self.resumed,
+                "resumed_ratio": (
+                    round(self.resumed / total, 4) if total else 0.0
+                ),
+            }
+
+
+class ResumingClient:
+    """
+    A client opening a TLS connection per query and resuming the session of
+    the previous connection, which skips the certificate exchange and the
+    signature of a full handshake.
+
+    Attributes:
+        server_address (Tuple[str, int]): The (host, port) of the server.
+        server_hostname (str): The host name the certificate is checked
+                               against.
+        timeout (float): The timeout of the socket operations in seconds.
+        context (SSLContext): The client context, sessions are bound to it.
+        session (SSLSession | None): The session offered on the next
+                                     connection.
+        full (int): The number of connections which made a full handshake.
+        resumed (int): The number of connections which resumed a session.
+    """
+
+    def __init__(
+        self,
+        server_address: Tuple[str, int],
+        cafile: Union[Path, str, None] = None,
+        server_hostname: str = "localhost",
+        verify: bool = True,
+        timeout: float = 5.0,
+    ):
+        """
+        Initialize a new client.
+
+        Args:
+            server_address (tuple): The server address as a (host, port) tuple.
+            cafile (Path | str | None): The certificate(s) to trust, None for
+                                        the system ones.
+            server_hostname (str): The host name the certificate is checked
+                                   against.
+            verify (bool): Whether the server certificate is verified.
+            timeout (float): The timeout of the socket operations in seconds.
+        """
+        self.server_address: Tuple[str, int] = server_address
+        self.server_hostname: str = server_hostname
+        self.timeout: float = timeout
+        self.context: SSLContext = SSLContext(PROTOCOL_TLS_CLIENT)
+        if not verify:
+            self.context.check_hostname = False
+            self.context.verify_mode = CERT_NONE
+        elif cafile is not None:
+            self.context.load_verify_locations(cafile)
+        else:
+            self.context.load_default_certs()
+        self.session: Union[SSLSession, None] = None
+        self.full: int = 0
+        self.resumed: int = 0
+
+    def connect(self) -> SSLSocket:
+        """
+        Open a connection to the server, offering the last session.
+
+        Returns:
+            SSLSocket: The connection, its handshake completed.
+        """
+        conn: socket.socket = socket.create_connection(
+            self.server_address, timeout=self.timeout
+        )
+        try:
+            ssl_conn: SSLSocket = self.context.wrap_socket(
+                conn,
+                server_hostname=self.server_hostname,
+                session=self.session,
+            )
+        except BaseException:
+            conn.close()
+            raise
+        if ssl_conn.session_reused:
+            self.resumed += 1
+        else:
+            self.full += 1
+        return ssl_conn
+
+    def query(self, search_str: str) -> str:
+        """
+        Look up a string over a new connection, sent as a newline terminated
+        line so that the server answers it without waiting for more.
+
+        Args:
+            search_str (str): The string to search for.
+
+        Returns:
+            str: The response of the server.
+        """
+        with self.connect() as ssl_conn:
+            ssl_conn.sendall(f"{search_str}\n".encode())
+            response: bytes = ssl_conn.recv(1024)
+            # TLS 1.3 tickets arrive after the handshake, they have been read
+            # along with the response
+            self.session = ssl_conn.session
+        return response.decode()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+This module contains the tracing of the requests of the server. A request is
+the reads completing one or more queries and the write of their answers, its
+time is split into stages:
+
+recv: reading the bytes of the queries, TLS decryption included but not the
+      wait for the client to send them (threading engine only, the event loop
+      reads for every connection at once)
+decode: framing and decoding the queries
+reload: checking the search file for changes, and reloading it, when the
+        queries reread it
+search: looking the queries up
+send: writing the answers, TLS encryption included
+
+Every stage is timed with perf_counter_ns and aggregated into a histogram per
+stage, a sample of the requests is also logged as spans listing the time of
+each of their stages. The requests slower than a threshold, end to end or in
+any stage, are written to the slow query log along with their queries.
+"""
+from . import logger
+from . import slow_logger
+from .logs import sample
+from .metrics import Histogram
+from .metrics import MetricsRegistry
+from typing import Dict
+from typing import List
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+# the stages of a request, in order
+STAGES = ("recv", "decode", "reload", "search", "send")
+
+# the histograms of the stages, told apart by their "stage" label
+STAGE_METRIC = "search_request_stage_seconds"
+
+# the record of a sampled request, formatted by the log pipeline thread
+SPAN_LOG_FORMAT = (
+    "{span: request, client_ip: %s, comm_port: %s, queries: %s, "
+    "stages(us): %s, duration(us): %s}"
+)
+
+# the record of a slow request, written to the slow query log
+SLOW_QUERY_LOG_FORMAT = (
+    "{client_ip: %s, comm_port: %s, queries: %s, strings: %s, version: %s, "
+    "algorithm: %s, reloaded: %s, stages(us): %s, duration(us): %s}"
+)
+
+# number of query strings written per slow request at most, a batch of the
+# binary protocol may hold thousands
+SLOW_QUERY_MAX_STRINGS = 16
+
+
+class Span:
+    """
+    The stage timings of a request, the time of a stage the request did not
+    go through staying at 0.
+
+    Attributes:
+        start (int): The perf_counter_ns() of the start of the request.
+        queries (int): The number of queries of the request.
+        recv (int): The nanoseconds spent reading, a request reading its
+                    queries in several parts adds the time of every part.
+        decode (int): The nanoseconds spent decoding, part by part as well.
+        reload (int): The nanoseconds spent checking the search file.
+        search (int): The nanoseconds spent looking the queries up.
+        send (int): The nanoseconds spent writing the answers.
+        strings (Sequence[str | Sequence[str]]): The query strings of the
+            request, or its batches of keys, for the slow query log.
+        reloaded (bool): Whether the request reloaded the search file.
+        version (int | None): The version of the data the queries were
+                              searched in, None until searched.
+    """
+
+    __slots__ = (
+        "start",
+        "queries",
+        "recv",
+        "decode",
+        "reload",
+        "search",
+        "send",
+        "strings",
+        "reloaded",
+        "version",
+    )
+
+    def __init__(self, start: int):
+        """
+        Initialize the span of a request.
+
+        Args:
+            start (int): The perf_counter_ns() of the start of the request.
+        """
+        self.start: int = start
+        self.queries: int = 0
+        self.recv: int = 0
+        self.decode: int = 0
+        self.reload: int = 0
+        self.search: int = 0
+        self.send: int = 0
+        self.strings: Sequence[Union[str, Sequence[str]]] = ()
+        self.reloaded: bool = False
+        self.version: Union[int, None] = None
+
+    def timings(self) -> Dict[str, int]:
+        """
+        List the time of the stages the request went through.
+
+        Returns:
+            Dict[str, int]: The nanoseconds spent in every stage, by stage.
+        """
+        timings: Dict[str, int] = {}
+        for stage in STAGES:
+            duration: int = getattr(self, stage)
+            if duration:
+                timings[stage] = duration
+        return timings
+
+
+class SlowQueryLog:
+    """
+    The thresholds of the slow query log, and the context of its entries.
+
+    Attributes:
+        threshold (int): The nanoseconds from the start of a request to the
+                         write of its answers past which it is slow.
+        stage_threshold (int | None): The nanoseconds spent in any single
+                                      stage past which a request is slow,
+                                      None to only check the whole request.
+        algorithm (str): The search algorithm answering the queries.
+    """
+
+    def __init__(
+        self,
+        threshold: int,
+        stage_threshold: Union[int, None] = None,
+        algorithm: str = "",
+    ):
+        """
+        Initialize the slow query log.
+
+        Args:
+            threshold (int): The nanoseconds a request takes at most before
+                             it is slow.
+            stage_threshold (int | None): The nanoseconds a request spends in
+                                          any stage at most before it is
+                                          slow, None for no limit.
+            algorithm (str): The search algorithm answering the queries.
+        """
+        self.threshold: int = threshold
+        self.stage_threshold: Union[int, None] = stage_threshold
+        self.algorithm: str = algorithm
+
+    def is_slow(self, span: Span, duration: int) -> bool:
+        """
+        Tell whether a request went past a threshold.
+
+        Args:
+            span (Span): The span of the request.
+            duration (int): The nanoseconds the request took.
+
+        Returns:
+            bool: True if the request is slow.
+        """
+        if duration > self.threshold:
+            return True
+        limit: Union[int, None] = self.stage_threshold
+        return limit is not None and (
+            span.recv > limit
+            or span.decode > limit
+            or span.reload > limit
+            or span.search > limit
+            or span.send > limit
+        )
+
+    def write(
+        self, span: Span, client_address: Tuple[str, int], duration: int
+    ) -> None:
+        """
+        Write a slow request to the slow query log.
+
+        Args:
+            span (Span): The span of the request.
+            client_address (tuple): The address of the client.
+            duration (int): The nanoseconds the request took.
+        """
+        strings: List[str] = []
+        for item in span.strings:
+            if isinstance(item, str):
+                strings.append(item)
+            else:
+                # the keys of a batch end with the newline they are stored
+                # with
+                strings.extend(
+                    key.rstrip("\n")
+                    for key in item[: SLOW_QUERY_MAX_STRINGS - len(strings)]
+                )
+            if len(strings) >= SLOW_QUERY_MAX_STRINGS:
+                break
+        slow_logger.warning(
+            SLOW_QUERY_LOG_FORMAT,
+            client_address[0],
+            client_address[1],
+            span.queries,
+            strings[:SLOW_QUERY_MAX_STRINGS],
+            span.version,
+            self.algorithm,
+            span.reloaded,
+            {
+                stage: round(stage_duration / 1000, 1)
+                for stage, stage_duration in span.timings().items()
+            },
+            round(duration / 1000, 1),
+        )
+
+
+class Tracer:
+    """
+    The stage histograms of a server, and the sampling of its spans.
+
+    Attributes:
+        stages (Dict[str, Histogram]): The histogram of every stage.
+        sample_rate (float): The share of the requests logged as spans.
+        slow_log (SlowQueryLog | None): The slow query log, None when
+                                        disabled.
+    """
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        sample_rate: float = 0.0,
+        slow_log: Union[SlowQueryLog, None] = None,
+    ):
+        """
+        Initialize a tracer, registering the stage histograms.
+
+        Args:
+            registry (MetricsRegistry): The metrics of the server.
+            sample_rate (float): The share of the requests logged as spans.
+            slow_log (SlowQueryLog | None): The slow query log, None when
+                                            disabled.
+        """
+        self.stages: Dict[str, Histogram] = {
+            stage: registry.histogram(
+                STAGE_METRIC,
+                "Seconds spent by a request in every stage.",
+                labels={"stage": stage},
+            )
+            for stage in STAGES
+        }
+        self.sample_rate: float = sample_rate
+        self.slow_log: Union[SlowQueryLog, None] = slow_log
+
+    def finish(
+        self, span: Span, client_address: Tuple[str, int], end: int
+    ) -> None:
+        """
+        Record the stages of a request once its answers are written, log it
+        if it is sampled and write it to the slow query log if it is slow.
+
+        Args:
+            span (Span): The span of the request.
+            client_address (tuple): The address of the client.
+            end (int): The perf_counter_ns() of the end of the request.
+        """
+        # spelled out as this runs for every request
+        stages: Dict[str, Histogram] = self.stages
+        if span.recv:
+            stages["recv"].observe(span.recv)
+        if span.decode:
+            stages["decode"].observe(span.decode)
+        if span.reload:
+            stages["reload"].observe(span.reload)
+        if span.search:
+            stages["search"].observe(span.search)
+        if span.send:
+            stages["send"].observe(span.send)
+        if self.sample_rate and sample(self.sample_rate):
+            logger.info(
+                SPAN_LOG_FORMAT,
+                client_address[0],
+                client_address[1],
+                span.queries,
+                {
+                    stage: round(duration / 1000, 1)
+                    for stage, duration in span.timings().items()
+                },
+                round((end - span.start) / 1000, 1),
+            )
+        slow_log: Union[SlowQueryLog, None] = self.slow_log
+        if slow_log is not None and slow_log.is_slow(span, end - span.start):
+            slow_log.write(span, client_address, end - span.start)
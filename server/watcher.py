@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+This module contains the file watcher that keeps the database in sync with the
+search file off the request path. It relies on inotify when the platform
+provides it and falls back to polling the file stat information otherwise.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import threading
+from . import logger
+from .database import Database
+from typing import Union
+
+# inotify event masks, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+)
+
+
+def inotify_watch(dir_path: str) -> Union[int, None]:
+    """
+    Create an inotify file descriptor watching a directory.
+
+    The directory holding the file is watched rather than the file itself so
+    that atomic replacements (write to a temporary file then rename) are seen.
+
+    Args:
+        dir_path (str): The directory to watch.
+
+    Returns:
+        int | None: The inotify file descriptor, or None if inotify is not
+                    available on this platform.
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        inotify_fd: int = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if inotify_fd < 0:
+        return None
+
+    # register the directory with the inotify instance
+    watch_desc: int = libc.inotify_add_watch(
+        inotify_fd, os.fsencode(dir_path), WATCH_MASK
+    )
+    if watch_desc < 0:
+        os.close(inotify_fd)
+        return None
+    return inotify_fd
+
+
+class FileWatcher(threading.Thread):
+    """
+    A daemon thread that reloads the database whenever its search file
+    changes, so that queries never pay the rebuild cost.
+
+    Attributes:
+        database (Database): The database kept in sync with its file.
+        poll_interval (float): The number of seconds between two checks of
+                               the file when inotify is not available, also
+                               the upper bound on the reaction time to a stop
+                               request.
+        inotify (bool): Whether inotify is used to wait for changes.
+    """
+
+    def __init__(self, database: Database, poll_interval: float = 1.0):
+        """
+        Initialize a new file watcher.
+
+        Args:
+            database (Database): The database kept in sync with its file.
+            poll_interval (float): The number of seconds between two stat
+                                   polls of the file.
+        """
+        super().__init__(name="file-watcher", daemon=True)
+        self.database: Database = database
+        self.poll_interval: float = poll_interval
+        self.inotify: bool = False
+        self.__stop_event = threading.Event()
+
+    def run(self) -> None:
+        """
+        Wait for changes to the search file and refresh the database until the
+        watcher is stopped.
+        """
+        dir_path: str = str(self.database.path.resolve().parent)
+        inotify_fd: Union[int, None] = inotify_watch(dir_path)
+        self.inotify = inotify_fd is not None
+        logger.info(
+            "watching search file for changes using "
+            f"{'inotify' if self.inotify else 'stat polling'}"
+        )
+
+        try:
+            # catch any change made before the watch was registered
+            self.__refresh()
+            while not self.__stop_event.is_set():
+                if inotify_fd is not None:
+                    # wait for an event on the directory, then drain it
+                    ready, _, _ = select.select(
+                        [inotify_fd], [], [], self.poll_interval
+                    )
+                    if not ready:
+                        continue
+                    self.__drain(inotify_fd)
+                else:
+                    self.__stop_event.wait(self.poll_interval)
+                self.__refresh()
+        finally:
+            if inotify_fd is not None:
+                os.close(inotify_fd)
+
+    def stop(self) -> None:
+        """Ask the watcher to stop and wait for it to exit."""
+        self.__stop_event.set()
+        if self.is_alive():
+            self.join()
+
+    @staticmethod
+    def __drain(inotify_fd: int) -> None:
+        """read every pending event off the inotify file descriptor"""
+        try:
+            while os.read(inotify_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def __refresh(self) -> None:
+        """reload the database if its file changed, never letting an error
+        kill the watcher"""
+        try:
+            if self.database.refresh():
+                logger.info("search file changed, database reloaded")
+        except (OSError, UnicodeDecodeError) as e:
+            # keep serving the previous data until the file is readable again
+            logger.error(
+                "{"
+                f"reload_error: {str(e)}, "
+                "action: keeping previously loaded data"
+                "}"
+            )
@@ -15,6 +15,14 @@ Fixtures:
     server_1m_no_reread: Start a server with 1 million lines, re-reading
      disabled.
     server_1m_reread: Start a server with 1 million lines, re-reading enabled.
+    server_1m_bisect_no_reread: Start a server with 1 million lines and the
+     bisect algorithm, re-reading disabled.
+    server_1m_bisect_reread: Start a server with 1 million lines and the
+     bisect algorithm, re-reading enabled.
+    server_1m_hash_no_reread: Start a server with 1 million lines and the
+     hash algorithm, re-reading disabled.
+    server_1m_hash_reread: Start a server with 1 million lines and the hash
+     algorithm, re-reading enabled.
 
 Each fixture ensures the server is started before tests and terminated after
      tests.
@@ -40,7 +48,7 @@ def server_10_no_reread(xprocess):
             "cd "
             + str(BASE_DIR)
             + " ; reread_on_query=false port=9001"
-            + " linux_path='speed_test/10k.txt'"
+            + " linuxpath='speed_test/10k.txt'"
             + " python -m server.server_script",
         ]
         timeout = 5  # Maximum time to wait for the server to start
@@ -71,7 +79,7 @@ def server_10_reread(xprocess):
             "cd "
             + str(BASE_DIR)
             + " ; reread_on_query=True port=9001"
-            + " linux_path='speed_test/10k.txt'"
+            + " linuxpath='speed_test/10k.txt'"
             + " python -m server.server_script",
         ]
         timeout = 5  # Maximum time to wait for the server to start
@@ -102,7 +110,7 @@ def server_100_no_reread(xprocess):
             "cd "
             + str(BASE_DIR)
             + " ; reread_on_query=false port=9001"
-            + " linux_path='speed_test/100k.txt'"
+            + " linuxpath='speed_test/100k.txt'"
             + " python -m server.server_script",
         ]
         timeout = 5  # Maximum time to wait for the server to start
@@ -133,7 +141,7 @@ def server_100_reread(xprocess):
             "cd "
             + str(BASE_DIR)
             + " ; reread_on_query=True port=9001"
-            + " linux_path='speed_test/100k.txt'"
+            + " linuxpath='speed_test/100k.txt'"
             + " python -m server.server_script",
         ]
         timeout = 5  # Maximum time to wait for the server to start
@@ -164,7 +172,7 @@ def server_500_no_reread(xprocess):
             "cd "
             + str(BASE_DIR)
             + " ; reread_on_query=False port=9001"
-            + " linux_path='speed_test/500k.txt'"
+            + " linuxpath='speed_test/500k.txt'"
             + " python -m server.server_script",
         ]
         timeout = 5  # Maximum time to wait for the server to start
@@ -195,7 +203,7 @@ def server_500_reread(xprocess):
             "cd "
             + str(BASE_DIR)
             + " ; reread_on_query=True port=9001"
-            + " linux_path='speed_test/500k.txt'"
+            + " linuxpath='speed_test/500k.txt'"
             + " python -m server.server_script",
         ]
         timeout = 5  # Maximum time to wait for the server to start
@@ -226,7 +234,7 @@ def server_1m_no_reread(xprocess):
             "cd "
             + str(BASE_DIR)
             + " ; reread_on_query=False port=9001"
-            + " linux_path='speed_test/1m.txt'"
+            + " linuxpath='speed_test/1m.txt'"
             + " python -m server.server_script",
         ]
         timeout = 5  # Maximum time to wait for the server to start
@@ -257,7 +265,131 @@ def server_1m_reread(xprocess):
             "cd "
             + str(BASE_DIR)
             + " ; reread_on_query=True port=9001"
-            + " linux_path='speed_test/1m.txt'"
+            + " linuxpath='speed_test/1m.txt'"
+            + " python -m server.server_script",
+        ]
+        timeout = 5  # Maximum time to wait for the server to start
+
+        def startup_check(self):
+            # Sleep for a short duration to ensure the server has time to start
+            time.sleep(2)
+            return True
+
+    # Ensure the server is started
+    logfile = xprocess.ensure("unprotected_server", ServerStarter)
+
+    # Wait for the server to start
+    info = xprocess.getinfo("unprotected_server")
+    yield
+
+    # Terminate the server after tests are done
+    xprocess.getinfo("unprotected_server").terminate()
+
+
+@pytest.fixture
+def server_1m_bisect_no_reread(xprocess):
+    class ServerStarter(ProcessStarter):
+        # Command to start the server with the bisect algorithm
+        args = [
+            "/bin/bash",
+            "-c",
+            "cd "
+            + str(BASE_DIR)
+            + " ; reread_on_query=False port=9001 algorithm=bisect"
+            + " linuxpath='speed_test/1m.txt'"
+            + " python -m server.server_script",
+        ]
+        timeout = 5  # Maximum time to wait for the server to start
+
+        def startup_check(self):
+            # Sleep for a short duration to ensure the server has time to start
+            time.sleep(2)
+            return True
+
+    # Ensure the server is started
+    logfile = xprocess.ensure("unprotected_server", ServerStarter)
+
+    # Wait for the server to start
+    info = xprocess.getinfo("unprotected_server")
+    yield
+
+    # Terminate the server after tests are done
+    xprocess.getinfo("unprotected_server").terminate()
+
+
+@pytest.fixture
+def server_1m_bisect_reread(xprocess):
+    class ServerStarter(ProcessStarter):
+        # Command to start the server with the bisect algorithm
+        args = [
+            "/bin/bash",
+            "-c",
+            "cd "
+            + str(BASE_DIR)
+            + " ; reread_on_query=True port=9001 algorithm=bisect"
+            + " linuxpath='speed_test/1m.txt'"
+            + " python -m server.server_script",
+        ]
+        timeout = 5  # Maximum time to wait for the server to start
+
+        def startup_check(self):
+            # Sleep for a short duration to ensure the server has time to start
+            time.sleep(2)
+            return True
+
+    # Ensure the server is started
+    logfile = xprocess.ensure("unprotected_server", ServerStarter)
+
+    # Wait for the server to start
+    info = xprocess.getinfo("unprotected_server")
+    yield
+
+    # Terminate the server after tests are done
+    xprocess.getinfo("unprotected_server").terminate()
+
+
+@pytest.fixture
+def server_1m_hash_no_reread(xprocess):
+    class ServerStarter(ProcessStarter):
+        # Command to start the server with the hash algorithm
+        args = [
+            "/bin/bash",
+            "-c",
+            "cd "
+            + str(BASE_DIR)
+            + " ; reread_on_query=False port=9001 algorithm=hash"
+            + " linuxpath='speed_test/1m.txt'"
+            + " python -m server.server_script",
+        ]
+        timeout = 5  # Maximum time to wait for the server to start
+
+        def startup_check(self):
+            # Sleep for a short duration to ensure the server has time to start
+            time.sleep(2)
+            return True
+
+    # Ensure the server is started
+    logfile = xprocess.ensure("unprotected_server", ServerStarter)
+
+    # Wait for the server to start
+    info = xprocess.getinfo("unprotected_server")
+    yield
+
+    # Terminate the server after tests are done
+    xprocess.getinfo("unprotected_server").terminate()
+
+
+@pytest.fixture
+def server_1m_hash_reread(xprocess):
+    class ServerStarter(ProcessStarter):
+        # Command to start the server with the hash algorithm
+        args = [
+            "/bin/bash",
+            "-c",
+            "cd "
+            + str(BASE_DIR)
+            + " ; reread_on_query=True port=9001 algorithm=hash"
+            + " linuxpath='speed_test/1m.txt'"
             + " python -m server.server_script",
         ]
         timeout = 5  # Maximum time to wait for the server to start
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+This script benchmarks batch lookups against the 1 million lines search file,
+comparing a loop of scalar binary searches over a sorted list with a single
+vectorized search of the "numpy" storage.
+
+Both benchmarks look up the same batch of 10 thousand queries, half of which
+exist in the file.
+"""
+import pytest
+from bisect import bisect_left
+from pathlib import Path
+from server.database import Database
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+FILE_PATH = BASE_DIR / "speed_test" / "1m.txt"
+BATCH_SIZE = 10000
+
+
+@pytest.fixture(scope="module")
+def queries():
+    """Fixture for a batch of queries, every other one missing."""
+    with open(FILE_PATH, "r") as file:
+        lines = [next(file) for _ in range(BATCH_SIZE // 2)]
+    return [q for line in lines for q in (line, "x" + line)]
+
+
+def test_1m_batch_bisect(queries, benchmark):
+    with open(FILE_PATH, "r") as file:
+        data = sorted(file.readlines())
+
+    def scalar_lookups():
+        found = []
+        for query in queries:
+            idx = bisect_left(data, query)
+            found.append(idx < len(data) and data[idx] == query)
+        return found
+
+    result = benchmark(scalar_lookups)
+    assert sum(result) == BATCH_SIZE // 2
+
+
+def test_1m_batch_numpy(queries, benchmark):
+    pytest.importorskip("numpy")
+    db = Database(
+        reread_on_query=False,
+        file_path=FILE_PATH,
+        sorting_algorithm=sorted,
+        storage="numpy",
+    )
+
+    result = benchmark(db.search_many, None, queries)
+    assert sum(result) == BATCH_SIZE // 2
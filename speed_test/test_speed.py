@@ -7,6 +7,8 @@ lines from a file.
 Each test function benchmarks the performance of a client connection
 to the server under varying conditions (reread vs. no reread) and with
 different numbers of lines being read by the server (10, 100, 500, 1 million).
+The 1 million lines benchmarks are also run against the bisect and hash
+algorithms to compare a sorted list lookup with a hash set lookup.
 """
 import ssl
 from . import env_vars  # Assuming env_vars is defined in the __init__.py file
@@ -139,3 +141,67 @@ def test_1m_reread(server_1m_reread, benchmark):
 
     result = benchmark(client_connection)
     print(result)
+
+
+def test_1m_bisect_no_reread(server_1m_bisect_no_reread, benchmark):
+    def client_connection():
+        with create_connection(
+            (str(env_vars.HOST), env_vars.TEST_PORT)
+        ) as conn:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            context.load_verify_locations("cert.pem")
+            ssl_conn = context.wrap_socket(conn, server_hostname="localhost")
+            ssl_conn.sendall(b"3;0;1;28;0;7;5;0;")
+            response = ssl_conn.recv(1024).decode()
+            return response
+
+    result = benchmark(client_connection)
+    print(result)
+
+
+def test_1m_bisect_reread(server_1m_bisect_reread, benchmark):
+    def client_connection():
+        with create_connection(
+            (str(env_vars.HOST), env_vars.TEST_PORT)
+        ) as conn:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            context.load_verify_locations("cert.pem")
+            ssl_conn = context.wrap_socket(conn, server_hostname="localhost")
+            ssl_conn.sendall(b"3;0;1;28;0;7;5;0;")
+            response = ssl_conn.recv(1024).decode()
+            return response
+
+    result = benchmark(client_connection)
+    print(result)
+
+
+def test_1m_hash_no_reread(server_1m_hash_no_reread, benchmark):
+    def client_connection():
+        with create_connection(
+            (str(env_vars.HOST), env_vars.TEST_PORT)
+        ) as conn:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            context.load_verify_locations("cert.pem")
+            ssl_conn = context.wrap_socket(conn, server_hostname="localhost")
+            ssl_conn.sendall(b"3;0;1;28;0;7;5;0;")
+            response = ssl_conn.recv(1024).decode()
+            return response
+
+    result = benchmark(client_connection)
+    print(result)
+
+
+def test_1m_hash_reread(server_1m_hash_reread, benchmark):
+    def client_connection():
+        with create_connection(
+            (str(env_vars.HOST), env_vars.TEST_PORT)
+        ) as conn:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            context.load_verify_locations("cert.pem")
+            ssl_conn = context.wrap_socket(conn, server_hostname="localhost")
+            ssl_conn.sendall(b"3;0;1;28;0;7;5;0;")
+            response = ssl_conn.recv(1024).decode()
+            return response
+
+    result = benchmark(client_connection)
+    print(result)
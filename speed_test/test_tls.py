@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+This script benchmarks the latency of a lookup over a fresh TLS connection,
+comparing a full handshake on every connection with a handshake resuming the
+session of the previous connection from a session ticket.
+
+Both benchmarks query the 10k lines server, whose lookup time is negligible
+next to the handshake.
+"""
+import pytest
+from . import env_vars
+from server.tls import ResumingClient
+
+
+@pytest.fixture
+def client():
+    """Fixture for a client of the test server."""
+    return ResumingClient(
+        (str(env_vars.HOST), env_vars.TEST_PORT), cafile="cert.pem"
+    )
+
+
+def test_10k_full_handshake(server_10_no_reread, client, benchmark):
+    def client_connection():
+        client.session = None  # forget the session, negotiate a new one
+        return client.query("3;0;1;28;0;7;5;0;")
+
+    result = benchmark(client_connection)
+    assert result == "STRING EXISTS\n"
+    assert client.resumed == 0
+
+
+def test_10k_resumed_handshake(server_10_no_reread, client, benchmark):
+    client.query("3;0;1;28;0;7;5;0;")  # the full handshake issuing a ticket
+
+    result = benchmark(client.query, "3;0;1;28;0;7;5;0;")
+    assert result == "STRING EXISTS\n"
+    assert client.full == 1
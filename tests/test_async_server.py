@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+This module contains tests for the asyncio server engine, run in process on
+an ephemeral port.
+"""
+import asyncio
+import pytest
+from server.async_server import AsyncServer
+from server.protocol import BINARY_MAGIC
+from server.protocol import bitmap_size
+from server.protocol import decode_bitmap
+from server.protocol import encode_batch
+from server.setup import LoadEnv
+
+
+@pytest.fixture
+def search_file(tmp_path):
+    """Fixture for a small search file."""
+    file_path = tmp_path / "search.txt"
+    file_path.write_text("3;0;1;28;0;7;5;0;\napple\nbanana\n")
+    return file_path
+
+
+def make_server(search_file, reread):
+    """Build an unsecured asyncio server on an ephemeral port."""
+    env_vars = LoadEnv(
+        HOST="127.0.0.1",
+        PORT=9000,
+        TEST_PORT=9001,
+        LINUXPATH=search_file,
+        SSL=False,
+        REREAD_ON_QUERY=reread,
+        ALGORITHM="bisect",
+        DEBUG=str(search_file.parent / "debug.log"),
+    )
+    return AsyncServer(("127.0.0.1", 0), env_vars)
+
+
+async def query(port, *queries):
+    """Send queries over one connection and collect the responses."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    responses = []
+    for req in queries:
+        writer.write(req)
+        await writer.drain()
+        responses.append(await reader.readline())
+    writer.close()
+    await writer.wait_closed()
+    return responses
+
+
+async def run_server(server, client):
+    """Start a server, run a client coroutine against it and stop it."""
+    await server.start()
+    port = server.server.sockets[0].getsockname()[1]
+    try:
+        return await client(port)
+    finally:
+        server.server.close()
+        await server.server.wait_closed()
+        server.close_database()
+
+
+@pytest.mark.parametrize("reread", [False, True])
+def test_async_queries(search_file, reread):
+    """Test the responses of the asyncio engine."""
+    server = make_server(search_file, reread)
+    responses = asyncio.run(
+        run_server(
+            server,
+            lambda port: query(port, b"3;0;1;28;0;7;5;0;", b"not;exist;"),
+        )
+    )
+    assert responses == [b"STRING EXISTS\n", b"STRING NOT FOUND\n"]
+
+
+def test_async_reread(search_file):
+    """Test that a changed file is picked up off the event loop."""
+    server = make_server(search_file, True)
+
+    async def client(port):
+        first = await query(port, b"kiwi")
+        search_file.write_text("kiwi\n" + search_file.read_text())
+        return first + await query(port, b"kiwi")
+
+    responses = asyncio.run(run_server(server, client))
+    assert responses == [b"STRING NOT FOUND\n", b"STRING EXISTS\n"]
+
+
+def test_async_concurrent_connections(search_file):
+    """Test many connections served at once by the event loop."""
+    server = make_server(search_file, False)
+
+    async def client(port):
+        return await asyncio.gather(
+            *(query(port, b"apple", b"kiwi") for _ in range(200))
+        )
+
+    results = asyncio.run(run_server(server, client))
+    assert results == [[b"STRING EXISTS\n", b"STRING NOT FOUND\n"]] * 200
+
+
+def test_async_pipelined_queries(search_file):
+    """Test that queries sent back to back are answered in order."""
+    server = make_server(search_file, False)
+    queries = [b"apple", b"kiwi", b"banana"] * 100
+
+    async def client(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"\n".join(queries) + b"\n")
+        await writer.drain()
+        responses = [await reader.readline() for _ in queries]
+        writer.close()
+        await writer.wait_closed()
+        return responses
+
+    responses = asyncio.run(run_server(server, client))
+    assert responses == [
+        b"STRING NOT FOUND\n" if q == b"kiwi" else b"STRING EXISTS\n"
+        for q in queries
+    ]
+
+
+def test_async_binary_batches(search_file):
+    """Test that batches sent over the binary protocol are answered."""
+    server = make_server(search_file, False)
+    keys = ["apple", "kiwi", "banana"] * 1000
+
+    async def client(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(BINARY_MAGIC + encode_batch(keys) + encode_batch([]))
+        await writer.drain()
+        first = await reader.readexactly(bitmap_size(len(keys)))
+        second = await reader.readexactly(bitmap_size(0))
+        writer.close()
+        await writer.wait_closed()
+        return decode_bitmap(first), decode_bitmap(second)
+
+    first, second = asyncio.run(run_server(server, client))
+    assert first == [key != "kiwi" for key in keys]
+    assert second == []
+
+
+def test_async_limits(search_file):
+    """Test that idle connections time out and that connections beyond the
+    cap are turned away."""
+    env_vars = LoadEnv(
+        HOST="127.0.0.1",
+        PORT=9000,
+        TEST_PORT=9001,
+        LINUXPATH=search_file,
+        SSL=False,
+        ALGORITHM="bisect",
+        MAX_CONNECTIONS=1,
+        IDLE_TIMEOUT=0.3,
+        DEBUG=str(search_file.parent / "debug.log"),
+    )
+    server = AsyncServer(("127.0.0.1", 0), env_vars)
+
+    async def client(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"apple\n")
+        first = await reader.readline()
+        other_reader, other = await asyncio.open_connection("127.0.0.1", port)
+        busy = await other_reader.read()
+        other.close()
+        # the idle connection is closed by the server
+        closed = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        return first, busy, closed
+
+    assert asyncio.run(run_server(server, client)) == (
+        b"STRING EXISTS\n",
+        b"SERVER BUSY\n",
+        b"",
+    )
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import pytest
+from server.bloom import BloomFilter
+
+
+@pytest.fixture
+def lines():
+    """Fixture for a list of search strings."""
+    return [f"{i};0;{i % 7};28;0;7;5;0;\n" for i in range(2000)]
+
+
+def test_bloom_no_false_negatives(lines):
+    """Test that every added string is reported as possibly present."""
+    bloom = BloomFilter.from_items(lines, len(lines))
+    assert bloom.count == len(lines)
+    assert all(line in bloom for line in lines)
+    assert all(line.encode() in bloom for line in lines)
+
+
+def test_bloom_false_positive_rate(lines):
+    """Test that the false positive rate stays close to its target."""
+    bloom = BloomFilter.from_items(lines, len(lines), fp_rate=0.01)
+    misses = [f"{i};1;0;0;0;0;0;0;\n" for i in range(10000)]
+    false_positives = sum(miss in bloom for miss in misses)
+    assert false_positives < 300
+    assert bloom.fp_rate < 0.02
+
+
+def test_bloom_memory_budget(lines):
+    """Test that the memory budget caps the size of the filter."""
+    unbounded = BloomFilter.from_items(lines, len(lines), fp_rate=0.001)
+    bounded = BloomFilter.from_items(
+        lines, len(lines), fp_rate=0.001, max_bytes=256
+    )
+    assert bounded.nbytes == 256 < unbounded.nbytes
+    assert bounded.fp_rate > unbounded.fp_rate
+    assert all(line in bounded for line in lines)
+
+
+def test_bloom_empty():
+    """Test a filter holding no strings."""
+    bloom = BloomFilter(0)
+    assert "apple\n" not in bloom
+    assert 123 not in bloom
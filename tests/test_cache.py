@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+import pytest
+from server.cache import *
+
+
+def test_lru_eviction():
+    """Test that the least recently used entry is evicted first."""
+    cache = QueryCache(2)
+    cache.put("apple\n", 1, True)
+    cache.put("kiwi\n", 1, False)
+    assert cache.get("apple\n", 1) is True
+    cache.put("fig\n", 1, True)
+    assert cache.get("kiwi\n", 1) is None
+    assert cache.get("apple\n", 1) is True
+    assert cache.get("fig\n", 1) is True
+    assert len(cache) == 2
+    assert cache.evictions == 1
+
+
+def test_version_invalidation():
+    """Test that an entry of an older version is a miss and gets replaced."""
+    cache = QueryCache(4)
+    cache.put("kiwi\n", 1, False)
+    assert cache.get("kiwi\n", 1) is False
+    assert cache.get("kiwi\n", 2) is None
+    cache.put("kiwi\n", 2, True)
+    assert cache.get("kiwi\n", 2) is True
+    assert len(cache) == 1
+
+
+def test_tinylfu_admission():
+    """Test that one-off queries do not flush a popular entry."""
+    cache = QueryCache(4, "tinylfu")
+    for _ in range(5):
+        cache.get("apple\n", 1)
+    cache.put("apple\n", 1, True)
+    for idx in range(20):
+        query = f"miss{idx}\n"
+        assert cache.get(query, 1) is None
+        cache.put(query, 1, False)
+    assert cache.get("apple\n", 1) is True
+    assert len(cache) == 4
+    assert cache.rejections == 17
+    assert cache.evictions == 0
+
+
+def test_frequency_sketch_aging():
+    """Test that the sketch counts requests and halves them over time."""
+    sketch = FrequencySketch(1)
+    for _ in range(4):
+        sketch.increment("apple\n")
+    assert sketch.frequency("apple\n") >= 4
+    assert sketch.frequency("kiwi\n") <= sketch.frequency("apple\n")
+    for _ in range(6):
+        sketch.increment("apple\n")
+    assert sketch.frequency("apple\n") == 5
+
+
+def test_stats():
+    """Test the hit ratio and the size estimate."""
+    cache = QueryCache(8)
+    assert cache.hit_ratio == 0.0
+    cache.put("apple\n", 1, True)
+    cache.get("apple\n", 1)
+    cache.get("kiwi\n", 1)
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+    assert stats["bytes"] > 0
+
+
+@pytest.mark.parametrize("capacity, policy", [(0, "lru"), (1, "lfu")])
+def test_invalid_cache(capacity, policy):
+    """Test that an invalid capacity or policy is rejected."""
+    with pytest.raises(ValueError):
+        QueryCache(capacity, policy)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+import pytest
+import random
+from server.calibration import *
+from server.search_algorithms import algorithm_names
+
+
+@pytest.fixture
+def search_file(tmp_path):
+    """Fixture for a search file of a few hundred lines."""
+    file_path = tmp_path / "search.txt"
+    lines = [f"{i};0;{i % 7};28;0;7;5;0;\n" for i in range(500)]
+    file_path.write_text("".join(reversed(lines)))
+    return file_path
+
+
+def test_sample_queries(search_file):
+    """Test that the sample holds as many hits as misses."""
+    lines = search_file.read_text().splitlines(keepends=True)
+    queries = sample_queries(lines, 50)
+    hits = [query for query in queries if query in lines]
+    assert len(hits) == 50
+    assert len(queries) == 100
+    assert all(query.endswith("\n") for query in queries)
+    assert sample_queries(lines, 50) == queries
+
+
+def test_sample_queries_small_file():
+    """Test sampling a file smaller than the sample."""
+    queries = sample_queries(["apple\n", "banana"], 10)
+    assert sorted(queries) == ["apple\n", "apple~\n", "banana\n", "banana~\n"]
+
+
+@pytest.mark.parametrize("include_rebuild", [False, True])
+def test_calibrate(search_file, include_rebuild):
+    """Test that every algorithm is measured and the cheapest one wins."""
+    result = calibrate(search_file, include_rebuild, 10, budget_ms=20)
+    assert list(result.lookup_ns) == algorithm_names()
+    assert result.winner in algorithm_names()
+    assert result.score_ns[result.winner] == min(result.score_ns.values())
+    for name, score in result.score_ns.items():
+        rebuild = result.build_ns[name] / 10 if include_rebuild else 0
+        assert score == result.lookup_ns[name] + rebuild
+
+
+def test_calibrate_rebuild_penalty(tmp_path, monkeypatch):
+    """Test that a sorting algorithm with the fastest lookups loses once the
+    index is rebuilt often."""
+    file_path = tmp_path / "shuffled.txt"
+    lines = [f"{i};0;{i % 7};28;0;7;5;0;\n" for i in range(50_000)]
+    random.Random(0).shuffle(lines)
+    file_path.write_text("".join(lines))
+
+    # bisect looks up fastest, the others alike
+    monkeypatch.setattr(
+        "server.calibration.time_lookups",
+        lambda algorithm, index, queries, budget_ns: (
+            100.0 if algorithm.name == "bisect" else 1000.0
+        ),
+    )
+    assert calibrate(file_path).winner == "bisect"
+    assert calibrate(file_path, True, 1_000_000).winner == "bisect"
+    # the sort of bisect costs more than a hash set, rebuilt on every query
+    result = calibrate(file_path, True, 1)
+    assert result.build_ns["hash"] < result.build_ns["bisect"]
+    assert result.winner == "hash"
+
+
+def test_calibrate_empty_file(tmp_path):
+    """Test calibrating an empty file."""
+    file_path = tmp_path / "empty.txt"
+    file_path.write_text("")
+    assert calibrate(file_path).winner in algorithm_names()
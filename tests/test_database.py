@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
+import os
+import threading
+import time
 import pytest
 from pathlib import Path
+from server.cache import QueryCache
 from server.database import Database
+from server.storage import index_cache_path
 from server.search_algorithms import *
 
 
@@ -231,3 +236,308 @@ def test_reload_method(sorted_list):
     )
     db.reload()
     assert db.search(binary_search_iter, "cherry")
+
+
+def test_refresh_unchanged_file(sorted_list):
+    """Test that refresh does not reload an unchanged file."""
+    db = Database(
+        reread_on_query=True,
+        file_path=sorted_list,
+        sorting_algorithm=sort_function,
+    )
+    assert not db.is_stale()
+    assert not db.refresh()
+    assert db.search(binary_search_iter, "cherry")
+
+
+def test_refresh_changed_file(sorted_list):
+    """Test that refresh reloads a file that changed since the last load."""
+    db = Database(
+        reread_on_query=False,
+        file_path=sorted_list,
+        sorting_algorithm=sort_function,
+    )
+    sorted_list.write_text("kiwi\n" + sorted_list.read_text())
+    assert db.is_stale()
+    assert db.refresh()
+    assert db.search(binary_search_iter, "kiwi")
+
+
+def test_refresh_same_size_rewrite_with_checksum(sorted_list):
+    """Test that the checksum catches a rewrite with identical stat info."""
+    db = Database(
+        reread_on_query=True,
+        file_path=sorted_list,
+        sorting_algorithm=sort_function,
+        verify_checksum=True,
+    )
+    stat = sorted_list.stat()
+    sorted_list.write_text(sorted_list.read_text().replace("apple", "apric"))
+    os.utime(sorted_list, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert db.search(binary_search_iter, "apric")
+    assert not db.search(binary_search_iter, "apple")
+
+
+def test_reload_missing_file(sorted_list):
+    """Test that a search file removed while serving raises an error."""
+    db = Database(
+        reread_on_query=True,
+        file_path=sorted_list,
+        sorting_algorithm=sort_function,
+    )
+    sorted_list.unlink()
+    with pytest.raises(FileNotFoundError):
+        db.search(binary_search_iter, "cherry")
+
+
+def test_hash_index(sorted_list):
+    """Test searching a frozenset index built instead of a sorted list."""
+    db = Database(
+        reread_on_query=True,
+        file_path=sorted_list,
+        sorting_algorithm=frozenset,
+    )
+    assert db.search(hash_search, "cherry\n")
+    assert not db.search(hash_search, "kiwi\n")
+
+    # Modify the file
+    sorted_list.write_text("kiwi\n" + sorted_list.read_text())
+    assert db.search(hash_search, "kiwi\n")
+
+
+def test_mmap_storage(sorted_list):
+    """Test searching a sorted copy mapped into memory."""
+    db = Database(
+        reread_on_query=True,
+        file_path=sorted_list,
+        sorting_algorithm=sorted,
+        storage="mmap",
+        block_size=8,
+    )
+    assert db.search(bisect_search, "cherry\n")
+    assert db.search(bisect_search, "grape\n")
+    assert not db.search(bisect_search, "kiwi\n")
+
+    # Modify the file
+    sorted_list.write_text("kiwi\n" + sorted_list.read_text())
+    assert db.search(bisect_search, "kiwi\n")
+
+
+def test_compact_storage(sorted_list):
+    """Test searching the sorted lines held in a single bytes blob."""
+    db = Database(
+        reread_on_query=True,
+        file_path=sorted_list,
+        sorting_algorithm=sorted,
+        storage="compact",
+    )
+    assert db.search(bisect_search, "apple\n")
+    assert db.search(bisect_search, "grape\n")
+    assert not db.search(bisect_search, "kiwi\n")
+
+    # Modify the file
+    sorted_list.write_text("kiwi\n" + sorted_list.read_text())
+    assert db.search(bisect_search, "kiwi\n")
+
+
+def test_memory_footprint(sorted_list):
+    """Test that the compact storage reports a smaller footprint."""
+    memory_db = Database(False, sorted_list, sorted)
+    compact_db = Database(False, sorted_list, sorted, storage="compact")
+    assert 0 < compact_db.memory_footprint() < memory_db.memory_footprint()
+
+
+def test_index_cache(sorted_list):
+    """Test that the compact storage is saved to and loaded from a cache."""
+    cache_path = index_cache_path(sorted_list)
+    db = Database(
+        False, sorted_list, sorted, storage="compact", index_cache=True
+    )
+    assert cache_path.is_file()
+    assert db.search(bisect_search, "fig\n")
+
+    # a valid cache is loaded as is
+    mtime_ns = cache_path.stat().st_mtime_ns
+    db = Database(
+        False, sorted_list, sorted, storage="compact", index_cache=True
+    )
+    assert cache_path.stat().st_mtime_ns == mtime_ns
+    assert db.search(bisect_search, "fig\n")
+
+    # a stale cache is rebuilt
+    sorted_list.write_text("kiwi\n" + sorted_list.read_text())
+    db.reload()
+    assert db.search(bisect_search, "kiwi\n")
+
+    # a corrupt cache is rebuilt
+    cache_path.write_bytes(cache_path.read_bytes()[:-3])
+    db.reload()
+    assert db.search(bisect_search, "kiwi\n")
+    assert db.search(bisect_search, "grape\n")
+
+
+@pytest.mark.parametrize(
+    "storage", ["memory", "compact", "mmap", "scan", "packed"]
+)
+def test_bloom_filter(sorted_list, storage):
+    """Test that the Bloom filter skips misses without losing hits."""
+    db = Database(
+        reread_on_query=True,
+        file_path=sorted_list,
+        sorting_algorithm=sorted,
+        storage=storage,
+        bloom_fp_rate=0.01,
+    )
+    for line in sorted_list.read_text().splitlines(keepends=True):
+        assert db.search(bisect_search, line)
+    assert not db.search(bisect_search, "kiwi\n")
+    stats = db.bloom_stats()
+    assert stats["passes"] == 6
+    assert stats["skips"] + stats["false_positives"] == 1
+    assert stats["bytes"] > 0
+
+    # the filter is rebuilt with the data
+    sorted_list.write_text("kiwi\n" + sorted_list.read_text())
+    assert db.search(bisect_search, "kiwi\n")
+
+
+def test_scan_storage(sorted_list):
+    """Test searching the mapped search file in reread mode."""
+    db = Database(
+        reread_on_query=True,
+        file_path=sorted_list,
+        sorting_algorithm=sorted,
+        storage="scan",
+    )
+    assert db.search(bisect_search, "apple\n")
+    assert db.search(bisect_search, "grape\n")
+    assert not db.search(bisect_search, "kiwi\n")
+
+    # Replace the file
+    replacement = sorted_list.with_name("replacement.txt")
+    replacement.write_text("kiwi\n" + sorted_list.read_text())
+    replacement.replace(sorted_list)
+    assert db.search(bisect_search, "kiwi\n")
+
+
+def test_packed_storage(sorted_list):
+    """Test searching records packed into integer keys."""
+    sorted_list.write_text("3;0;1;28;0;7;5;0;\n" + sorted_list.read_text())
+    db = Database(
+        reread_on_query=True,
+        file_path=sorted_list,
+        sorting_algorithm=sorted,
+        storage="packed",
+    )
+    assert db.search(bisect_search, "3;0;1;28;0;7;5;0;\n")
+    assert db.search(bisect_search, "apple\n")
+    assert not db.search(bisect_search, "3;0;1;28;0;7;5;1;\n")
+
+    # Modify the file
+    sorted_list.write_text("3;0;1;28;0;7;5;1;\n" + sorted_list.read_text())
+    assert db.search(bisect_search, "3;0;1;28;0;7;5;1;\n")
+
+
+def test_numpy_storage(sorted_list):
+    """Test batch searches over the NumPy storage."""
+    pytest.importorskip("numpy")
+    db = Database(
+        reread_on_query=True,
+        file_path=sorted_list,
+        sorting_algorithm=sorted,
+        storage="numpy",
+    )
+    assert db.search(bisect_search, "apple\n")
+    assert db.search_many(bisect_search, ["fig\n", "kiwi\n", "date\n"]) == [
+        True,
+        False,
+        True,
+    ]
+
+    # Modify the file
+    sorted_list.write_text("kiwi\n" + sorted_list.read_text())
+    assert db.search_many(bisect_search, ["kiwi\n"]) == [True]
+
+
+@pytest.mark.parametrize("storage", ["memory", "compact", "scan"])
+def test_search_many(sorted_list, storage):
+    """Test that batch searches match single searches on every storage."""
+    db = Database(
+        reread_on_query=False,
+        file_path=sorted_list,
+        sorting_algorithm=sorted,
+        storage=storage,
+        bloom_fp_rate=0.01,
+    )
+    queries = ["apple\n", "kiwi\n", "grape\n", "grape"]
+    assert db.search_many(bisect_search, queries) == [
+        db.search(bisect_search, query) for query in queries
+    ]
+
+
+def test_snapshot_versions(sorted_list):
+    """Test that every reload publishes a new snapshot."""
+    db = Database(
+        reread_on_query=True,
+        file_path=sorted_list,
+        sorting_algorithm=sorted,
+    )
+    first = db.snapshot
+    assert first.version == 1
+    assert first.identity == db.identity
+    assert not db.refresh()
+    assert db.snapshot is first
+
+    # Modify the file
+    sorted_list.write_text("kiwi\n" + sorted_list.read_text())
+    assert db.search(bisect_search, "kiwi\n")
+    assert db.snapshot.version == 2
+    assert "kiwi\n" not in first.data
+
+
+def test_single_flight_reload(sorted_list):
+    """Test that concurrent searches of a changed file share one reload."""
+    sorts = []
+
+    def slow_sort(lines):
+        sorts.append(len(lines))
+        time.sleep(0.2)
+        return sorted(lines)
+
+    db = Database(
+        reread_on_query=True,
+        file_path=sorted_list,
+        sorting_algorithm=slow_sort,
+    )
+    sorted_list.write_text("kiwi\n" + sorted_list.read_text())
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(db.search(bisect_search, "kiwi\n"))
+        )
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [True] * 8
+    assert sorts == [6, 7]
+
+
+def test_query_cache(sorted_list):
+    """Test that cached results are dropped when the file changes."""
+    db = Database(
+        reread_on_query=True,
+        file_path=sorted_list,
+        sorting_algorithm=sorted,
+        cache=QueryCache(16),
+    )
+    assert not db.search(bisect_search, "kiwi\n")
+    assert not db.search(bisect_search, "kiwi\n")
+    assert db.cache.hits == 1
+
+    # Modify the file
+    sorted_list.write_text("kiwi\n" + sorted_list.read_text())
+    assert db.search(bisect_search, "kiwi\n")
+    assert db.cache.hits == 1
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+This module contains tests for the log pipeline writing the records of the
+server from a background thread.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from server.logs import DeferredFileHandler
+from server.logs import DroppingQueueHandler
+from server.logs import LogPipeline
+from server.logs import sample
+
+
+class Formatted:
+    """An argument recording the threads formatting it."""
+
+    def __init__(self):
+        self.threads = []
+
+    def __str__(self):
+        self.threads.append(threading.current_thread().name)
+        return "formatted"
+
+
+def make_logger(tmp_path, name, flush_interval=0.05):
+    """Build a logger writing to a file through a pipeline."""
+    handler = DeferredFileHandler(tmp_path / f"{name}.log")
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    pipeline = LogPipeline([handler], flush_interval)
+    logger = logging.getLogger(f"test_logs.{name}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(pipeline.queue_handler)
+    return logger, pipeline
+
+
+def test_records_are_formatted_by_the_pipeline(tmp_path):
+    """Test that records are formatted off the logging thread, and not at
+    all below the level of the logger."""
+    logger, pipeline = make_logger(tmp_path, "lazy")
+    pipeline.start()
+    skipped, logged = Formatted(), Formatted()
+    logger.debug("query %s", skipped)
+    logger.info("query %s", logged)
+    pipeline.stop()
+
+    assert skipped.threads == []
+    assert logged.threads == ["log-pipeline"]
+    assert (tmp_path / "lazy.log").read_text() == "INFO query formatted\n"
+
+
+def test_records_are_flushed_every_interval(tmp_path):
+    """Test that the log file is flushed without stopping the pipeline."""
+    logger, pipeline = make_logger(tmp_path, "flush")
+    pipeline.start()
+    try:
+        logger.info("first")
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if (tmp_path / "flush.log").read_text() == "INFO first\n":
+                break
+            time.sleep(0.01)
+        assert (tmp_path / "flush.log").read_text() == "INFO first\n"
+    finally:
+        pipeline.stop()
+
+
+def test_full_queue_drops_records():
+    """Test that logging never blocks on a full queue."""
+    handler = DroppingQueueHandler(queue.Queue(2))
+    record = logging.makeLogRecord({"msg": "query"})
+    for _ in range(5):
+        handler.handle(record)
+    assert handler.dropped == 3
+
+
+def test_dropped_records_are_reported(tmp_path):
+    """Test that the records dropped are counted in a warning on stop."""
+    logger, pipeline = make_logger(tmp_path, "dropped")
+    pipeline.start()
+    logger.info("kept")
+    pipeline.queue_handler.dropped = 3
+    pipeline.stop()
+    assert (tmp_path / "dropped.log").read_text().splitlines() == [
+        "INFO kept",
+        "WARNING 3 log records dropped, the log queue was full",
+    ]
+
+
+def test_forked_child_logs(tmp_path):
+    """Test that a forked child gets a pipeline of its own."""
+    logger, pipeline = make_logger(tmp_path, "fork")
+    pipeline.start()
+    logger.info("parent")
+    pid = os.fork()
+    if not pid:
+        logger.info("child")
+        pipeline.stop()
+        os._exit(0)
+    os.waitpid(pid, 0)
+    pipeline.stop()
+    lines = (tmp_path / "fork.log").read_text().splitlines()
+    assert sorted(lines) == ["INFO child", "INFO parent"]
+
+
+def test_sample():
+    """Test the share of sampled queries."""
+    assert all(sample(1.0) for _ in range(100))
+    assert not any(sample(0.0) for _ in range(100))
+    assert 200 < sum(sample(0.5) for _ in range(1000)) < 800
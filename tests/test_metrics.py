@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+This module contains tests for the metrics registry, its histograms and its
+HTTP exposition, and for the metrics recorded by an in process server.
+"""
+import pytest
+import random
+import socket
+import threading
+import urllib.request
+from server.metrics import CONTENT_TYPE
+from server.metrics import Counter
+from server.metrics import Histogram
+from server.metrics import MetricsRegistry
+from server.metrics import MetricsServer
+from server.protocol import BINARY_MAGIC
+from server.protocol import encode_batch
+from server.server import Server
+from server.server import TCPHandler
+from server.setup import LoadEnv
+
+
+def test_histogram_buckets():
+    """Test that every value falls within the bounds of its bucket."""
+    histogram = Histogram("test_seconds", "Test.")
+    previous = -1
+    for value in list(range(5000)) + [
+        random.getrandbits(40) for _ in range(5000)
+    ]:
+        index = histogram.bucket(value)
+        lowest, highest = histogram.bounds(index)
+        assert lowest <= value <= highest
+        # the relative error is bounded by the number of sub buckets
+        assert highest - lowest <= max(lowest / 16, 0)
+        if value < 5000:
+            # buckets are contiguous and ordered
+            assert index in (previous, previous + 1)
+            previous = index
+    assert histogram.bucket(2**44 - 1) == histogram.size - 1
+
+
+def test_histogram_quantiles():
+    """Test the quantiles, sum and count of a histogram."""
+    histogram = Histogram("test_seconds", "Test.", scale=1)
+    assert histogram.quantile(0.5) is None
+    for value in range(1, 1001):
+        histogram.observe(value)
+    histogram.observe(10**6, count=10)
+    assert histogram.count == 1010
+    assert histogram.quantile(0.5) == pytest.approx(505, rel=1 / 16)
+    assert histogram.quantile(0.995) == pytest.approx(10**6, rel=1 / 16)
+    assert histogram.counts()[1] == sum(range(1, 1001)) + 10**7
+
+
+def test_counter_threads():
+    """Test that the increments of concurrent threads are all counted."""
+    counter = Counter("test_total", "Test.")
+    histogram = Histogram("test_seconds", "Test.")
+
+    def work():
+        for _ in range(10000):
+            counter.inc()
+            histogram.observe(1000)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.value == 80000
+    assert histogram.count == 80000
+
+
+def test_exposition():
+    """Test the Prometheus text format of a registry."""
+    registry = MetricsRegistry()
+    registry.counter("test_total", "Things counted.").inc(3)
+    registry.gauge("test_open", "Things open.", lambda: 7)
+    histogram = registry.histogram("test_seconds", "Things timed.")
+    histogram.observe(1_000_000)  # 1ms
+    histogram.observe(3_000_000, count=2)
+    lines = registry.exposition().splitlines()
+    assert "# TYPE test_total counter" in lines
+    assert "test_total 3" in lines
+    assert "test_open 7" in lines
+    assert "# TYPE test_seconds histogram" in lines
+    buckets = [
+        line for line in lines if line.startswith("test_seconds_bucket")
+    ]
+    assert len(buckets) == 3
+    assert buckets[0].endswith(" 1") and buckets[1].endswith(" 3")
+    assert buckets[-1] == 'test_seconds_bucket{le="+Inf"} 3'
+    assert "test_seconds_count 3" in lines
+    assert "test_seconds_sum 0.007" in lines
+    summary = registry.summary()
+    assert summary["test_total"] == 3
+    assert summary["test_seconds"]["count"] == 3
+
+
+def test_metrics_server():
+    """Test that the registry is served on /metrics and nothing else."""
+    registry = MetricsRegistry()
+    registry.counter("test_total", "Things counted.").inc()
+    metrics_server = MetricsServer(("127.0.0.1", 0), registry)
+    metrics_server.start()
+    url = f"http://127.0.0.1:{metrics_server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert response.headers["Content-Type"] == CONTENT_TYPE
+            assert b"test_total 1\n" in response.read()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other")
+    finally:
+        metrics_server.stop()
+
+
+@pytest.fixture
+def server(tmp_path):
+    """Fixture for a threaded server serving on an ephemeral port."""
+    search_file = tmp_path / "search.txt"
+    search_file.write_text("3;0;1;28;0;7;5;0;\n")
+    env_vars = LoadEnv(
+        HOST="127.0.0.1",
+        PORT=9000,
+        TEST_PORT=9001,
+        LINUXPATH=search_file,
+        SSL=False,
+        REREAD_ON_QUERY=False,
+        ALGORITHM="bisect",
+        DEBUG=str(tmp_path / "debug.log"),
+    )
+    server = Server(("127.0.0.1", 0), TCPHandler, env_vars)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_server_metrics(server):
+    """Test the metrics recorded for text queries and binary batches."""
+    address = ("127.0.0.1", server.server_address[1])
+    with socket.create_connection(address) as conn:
+        conn.sendall(b"3;0;1;28;0;7;5;0;\nnot;here;\n")
+        received = b""
+        while received.count(b"\n") < 2:
+            received += conn.recv(1024)
+    with socket.create_connection(address) as conn:
+        conn.sendall(BINARY_MAGIC + encode_batch(["3;0;1;28;0;7;5;0;"] * 3))
+        assert len(conn.recv(1024)) == 5
+
+    metrics = server.metrics
+    # the answers are counted once written, wait for the handlers to end
+    with server.executor:
+        pass
+    assert metrics.connections.value == 2
+    assert metrics.queries.value == 5
+    assert metrics.found.value == 4
+    assert metrics.batches.value == 1
+    assert metrics.bytes_out.value == len(received) + 5
+    assert metrics.query_latency.count == 5
+    assert metrics.search_duration.count == 3
+    assert metrics.metrics["search_reload_duration_seconds"].count == 1
+    exposition = metrics.exposition()
+    assert "search_queries_total 5\n" in exposition
+    assert "search_open_connections 0\n" in exposition
+    assert "search_log_dropped_records 0\n" in exposition
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+This module contains tests for the pre-fork supervisor, run as a separate
+server process with two workers.
+"""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import pytest
+from pathlib import Path
+
+# Define the base directory for new processes
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="reads /proc for workers"
+)
+
+
+def free_port():
+    """Find a port nothing listens on."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def query(port, req):
+    """Send a single query and return the response."""
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as conn:
+        conn.sendall(req)
+        return conn.recv(1024)
+
+
+def workers(pid):
+    """List the worker processes of the supervisor."""
+    with open(f"/proc/{pid}/task/{pid}/children") as children:
+        return [int(child) for child in children.read().split()]
+
+
+def wait_for(check, timeout=10.0):
+    """Poll a check until it passes or the timeout expires."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return True
+        except OSError:
+            pass
+        time.sleep(0.1)
+    return False
+
+
+@pytest.fixture
+def supervisor(tmp_path):
+    """Fixture for a supervisor serving a small file from two workers."""
+    search_file = tmp_path / "search.txt"
+    search_file.write_text("3;0;1;28;0;7;5;0;\napple\n")
+    port = free_port()
+    env = dict(
+        os.environ,
+        SSL="False",
+        PORT=str(port),
+        WORKERS="2",
+        LINUXPATH=str(search_file),
+        REREAD_ON_QUERY="False",
+        DEBUG=str(tmp_path / "debug.log"),
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "server.server_script"],
+        cwd=BASE_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    assert wait_for(lambda: len(workers(process.pid)) == 2)
+    assert wait_for(lambda: query(port, b"apple") == b"STRING EXISTS\n")
+    yield process, port
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=15)
+
+
+def test_prefork_queries(supervisor):
+    """Test that the workers answer queries on the same port."""
+    process, port = supervisor
+    for _ in range(20):
+        assert query(port, b"3;0;1;28;0;7;5;0;") == b"STRING EXISTS\n"
+        assert query(port, b"not;exist;") == b"STRING NOT FOUND\n"
+
+
+def test_prefork_restart_and_shutdown(supervisor):
+    """Test that a dead worker is replaced and SIGTERM stops everything."""
+    process, port = supervisor
+    first, second = workers(process.pid)
+    os.kill(first, signal.SIGKILL)
+    assert wait_for(
+        lambda: len(workers(process.pid)) == 2
+        and first not in workers(process.pid)
+    )
+    assert query(port, b"apple") == b"STRING EXISTS\n"
+
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(timeout=15) == 0
+    assert not wait_for(lambda: query(port, b"apple"), timeout=0.5)
+
+
+def test_prefork_workers_follow_supervisor(supervisor):
+    """Test that the workers exit when the supervisor is killed."""
+    process, port = supervisor
+    pids = workers(process.pid)
+    process.kill()
+    process.wait()
+    assert wait_for(
+        lambda: not any(os.path.exists(f"/proc/{pid}") for pid in pids)
+    )
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+This module contains tests for the on demand profiler, its sessions, the
+signals and the admin commands starting and stopping them.
+"""
+import os
+import pstats
+import signal
+import socket
+import threading
+import time
+import urllib.request
+from server.profiling import Profiler
+from server.profiling import profile_on_signal
+from server.server import Server
+from server.server import TCPHandler
+from server.setup import LoadEnv
+
+
+def spin(stop):
+    """Keep a thread busy until stopped."""
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_sampler(tmp_path):
+    """Test that the sampler writes the stacks of the other threads."""
+    profiler = Profiler(tmp_path, "sampler", interval=0.001)
+    assert profiler.stop() is None
+    stop = threading.Event()
+    thread = threading.Thread(target=spin, args=(stop,), name="spinner")
+    thread.start()
+    try:
+        assert profiler.start()
+        assert not profiler.start()
+        time.sleep(0.1)
+        path = profiler.stop()
+    finally:
+        stop.set()
+        thread.join()
+    assert not profiler.running
+    assert path.name.startswith(f"profile-{os.getpid()}-")
+    assert path.suffix == ".collapsed"
+    stacks = [line.rsplit(" ", 1) for line in path.read_text().splitlines()]
+    assert stacks and all(int(count) > 0 for _, count in stacks)
+    frame = f"spin ({__file__}:{spin.__code__.co_firstlineno})"
+    assert any(
+        stack.startswith("spinner;") and stack.endswith(frame)
+        for stack, _ in stacks
+    )
+
+
+def test_cprofile_threads(tmp_path):
+    """Test that a cProfile session covers the threads calling the hook."""
+    profiler = Profiler(tmp_path, "cprofile")
+    assert profiler.hook is None
+
+    profiled = threading.Event()
+    stopped = threading.Event()
+
+    def serve():
+        """call the hook before every "read" as the handlers do"""
+        for _ in range(3):
+            if profiler.hook is not None:
+                profiler.hook()
+            sum(range(100))
+        profiled.set()
+        stopped.wait()
+        # the thread disables its session on its next read
+        profiler.hook()
+
+    assert profiler.start()
+    thread = threading.Thread(target=serve)
+    thread.start()
+    profiled.wait()
+    path = profiler.stop()
+    assert profiler.hook is not None
+    stopped.set()
+    thread.join()
+    assert profiler.hook is None
+    assert path.suffix == ".pstats"
+    functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+    assert "<built-in method builtins.sum>" in functions
+
+    # the session of a thread that exited is dropped on stop
+    assert profiler.start()
+    thread = threading.Thread(target=profiler.hook)
+    thread.start()
+    thread.join()
+    profiler.stop()
+    assert profiler.hook is None
+
+
+def test_profile_on_signal(tmp_path):
+    """Test that SIGUSR1 starts a session and SIGUSR2 writes it."""
+    profiler = Profiler(tmp_path, "sampler", interval=0.001)
+    handlers = (
+        signal.getsignal(signal.SIGUSR1),
+        signal.getsignal(signal.SIGUSR2),
+    )
+    profile_on_signal(profiler)
+    try:
+        os.kill(os.getpid(), signal.SIGUSR1)
+        deadline = time.monotonic() + 5
+        while not profiler.running and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert profiler.running
+        os.kill(os.getpid(), signal.SIGUSR2)
+        while profiler.running and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not profiler.running
+        while not list(tmp_path.glob("*.collapsed")):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        signal.signal(signal.SIGUSR1, handlers[0])
+        signal.signal(signal.SIGUSR2, handlers[1])
+
+
+def test_server_profile_commands(tmp_path):
+    """Test the admin commands profiling the threads of a server."""
+    search_file = tmp_path / "search.txt"
+    search_file.write_text("3;0;1;28;0;7;5;0;\n")
+    with socket.socket() as free:
+        free.bind(("127.0.0.1", 0))
+        metrics_port = free.getsockname()[1]
+    env_vars = LoadEnv(
+        HOST="127.0.0.1",
+        PORT=9000,
+        TEST_PORT=9001,
+        LINUXPATH=search_file,
+        SSL=False,
+        REREAD_ON_QUERY=False,
+        ALGORITHM="bisect",
+        METRICS_PORT=metrics_port,
+        PROFILE_DIR=tmp_path / "profiles",
+        PROFILE_MODE="cprofile",
+        DEBUG=str(tmp_path / "debug.log"),
+    )
+    server = Server(("127.0.0.1", 0), TCPHandler, env_vars)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{metrics_port}/profile"
+
+    def command(name):
+        """POST an admin command and return its answer"""
+        request = urllib.request.Request(f"{url}/{name}", method="POST")
+        with urllib.request.urlopen(request) as response:
+            return response.read().decode()
+
+    try:
+        assert command("stop") == "profiler not running\n"
+        assert command("start") == "profiler started (cprofile)\n"
+        assert command("start") == "profiler already running\n"
+        address = ("127.0.0.1", server.server_address[1])
+        with socket.create_connection(address) as conn:
+            conn.sendall(b"3;0;1;28;0;7;5;0;\n")
+            assert conn.recv(1024) == b"STRING EXISTS\n"
+        answer = command("stop")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert answer.startswith("profile written to ")
+    path = answer[len("profile written to ") : -1]
+    functions = {name for _, _, name in pstats.Stats(path).stats}
+    assert "search" in functions
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+This module contains tests for the framing of the query protocol.
+"""
+import pytest
+from server.protocol import BatchFramer
+from server.protocol import bitmap_size
+from server.protocol import decode_bitmap
+from server.protocol import encode_batch
+from server.protocol import encode_bitmap
+from server.protocol import QueryFramer
+
+
+def test_lines_are_split():
+    """Test that every complete line is a query, in order."""
+    framer = QueryFramer()
+    assert framer.feed(b"apple\nbanana\r\n\ncherry\x00\n") == [
+        b"apple",
+        b"banana",
+        b"",
+        b"cherry",
+    ]
+    assert framer.legacy is False
+
+
+def test_partial_lines_are_buffered():
+    """Test that a line split over several reads is a single query."""
+    framer = QueryFramer()
+    assert framer.feed(b"apple\nban") == [b"apple"]
+    assert framer.feed(b"an") == []
+    assert framer.feed(b"a\ncher") == [b"banana"]
+    assert framer.feed(b"ry\n") == [b"cherry"]
+
+
+def test_legacy_packets():
+    """Test that a client sending no newline gets every packet answered."""
+    framer = QueryFramer()
+    assert framer.feed(b"3;0;1;28;0;7;5;0;") == [b"3;0;1;28;0;7;5;0;"]
+    assert framer.feed(b"not;exist;\x00") == [b"not;exist;"]
+    assert framer.feed(b"two\nlines\n") == [b"two\nlines"]
+    assert framer.legacy is True
+
+
+def test_split_first_query():
+    """Test that a deferred first query split over several reads is a single
+    one."""
+    framer = QueryFramer(defer_legacy=True)
+    assert framer.feed(b"3;0;1;") == []
+    assert framer.undecided
+    assert framer.feed(b"28;0;7;5;0;\napple\n") == [
+        b"3;0;1;28;0;7;5;0;",
+        b"apple",
+    ]
+    assert not framer.undecided
+    assert framer.legacy is False
+    assert framer.feed(b"ban") == []
+    assert not framer.undecided
+
+
+def test_deferred_legacy_packets():
+    """Test that a deferred first query is answered once it expired, every
+    packet then being a query."""
+    framer = QueryFramer(defer_legacy=True)
+    assert framer.feed(b"3;0;1;") == []
+    assert framer.feed(b"28;0;7;5;0;") == []
+    assert framer.undecided
+    assert framer.expire() == [b"3;0;1;28;0;7;5;0;"]
+    assert not framer.undecided
+    assert framer.feed(b"not;exist;\x00") == [b"not;exist;"]
+    assert framer.feed(b"two\nlines\n") == [b"two\nlines"]
+    assert framer.legacy is True
+
+
+def test_overlong_query():
+    """Test that a query longer than the limit is rejected."""
+    framer = QueryFramer(max_query_size=8)
+    assert framer.feed(b"short\n12345678") == [b"short"]
+    with pytest.raises(ValueError):
+        framer.feed(b"9")
+
+
+def test_batches_are_split():
+    """Test that frames are parsed whatever the size of the reads."""
+    frames = (
+        encode_batch(["apple", "b\u00e4nana", ""])
+        + encode_batch([])
+        + encode_batch(["x" * 300])
+    )
+    for chunk_size in (1, 3, 7, len(frames)):
+        framer = BatchFramer()
+        batches = []
+        for pos in range(0, len(frames), chunk_size):
+            batches += framer.feed(frames[pos : pos + chunk_size])
+        assert batches == [
+            ["apple\n", "b\u00e4nana\n", "\n"],
+            [],
+            ["x" * 300 + "\n"],
+        ]
+
+
+def test_oversized_batch():
+    """Test that a frame with too many keys is rejected."""
+    framer = BatchFramer(max_batch_size=2)
+    assert framer.feed(encode_batch(["a", "b"])) == [["a\n", "b\n"]]
+    with pytest.raises(ValueError):
+        framer.feed(encode_batch(["a", "b", "c"]))
+
+
+def test_overlarge_batch():
+    """Test that a frame with too many bytes of keys is rejected."""
+    framer = BatchFramer(max_frame_bytes=12)
+    assert framer.feed(encode_batch(["ab", "cd"])) == [["ab\n", "cd\n"]]
+    assert framer.feed(encode_batch(["abcd", "ef"])) == [["abcd\n", "ef\n"]]
+    # rejected from the length of the key exceeding the limit
+    frame = encode_batch(["abcd", "efghi"])
+    assert framer.feed(frame[:10]) == []
+    with pytest.raises(ValueError):
+        framer.feed(frame[10:12])
+
+
+@pytest.mark.parametrize("count", [0, 1, 7, 8, 9, 1001])
+def test_bitmap_round_trip(count):
+    """Test that the flags of a batch survive their encoding."""
+    found = [i % 3 == 0 for i in range(count)]
+    frame = encode_bitmap(found)
+    assert len(frame) == bitmap_size(count)
+    assert decode_bitmap(frame) == found
+
+
+def test_bitmap_layout():
+    """Test that the first key is the lowest bit of the first byte."""
+    assert encode_bitmap([True, False, True]) == b"\x00\x00\x00\x03\x05"
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import pytest
 from server.search_algorithms import *
+from server.storage import SortedBlob
 
 
 @pytest.fixture
@@ -256,3 +257,105 @@ def test_python_linear_search_type_error(sorted_list):
         python_linear_search(123, "cherry")
     with pytest.raises(SearchAlgorithmError):
         python_linear_search(sorted_list, 123)
+
+
+def test_hash_search_found(sorted_list):
+    """Test hash_search when the element is found."""
+    assert hash_search(frozenset(sorted_list), "banana")
+
+
+def test_hash_search_not_found(sorted_list):
+    """Test hash_search when the element is not found."""
+    assert not hash_search(frozenset(sorted_list), "kiwi")
+
+
+def test_hash_search_unsorted(unsorted_list):
+    """Test hash_search on data that was never sorted."""
+    assert hash_search(frozenset(unsorted_list), "apple")
+    assert hash_search(frozenset(unsorted_list), "cherry")
+
+
+def test_hash_search_empty(empty_list):
+    """Test hash_search with an empty set."""
+    assert not hash_search(frozenset(empty_list), "cherry")
+
+
+def test_hash_search_duplicates(duplicate_element_list):
+    """Test hash_search with a list containing duplicates."""
+    assert hash_search(frozenset(duplicate_element_list), "banana")
+    assert hash_search(frozenset(duplicate_element_list), "date")
+
+
+def test_hash_search_type_error(sorted_list):
+    """Test hash_search with incorrect argument types."""
+    with pytest.raises(SearchAlgorithmError):
+        hash_search(sorted_list, "cherry")
+    with pytest.raises(SearchAlgorithmError):
+        hash_search(frozenset(sorted_list), 123)
+
+
+sequence_algorithms = [
+    bisect_search,
+    jump_search,
+    binary_search_recurse,
+    binary_search_iter,
+    python_linear_search,
+]
+
+
+@pytest.mark.parametrize("search_algo", sequence_algorithms)
+def test_search_sequences(sorted_list, search_algo):
+    """Test the sorted algorithms on sequences other than a list."""
+    blob = SortedBlob.from_lines(
+        [f"{line}\n".encode() for line in sorted_list]
+    )
+    for line in sorted_list:
+        assert search_algo(tuple(sorted_list), line)
+        assert search_algo(blob, f"{line}\n")
+    assert not search_algo(tuple(sorted_list), "kiwi")
+    assert not search_algo(blob, "kiwi\n")
+
+
+@pytest.mark.parametrize("search_algo", sequence_algorithms)
+def test_search_string_rejected(search_algo):
+    """Test that a string is not searched as a sequence of characters."""
+    with pytest.raises(SearchAlgorithmError):
+        search_algo("apple", "a")
+    with pytest.raises(SearchAlgorithmError):
+        search_algo(b"apple", "a")
+
+
+@pytest.mark.parametrize("search_algo", sequence_algorithms)
+def test_search_exhaustive(search_algo):
+    """Test every sorted algorithm against membership on many sizes."""
+    for size in range(0, 40):
+        sorted_arr = [f"{idx:03}" for idx in range(0, 2 * size, 2)]
+        for idx in range(-1, 2 * size + 1):
+            query = f"{idx:03}"
+            assert search_algo(sorted_arr, query) == (query in sorted_arr)
+
+
+def test_binary_search_recurse_bounds(sorted_list):
+    """Test binary_search_recurse on a range of the array."""
+    assert binary_search_recurse(sorted_list, "cherry", 2, 4)
+    assert not binary_search_recurse(sorted_list, "apple", 2, 4)
+    assert not binary_search_recurse(sorted_list, "fig", 2, 4)
+
+
+def test_algorithm_registry():
+    """Test the algorithms registered by name."""
+    assert algorithm_names() == [
+        "jump",
+        "recursive",
+        "iterative",
+        "bisect",
+        "linear",
+        "hash",
+    ]
+    assert get_algorithm("bisect").search is bisect_search
+    assert get_algorithm("bisect").index_builder is sorted
+    assert get_algorithm("hash").index_builder is frozenset
+    with pytest.raises(ValueError):
+        get_algorithm("quantum")
+    with pytest.raises(ValueError):
+        register_algorithm("bisect", bisect_search)
@@ -3,8 +3,18 @@
 This module contains tests for verifying the functionality of a TCP server
 with both secure (SSL) and unsecure connections.
 """
+import pytest
 import ssl
+import threading
+import time
 from . import env_vars
+from server.protocol import BINARY_MAGIC
+from server.protocol import bitmap_size
+from server.protocol import decode_bitmap
+from server.protocol import encode_batch
+from server.server import Server
+from server.server import TCPHandler
+from server.setup import LoadEnv
 from socket import create_connection
 
 
@@ -44,3 +54,264 @@ def test_client_unsecure_not_found(unprotected_server):
         conn.sendall(b"not;exist;")
         response = conn.recv(1024).decode()
         assert response == "STRING NOT FOUND\n"
+
+
+def make_tls_server(tmp_path):
+    """Build a secured threaded server on an ephemeral port."""
+    search_file = tmp_path / "search.txt"
+    search_file.write_text("3;0;1;28;0;7;5;0;\n")
+    env = LoadEnv(
+        HOST="127.0.0.1",
+        PORT=9000,
+        TEST_PORT=9001,
+        LINUXPATH=search_file,
+        SSL=True,
+        CERTFILE="cert.pem",
+        KEYFILE="key.pem",
+        HANDSHAKE_TIMEOUT=0.5,
+        REREAD_ON_QUERY=False,
+        ALGORITHM="bisect",
+        DEBUG=str(tmp_path / "debug.log"),
+    )
+    return Server(("127.0.0.1", 0), TCPHandler, env)
+
+
+def test_stalled_handshake_does_not_block_accept(tmp_path):
+    """A client that never sends its TLS hello must not delay other clients
+    and is dropped once the handshake timeout has passed."""
+    server = make_tls_server(tmp_path)
+    port = server.server_address[1]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        # the certificate is not under test here, only the handshake path
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        with create_connection(("127.0.0.1", port)) as stalled:
+            start = time.monotonic()
+            with create_connection(("127.0.0.1", port)) as conn:
+                with context.wrap_socket(conn) as ssl_conn:
+                    ssl_conn.sendall(b"3;0;1;28;0;7;5;0;")
+                    assert ssl_conn.recv(1024) == b"STRING EXISTS\n"
+            assert time.monotonic() - start < 0.5
+
+            # the stalled connection is closed by the server
+            stalled.settimeout(5)
+            assert stalled.recv(1024) == b""
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_pipelined_queries(tmp_path):
+    """Test that queries sent back to back are answered in order, and that
+    a query split over several packets is answered once complete."""
+    search_file = tmp_path / "search.txt"
+    search_file.write_text("3;0;1;28;0;7;5;0;\napple\n")
+    env = LoadEnv(
+        HOST="127.0.0.1",
+        PORT=9000,
+        TEST_PORT=9001,
+        LINUXPATH=search_file,
+        SSL=False,
+        REREAD_ON_QUERY=False,
+        ALGORITHM="bisect",
+        DEBUG=str(tmp_path / "debug.log"),
+    )
+    server = Server(("127.0.0.1", 0), TCPHandler, env)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        queries = [b"apple", b"not;exist;", b"3;0;1;28;0;7;5;0;"] * 100
+        expected = b"".join(
+            b"STRING NOT FOUND\n" if q == b"not;exist;" else b"STRING EXISTS\n"
+            for q in queries
+        )
+        with create_connection(server.server_address) as conn:
+            conn.sendall(b"\n".join(queries) + b"\n")
+            conn.sendall(b"app")
+            time.sleep(0.05)
+            conn.sendall(b"le\n")
+            expected += b"STRING EXISTS\n"
+            response = b""
+            while len(response) < len(expected):
+                response += conn.recv(65536)
+        assert response == expected
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize("storage", ["memory", "numpy"])
+def test_binary_batches(tmp_path, storage):
+    """Test that batches sent over the binary protocol are answered with a
+    bitmap of the keys found."""
+    if storage == "numpy":
+        pytest.importorskip("numpy")
+    search_file = tmp_path / "search.txt"
+    search_file.write_text("".join(f"{i};0;\n" for i in range(0, 20000, 2)))
+    env = LoadEnv(
+        HOST="127.0.0.1",
+        PORT=9000,
+        TEST_PORT=9001,
+        LINUXPATH=search_file,
+        SSL=False,
+        REREAD_ON_QUERY=False,
+        ALGORITHM="bisect",
+        STORAGE=storage,
+        DEBUG=str(tmp_path / "debug.log"),
+    )
+    server = Server(("127.0.0.1", 0), TCPHandler, env)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        batches = [[f"{i};0;" for i in range(20000)], ["0;0;", "1;0;"]]
+        with create_connection(server.server_address) as conn:
+            conn.sendall(
+                BINARY_MAGIC + b"".join(encode_batch(keys) for keys in batches)
+            )
+            expected = sum(bitmap_size(len(keys)) for keys in batches)
+            response = b""
+            while len(response) < expected:
+                response += conn.recv(65536)
+        split = bitmap_size(len(batches[0]))
+        assert decode_bitmap(response[:split]) == [
+            i % 2 == 0 for i in range(20000)
+        ]
+        assert decode_bitmap(response[split:]) == [True, False]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def start_server(tmp_path, **settings):
+    """Start an unsecured threaded server on an ephemeral port."""
+    search_file = tmp_path / "search.txt"
+    search_file.write_text("3;0;1;28;0;7;5;0;\napple\n")
+    env = LoadEnv(
+        HOST="127.0.0.1",
+        PORT=9000,
+        TEST_PORT=9001,
+        LINUXPATH=search_file,
+        SSL=False,
+        REREAD_ON_QUERY=False,
+        ALGORITHM="bisect",
+        DEBUG=str(tmp_path / "debug.log"),
+        **settings,
+    )
+    server = Server(("127.0.0.1", 0), TCPHandler, env)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stop_server(server):
+    """Stop a server started by start_server."""
+    server.shutdown()
+    server.server_close()
+
+
+def test_connection_cap(tmp_path):
+    """Test that connections beyond the pool wait for a thread and those
+    beyond the cap are turned away."""
+    server = start_server(tmp_path, MAX_THREADS=1, MAX_CONNECTIONS=2)
+    assert server.request_queue_size == 128
+    try:
+        served = create_connection(server.server_address)
+        served.sendall(b"apple\n")
+        assert served.recv(1024) == b"STRING EXISTS\n"
+
+        # waits for the thread held by the first connection
+        waiting = create_connection(server.server_address)
+        waiting.sendall(b"apple\n")
+        with create_connection(server.server_address) as rejected:
+            rejected.settimeout(5)
+            assert rejected.recv(1024) == b"SERVER BUSY\n"
+            assert rejected.recv(1024) == b""
+
+        served.close()
+        waiting.settimeout(5)
+        assert waiting.recv(1024) == b"STRING EXISTS\n"
+        waiting.close()
+    finally:
+        stop_server(server)
+
+
+def test_queue_timeout(tmp_path):
+    """Test that a connection left waiting for a thread longer than the read
+    timeout is turned away."""
+    server = start_server(
+        tmp_path, MAX_THREADS=1, IDLE_TIMEOUT=60, READ_TIMEOUT=0.3
+    )
+    try:
+        served = create_connection(server.server_address)
+        served.sendall(b"apple\n")
+        assert served.recv(1024) == b"STRING EXISTS\n"
+
+        with create_connection(server.server_address) as waiting:
+            waiting.sendall(b"apple\n")
+            time.sleep(0.5)
+            served.close()
+            waiting.settimeout(5)
+            assert waiting.recv(1024) == b"SERVER BUSY\n"
+            assert waiting.recv(1024) == b""
+        assert server.metrics.rejected.value == 1
+    finally:
+        stop_server(server)
+
+
+def test_legacy_timeout(tmp_path):
+    """Test that a client of the first version is answered once its first
+    query expired, and every packet it sends afterwards."""
+    server = start_server(tmp_path, LEGACY_TIMEOUT=0.05)
+    try:
+        with create_connection(server.server_address) as conn:
+            conn.settimeout(5)
+            conn.sendall(b"3;0;1;")
+            assert conn.recv(1024) == b"STRING NOT FOUND\n"
+            conn.sendall(b"apple")
+            assert conn.recv(1024) == b"STRING EXISTS\n"
+    finally:
+        stop_server(server)
+
+
+def test_idle_timeout(tmp_path):
+    """Test that a connection idle for too long is closed."""
+    server = start_server(tmp_path, IDLE_TIMEOUT=0.3)
+    try:
+        with create_connection(server.server_address) as conn:
+            conn.sendall(b"apple\n")
+            assert conn.recv(1024) == b"STRING EXISTS\n"
+            conn.settimeout(5)
+            start = time.monotonic()
+            assert conn.recv(1024) == b""
+            assert 0.2 < time.monotonic() - start < 4
+    finally:
+        stop_server(server)
+
+
+def test_read_timeout(tmp_path):
+    """Test that a query left unfinished is given the read timeout only."""
+    server = start_server(tmp_path, IDLE_TIMEOUT=60, READ_TIMEOUT=0.3)
+    try:
+        with create_connection(server.server_address) as conn:
+            conn.sendall(b"apple\napp")
+            assert conn.recv(1024) == b"STRING EXISTS\n"
+            conn.settimeout(5)
+            assert conn.recv(1024) == b""
+    finally:
+        stop_server(server)
+
+
+def test_close_ends_open_connections(tmp_path):
+    """Test that closing the server does not wait for idle clients."""
+    server = start_server(tmp_path, IDLE_TIMEOUT=60)
+    with create_connection(server.server_address) as conn:
+        conn.sendall(b"apple\n")
+        assert conn.recv(1024) == b"STRING EXISTS\n"
+        start = time.monotonic()
+        stop_server(server)
+        conn.settimeout(5)
+        assert conn.recv(1024) == b""
+        assert time.monotonic() - start < 4
+        assert server.open_connections == 0
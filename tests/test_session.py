@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+This module contains tests for the request processing shared by the server
+engines, driven through in memory read and write steps.
+"""
+import asyncio
+import pytest
+from server.async_server import AsyncServer
+from server.protocol import BINARY_MAGIC
+from server.protocol import decode_bitmap
+from server.protocol import encode_batch
+from server.protocol import FOUND
+from server.protocol import NOT_FOUND
+from server.session import call
+from server.session import Received
+from server.session import run_sync
+from server.session import Session
+from server.setup import LoadEnv
+
+
+@pytest.fixture
+def service(tmp_path):
+    """Fixture for a service holding a small database."""
+    search_file = tmp_path / "search.txt"
+    search_file.write_text("3;0;1;28;0;7;5;0;\napple\nbanana\n")
+    env_vars = LoadEnv(
+        HOST="127.0.0.1",
+        PORT=9000,
+        TEST_PORT=9001,
+        LINUXPATH=search_file,
+        SSL=False,
+        ALGORITHM="bisect",
+        DEBUG=str(tmp_path / "debug.log"),
+    )
+    service = AsyncServer(("127.0.0.1", 0), env_vars)
+    service.open_database()
+    yield service
+    service.close_database()
+
+
+def serve(service, *reads):
+    """Run a session over the given reads and collect what it writes."""
+    pending = [Received(data, 0, 0) for data in reads]
+    written = []
+
+    async def read(partial, timeout):
+        return pending.pop(0)
+
+    async def write(data):
+        written.append(data)
+
+    run_sync(Session(service, ("127.0.0.1", 5000), read, write, call).serve())
+    return written, pending
+
+
+def test_run_sync():
+    """Test that a coroutine which does not suspend is run to its end."""
+    assert run_sync(call(lambda: 3)) == 3
+    with pytest.raises(RuntimeError):
+        run_sync(asyncio.sleep(0))
+
+
+def test_session_queries(service):
+    """Test that queries split over reads are answered in order."""
+    written, pending = serve(service, b"apple\nki", b"wi\nbanana\n", b"")
+    assert written == [FOUND, NOT_FOUND + FOUND]
+    assert pending == []
+    assert service.metrics.queries.value == 3
+    assert service.metrics.bytes_in.value == 18
+
+
+def test_session_faulty_query(service):
+    """Test that the queries preceding a faulty one are answered, and that
+    the session then stops reading."""
+    written, pending = serve(service, b"apple\n\xff\n", b"banana\n")
+    assert written == [FOUND]
+    assert len(pending) == 1
+
+
+def test_session_batches(service):
+    """Test that a batch split over reads is answered once complete."""
+    frame = encode_batch(["apple", "kiwi", "banana"])
+    written, _ = serve(service, BINARY_MAGIC + frame[:6], frame[6:], b"")
+    (answer,) = written
+    assert decode_bitmap(answer) == [True, False, True]
+    assert service.metrics.batches.value == 1
@@ -17,6 +17,15 @@ def clear_env_vars():
         "REREAD_ON_QUERY",
         "CERTFILE",
         "KEYFILE",
+        "ALGORITHM",
+        "STORAGE",
+        "INDEX_CACHE",
+        "CACHE_POLICY",
+        "TLS_ECDH_CURVE",
+        "TLS_CIPHERS",
+        "LOG_LEVEL",
+        "WORKERS",
+        "METRICS_PORT",
         "DEBUG",
     ]
     for var in env_vars:
@@ -307,3 +316,142 @@ def test_invalid_path_type_for_linuxpath():
     set_env_vars(env_vars)
     with pytest.raises(ValidationError):
         LoadEnv()
+
+
+def test_index_cache_requires_compact_storage():
+    """Test that INDEX_CACHE is rejected with a storage it can not persist."""
+    env_vars = {
+        "HOST": "127.0.0.1",
+        "PORT": "8000",
+        "LINUXPATH": "200k.txt",
+        "SSL": "False",
+        "STORAGE": "memory",
+        "INDEX_CACHE": "True",
+        "DEBUG": "debug.log",
+    }
+    set_env_vars(env_vars)
+    with pytest.raises(ValidationError):
+        LoadEnv()
+
+    env_vars["STORAGE"] = "compact"
+    set_env_vars(env_vars)
+    assert LoadEnv().INDEX_CACHE is True
+
+
+def test_numpy_storage():
+    """Test that the numpy storage is accepted when numpy is installed."""
+    pytest.importorskip("numpy")
+    env_vars = {
+        "HOST": "127.0.0.1",
+        "PORT": "8000",
+        "LINUXPATH": "200k.txt",
+        "SSL": "False",
+        "STORAGE": "numpy",
+        "DEBUG": "debug.log",
+    }
+    set_env_vars(env_vars)
+    assert LoadEnv().STORAGE == "numpy"
+
+
+def test_cache_policy():
+    """Test that only the defined cache policies are accepted."""
+    env_vars = {
+        "HOST": "127.0.0.1",
+        "PORT": "8000",
+        "LINUXPATH": "200k.txt",
+        "SSL": "False",
+        "CACHE_POLICY": "lfu",
+        "DEBUG": "debug.log",
+    }
+    set_env_vars(env_vars)
+    with pytest.raises(ValidationError):
+        LoadEnv()
+
+    env_vars["CACHE_POLICY"] = "tinylfu"
+    set_env_vars(env_vars)
+    assert LoadEnv().CACHE_POLICY == "tinylfu"
+
+
+def test_auto_algorithm():
+    """Test that the auto algorithm is accepted."""
+    env_vars = {
+        "HOST": "127.0.0.1",
+        "PORT": "8000",
+        "LINUXPATH": "200k.txt",
+        "SSL": "False",
+        "ALGORITHM": "auto",
+        "DEBUG": "debug.log",
+    }
+    set_env_vars(env_vars)
+    assert LoadEnv().ALGORITHM == "auto"
+
+
+def test_tls_settings():
+    """Test that unknown curves and cipher lists are rejected."""
+    env_vars = {
+        "HOST": "127.0.0.1",
+        "PORT": "8000",
+        "LINUXPATH": "200k.txt",
+        "SSL": "False",
+        "TLS_ECDH_CURVE": "nocurve",
+        "DEBUG": "debug.log",
+    }
+    set_env_vars(env_vars)
+    with pytest.raises(ValidationError):
+        LoadEnv()
+
+    env_vars["TLS_ECDH_CURVE"] = "X25519"
+    env_vars["TLS_CIPHERS"] = "NOCIPHER"
+    set_env_vars(env_vars)
+    with pytest.raises(ValidationError):
+        LoadEnv()
+
+    env_vars["TLS_CIPHERS"] = "ECDHE+AESGCM"
+    set_env_vars(env_vars)
+    env = LoadEnv()
+    assert env.TLS_ECDH_CURVE == "X25519"
+    assert env.TLS_CIPHERS == "ECDHE+AESGCM"
+
+
+def test_log_level():
+    """Test that only the defined log levels are accepted."""
+    env_vars = {
+        "HOST": "127.0.0.1",
+        "PORT": "8000",
+        "LINUXPATH": "200k.txt",
+        "SSL": "False",
+        "LOG_LEVEL": "verbose",
+        "DEBUG": "debug.log",
+    }
+    set_env_vars(env_vars)
+    with pytest.raises(ValidationError):
+        LoadEnv()
+
+    env_vars["LOG_LEVEL"] = "info"
+    set_env_vars(env_vars)
+    assert LoadEnv().LOG_LEVEL == "INFO"
+
+
+def test_metrics_port():
+    """Test that every worker is left a valid metrics port."""
+    env_vars = {
+        "HOST": "127.0.0.1",
+        "PORT": "65535",
+        "LINUXPATH": "200k.txt",
+        "SSL": "False",
+        "METRICS_PORT": "65535",
+        "DEBUG": "debug.log",
+    }
+    set_env_vars(env_vars)
+    env = LoadEnv()
+    assert env.PORT == 65535
+    assert env.METRICS_PORT == 65535
+
+    env_vars["WORKERS"] = "2"
+    set_env_vars(env_vars)
+    with pytest.raises(ValidationError):
+        LoadEnv()
+
+    env_vars["METRICS_PORT"] = "65534"
+    set_env_vars(env_vars)
+    assert LoadEnv().METRICS_PORT == 65534
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+import sys
+import pytest
+from server.storage import *
+
+
+@pytest.fixture
+def unsorted_file(tmp_path):
+    """Fixture for an unsorted search file without a trailing newline."""
+    data = ["grape\n", "apple\n", "fig\n", "cherry\n", "banana\n", "date"]
+    file_path = tmp_path / "unsorted.txt"
+    file_path.write_text("".join(data))
+    return file_path
+
+
+@pytest.fixture
+def large_file(tmp_path):
+    """Fixture for a search file spanning many blocks."""
+    file_path = tmp_path / "large.txt"
+    lines = [f"{i};0;{i % 7};28;0;7;5;0;\n" for i in range(5000)]
+    file_path.write_text("".join(reversed(lines)))
+    return file_path
+
+
+def test_read_sorted_lines(unsorted_file):
+    """Test that lines are sorted and all end with a newline."""
+    lines = read_sorted_lines(unsorted_file)
+    assert lines == sorted(lines)
+    assert all(line.endswith(b"\n") for line in lines)
+    assert b"date\n" in lines
+
+
+def test_build_sorted_copy(unsorted_file):
+    """Test that the sorted copy is written once and rebuilt on change."""
+    os.utime(unsorted_file, ns=(0, 0))
+    copy_path = build_sorted_copy(unsorted_file)
+    assert copy_path == sorted_copy_path(unsorted_file)
+    assert copy_path.read_bytes().startswith(b"apple\nbanana\n")
+
+    # an up to date copy is not rewritten
+    mtime_ns = copy_path.stat().st_mtime_ns
+    assert build_sorted_copy(unsorted_file) == copy_path
+    assert copy_path.stat().st_mtime_ns == mtime_ns
+
+    # a copy of another version of the search file is rebuilt
+    unsorted_file.write_text("kiwi\n")
+    build_sorted_copy(unsorted_file)
+    assert copy_path.read_bytes() == b"kiwi\n"
+
+
+def test_build_sorted_copy_replaced_older(unsorted_file, tmp_path):
+    """Test that a search file replaced by one with an older modification
+    time, as rsync -t or mv do, is sorted again."""
+    copy_path = build_sorted_copy(unsorted_file)
+    replacement = tmp_path / "replacement.txt"
+    replacement.write_text("lemon\nkiwi\n")
+    os.utime(replacement, ns=(0, 0))
+    os.replace(replacement, unsorted_file)
+    assert copy_path.stat().st_mtime_ns > unsorted_file.stat().st_mtime_ns
+    build_sorted_copy(unsorted_file)
+    assert copy_path.read_bytes() == b"kiwi\nlemon\n"
+
+
+def test_mmap_index_lookup(unsorted_file):
+    """Test lookups of existing and missing lines."""
+    index = MmapIndex(build_sorted_copy(unsorted_file), block_size=8)
+    for line in ["apple\n", "cherry\n", "date\n", "grape\n"]:
+        assert line in index
+    assert "kiwi\n" not in index
+    assert "aaa\n" not in index
+    assert "apple" not in index
+    assert "app\n" not in index
+    assert "apple\nbanana\n" not in index
+
+
+def test_mmap_index_many_blocks(large_file):
+    """Test that every line is found whatever block it falls in."""
+    index = MmapIndex(build_sorted_copy(large_file), block_size=64)
+    assert len(index) > 1
+    for i in range(5000):
+        assert f"{i};0;{i % 7};28;0;7;5;0;\n" in index
+    assert "5000;0;2;28;0;7;5;0;\n" not in index
+
+
+def test_mmap_index_empty_file(tmp_path):
+    """Test an index over an empty file."""
+    file_path = tmp_path / "empty.txt"
+    file_path.write_text("")
+    index = MmapIndex(build_sorted_copy(file_path))
+    assert len(index) == 0
+    assert "apple\n" not in index
+
+
+def test_sorted_blob_lookup(unsorted_file):
+    """Test lookups of existing and missing lines in a blob."""
+    blob = SortedBlob.from_file(unsorted_file)
+    for line in ["apple\n", "cherry\n", "date\n", "grape\n"]:
+        assert line in blob
+    assert "kiwi\n" not in blob
+    assert "aaa\n" not in blob
+    assert "apple" not in blob
+    assert 123 not in blob
+
+
+def test_sorted_blob_sequence(unsorted_file):
+    """Test that a blob behaves like a sorted list of lines."""
+    blob = SortedBlob.from_file(unsorted_file)
+    lines = ["apple\n", "banana\n", "cherry\n", "date\n", "fig\n", "grape\n"]
+    assert len(blob) == 6
+    assert list(blob) == lines
+    assert blob[0] == "apple\n"
+    assert blob[-1] == "grape\n"
+    assert blob[1:3] == ["banana\n", "cherry\n"]
+    with pytest.raises(IndexError):
+        blob[6]
+
+
+def test_sorted_blob_many_lines(large_file):
+    """Test that every line of a larger file is found."""
+    blob = SortedBlob.from_file(large_file)
+    for i in range(5000):
+        assert f"{i};0;{i % 7};28;0;7;5;0;\n" in blob
+    assert "5000;0;2;28;0;7;5;0;\n" not in blob
+
+
+def test_sorted_blob_empty_file(tmp_path):
+    """Test a blob built from an empty file."""
+    file_path = tmp_path / "empty.txt"
+    file_path.write_text("")
+    blob = SortedBlob.from_file(file_path)
+    assert len(blob) == 0
+    assert "apple\n" not in blob
+
+
+def test_sorted_blob_footprint(large_file):
+    """Test that a blob is smaller than a list of the same lines."""
+    blob = SortedBlob.from_file(large_file)
+    lines = large_file.read_text().splitlines(keepends=True)
+    list_size = sys.getsizeof(lines) + sum(map(sys.getsizeof, lines))
+    assert blob.nbytes * 2 < list_size
+
+
+def write_cache(file_path):
+    """Helper function writing the index cache of a search file."""
+    content = file_path.read_bytes()
+    digest = hashlib.blake2b(content, digest_size=16).digest()
+    cache_path = index_cache_path(file_path)
+    write_index_cache(cache_path, sort_lines(content), len(content), 0, digest)
+    return cache_path, len(content), digest
+
+
+def test_index_cache_round_trip(large_file):
+    """Test that a written index cache loads back into a mapped blob."""
+    cache_path, size, digest = write_cache(large_file)
+    blob = load_index_cache(cache_path, size, digest)
+    assert list(blob) == sorted(large_file.read_text().splitlines(True))
+    assert "42;0;0;28;0;7;5;0;\n" in blob
+    assert "5000;0;2;28;0;7;5;0;\n" not in blob
+
+
+def test_index_cache_stale(large_file):
+    """Test that a cache built from other content is rejected."""
+    cache_path, size, digest = write_cache(large_file)
+    with pytest.raises(IndexCacheError):
+        load_index_cache(cache_path, size, bytes(16))
+    with pytest.raises(IndexCacheError):
+        load_index_cache(cache_path, size + 1, digest)
+
+
+@pytest.mark.parametrize("position", [0, 10, -1])
+def test_index_cache_corrupt(large_file, position):
+    """Test that a flipped byte anywhere in the cache is detected."""
+    cache_path, size, digest = write_cache(large_file)
+    content = bytearray(cache_path.read_bytes())
+    content[position] ^= 0xFF
+    cache_path.write_bytes(bytes(content))
+    with pytest.raises(IndexCacheError):
+        load_index_cache(cache_path, size, digest)
+
+
+def test_index_cache_truncated(large_file):
+    """Test that a truncated cache is detected."""
+    cache_path, size, digest = write_cache(large_file)
+    cache_path.write_bytes(cache_path.read_bytes()[:-7])
+    with pytest.raises(IndexCacheError):
+        load_index_cache(cache_path, size, digest)
+    cache_path.write_bytes(b"SRV")
+    with pytest.raises(IndexCacheError):
+        load_index_cache(cache_path, size, digest)
+
+
+@pytest.mark.parametrize("corruption", ["magic", "source", "offsets", "tail"])
+def test_index_cache_rejected_unmapped(large_file, corruption):
+    """Test that a rejected cache leaves no mapping of it open."""
+    cache_path, size, digest = write_cache(large_file)
+    content = bytearray(cache_path.read_bytes())
+    if corruption == "magic":
+        content[0] ^= 0xFF
+    elif corruption == "offsets":
+        content = content[:-7]
+    elif corruption == "tail":
+        content[-1] ^= 0xFF
+    cache_path.write_bytes(bytes(content))
+    # the traceback keeps the frame of the loader, and its locals, alive
+    with pytest.raises(IndexCacheError) as error:
+        load_index_cache(
+            cache_path, size, bytes(16) if corruption == "source" else digest
+        )
+    with open("/proc/self/maps") as maps:
+        assert str(cache_path) not in maps.read()
+    assert error.traceback
+
+
+def test_index_cache_missing(tmp_path):
+    """Test that a missing cache is reported as a cache error."""
+    with pytest.raises(IndexCacheError):
+        load_index_cache(tmp_path / "missing.idx", 0, bytes(16))
+
+
+def test_scan_index_lookup(unsorted_file):
+    """Test lookups over the mapped search file, first and last included."""
+    index = ScanIndex(unsorted_file)
+    for line in ["grape\n", "apple\n", "cherry\n", "banana\n", "date\n"]:
+        assert line in index
+    assert "kiwi\n" not in index
+    assert "rape\n" not in index
+    assert "dat\n" not in index
+    assert "grape" not in index
+    assert "grape\napple\n" not in index
+    assert 123 not in index
+
+
+def test_scan_index_trailing_newline(tmp_path):
+    """Test lookups in a file ending with a newline."""
+    file_path = tmp_path / "search.txt"
+    file_path.write_text("apple\nbanana\n")
+    index = ScanIndex(file_path)
+    assert "apple\n" in index
+    assert "banana\n" in index
+    assert "\n" not in index
+
+
+def test_scan_index_truncated_file(large_file):
+    """Test that truncating the search file in place leaves the mapped copy
+    readable."""
+    index = ScanIndex(large_file)
+    with open(large_file, "r+b") as file_obj:
+        file_obj.truncate(0)
+    assert "0;0;0;28;0;7;5;0;\n" in index
+    assert "4999;0;1;28;0;7;5;0;\n" in index
+    assert list(large_file.parent.iterdir()) == [large_file]
+
+
+def test_scan_index_empty_file(tmp_path):
+    """Test an index over an empty file."""
+    file_path = tmp_path / "empty.txt"
+    file_path.write_text("")
+    index = ScanIndex(file_path)
+    assert "apple\n" not in index
+    assert index.nbytes == 0
+
+
+def test_iter_lines(unsorted_file):
+    """Test that every streamed line ends with a newline."""
+    lines = list(iter_lines(unsorted_file))
+    assert len(lines) == 6
+    assert lines[-1] == b"date\n"
+
+
+@pytest.mark.parametrize(
+    "line,packable",
+    [
+        (b"3;0;1;28;0;7;5;0;\n", True),
+        (b"3;0;1;28;0;7;5;0;", True),
+        (b"255;255;255;255;255;255;255;255;\n", True),
+        (b"256;0;1;28;0;7;5;0;\n", False),
+        (b"03;0;1;28;0;7;5;0;\n", False),
+        (b"3;0;1;28;0;7;5;0\n", False),
+        (b"3;0;1;28;0;7;5;\n", False),
+        (b"3;0;1;28;0;7;5;0;0;\n", False),
+        (b"-3;0;1;28;0;7;5;0;\n", False),
+        (b"apple\n", False),
+    ],
+)
+def test_pack_record(line, packable):
+    """Test which lines are packed into integer keys."""
+    assert (pack_record(line) is not None) == packable
+
+
+def test_pack_record_distinct():
+    """Test that different records get different keys."""
+    assert pack_record(b"1;2;3;4;5;6;7;8;") != pack_record(b"1;2;3;4;5;6;8;7;")
+    assert pack_record(b"0;0;0;0;0;0;0;1;") == 1
+
+
+def test_packed_index_lookup(large_file, tmp_path):
+    """Test lookups of packed records and of lines kept aside."""
+    file_path = tmp_path / "mixed.txt"
+    file_path.write_text(large_file.read_text() + "apple\n03;0;0;0;0;0;0;0;")
+    index = PackedIndex(file_path)
+    assert len(index) == 5002
+    assert "3;0;3;28;0;7;5;0;\n" in index
+    assert "apple\n" in index
+    assert "03;0;0;0;0;0;0;0;\n" in index
+    assert "3;0;0;0;0;0;0;0;\n" not in index
+    assert "4;0;3;28;0;7;5;0;\n" not in index
+    assert "3;0;3;28;0;7;5;0;" not in index
+    assert "kiwi\n" not in index
+
+
+def test_numpy_index_lookup(unsorted_file):
+    """Test single and batch lookups over the NumPy array of lines."""
+    pytest.importorskip("numpy")
+    index = NumpyIndex(unsorted_file)
+    assert len(index) == 6
+    assert "apple\n" in index
+    assert "date\n" in index
+    assert "kiwi\n" not in index
+    assert "date" not in index
+    queries = ["grape\n", "kiwi\n", "apple", "a\nb\n", "fig\x00\n", "zzz\n"]
+    assert index.search_many(queries).tolist() == [
+        True,
+        False,
+        False,
+        False,
+        False,
+        False,
+    ]
+    assert index.search_many([]).tolist() == []
+    assert index.search_many(["\u00e9\n", "fig\n"]).tolist() == [False, True]
+
+
+def test_numpy_index_empty(tmp_path):
+    """Test that an empty file never matches."""
+    pytest.importorskip("numpy")
+    file_path = tmp_path / "empty.txt"
+    file_path.write_text("")
+    index = NumpyIndex(file_path)
+    assert len(index) == 0
+    assert index.search_many(["\n", "apple\n"]).tolist() == [False, False]
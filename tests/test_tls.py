@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+This module contains tests for the TLS set up of the server and for the
+client resuming its sessions, run against an in process server.
+"""
+import pytest
+import threading
+from server.server import Server
+from server.server import TCPHandler
+from server.setup import LoadEnv
+from server.tls import create_ssl_context
+from server.tls import ResumingClient
+
+
+@pytest.fixture
+def tls_server(tmp_path):
+    """Fixture for a secured threaded server serving on an ephemeral port."""
+    search_file = tmp_path / "search.txt"
+    search_file.write_text("3;0;1;28;0;7;5;0;\n")
+    env_vars = LoadEnv(
+        HOST="127.0.0.1",
+        PORT=9000,
+        TEST_PORT=9001,
+        LINUXPATH=search_file,
+        SSL=True,
+        CERTFILE="cert.pem",
+        KEYFILE="key.pem",
+        TLS_ECDH_CURVE="X25519",
+        REREAD_ON_QUERY=False,
+        ALGORITHM="bisect",
+        DEBUG=str(tmp_path / "debug.log"),
+    )
+    server = Server(("127.0.0.1", 0), TCPHandler, env_vars)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(server):
+    """Build a client of a server, the test certificate is not verified."""
+    return ResumingClient(
+        ("127.0.0.1", server.server_address[1]), verify=False
+    )
+
+
+def test_client_resumes_session(tls_server):
+    """Test that every connection after the first one resumes the session."""
+    client = make_client(tls_server)
+    for _ in range(4):
+        assert client.query("3;0;1;28;0;7;5;0;") == "STRING EXISTS\n"
+        assert client.query("not;exist;") == "STRING NOT FOUND\n"
+    assert (client.full, client.resumed) == (1, 7)
+
+    # the server counts the handshake before answering the query
+    stats = tls_server.handshakes.stats()
+    assert (stats["full"], stats["resumed"]) == (1, 7)
+
+
+def test_sessions_are_bound_to_the_client(tls_server):
+    """Test that a client without a session makes a full handshake."""
+    make_client(tls_server).query("3;0;1;28;0;7;5;0;")
+    client = make_client(tls_server)
+    client.query("3;0;1;28;0;7;5;0;")
+    assert (client.full, client.resumed) == (1, 0)
+
+
+def test_tickets_disabled(tls_server):
+    """Test that no session is resumed without session tickets."""
+    tls_server.ssl_context = create_ssl_context(
+        "cert.pem", "key.pem", session_tickets=0
+    )
+    client = make_client(tls_server)
+    for _ in range(3):
+        assert client.query("3;0;1;28;0;7;5;0;") == "STRING EXISTS\n"
+    assert (client.full, client.resumed) == (3, 0)
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+This module contains tests for the tracing of the requests, the stage
+histograms and the sampled spans, against in process servers.
+"""
+import asyncio
+import logging
+import pytest
+import socket
+import threading
+import time
+from server import logger
+from server import slow_logger
+from server.async_server import AsyncServer
+from server.metrics import MetricsRegistry
+from server.protocol import BINARY_MAGIC
+from server.protocol import encode_batch
+from server.server import Server
+from server.server import TCPHandler
+from server.setup import LoadEnv
+from server.tracing import SlowQueryLog
+from server.tracing import Span
+from server.tracing import STAGES
+from server.tracing import Tracer
+
+
+class ListHandler(logging.Handler):
+    """A handler keeping the records it handles."""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def spans():
+    """Fixture collecting the spans logged by the server logger."""
+    handler = ListHandler()
+    logger.addHandler(handler)
+    yield handler.records
+    logger.removeHandler(handler)
+
+
+@pytest.fixture
+def slow_queries():
+    """Fixture collecting the records of the slow query log."""
+    handler = ListHandler()
+    slow_logger.addHandler(handler)
+    yield handler.records
+    slow_logger.removeHandler(handler)
+
+
+def make_env(tmp_path, reread, **settings):
+    """Build the environment of a server tracing every request."""
+    search_file = tmp_path / "search.txt"
+    search_file.write_text("3;0;1;28;0;7;5;0;\napple\n")
+    return LoadEnv(
+        HOST="127.0.0.1",
+        PORT=9000,
+        TEST_PORT=9001,
+        LINUXPATH=search_file,
+        SSL=False,
+        REREAD_ON_QUERY=reread,
+        ALGORITHM="bisect",
+        TRACE_SAMPLE_RATE=1.0,
+        DEBUG=str(tmp_path / "debug.log"),
+        **settings,
+    )
+
+
+def stage_counts(tracer):
+    """Count the requests recorded by every stage histogram."""
+    return {stage: tracer.stages[stage].count for stage in STAGES}
+
+
+def test_tracer_finish(spans):
+    """Test that a span feeds the stage histograms and is logged."""
+    tracer = Tracer(MetricsRegistry(), sample_rate=1.0)
+    span = Span(0)
+    span.recv += 2000
+    span.recv += 1000
+    span.search = 5000
+    span.queries = 2
+    tracer.finish(span, ("127.0.0.1", 5000), 10000)
+    assert tracer.stages["recv"].counts()[1] == 3000
+    assert stage_counts(tracer) == {
+        "recv": 1,
+        "decode": 0,
+        "reload": 0,
+        "search": 1,
+        "send": 0,
+    }
+    (record,) = [r for r in spans if "span" in r.msg]
+    assert record.args[2:] == (2, {"recv": 3.0, "search": 5.0}, 10.0)
+
+    # nothing is logged without sampling
+    Tracer(MetricsRegistry()).finish(span, ("127.0.0.1", 5000), 10000)
+    assert len([r for r in spans if "span" in r.msg]) == 1
+
+
+@pytest.mark.parametrize("reread", [False, True])
+def test_server_stages(tmp_path, spans, reread):
+    """Test the stages of the requests of the threaded engine."""
+    # the first query of a client is split, wait for the rest of its line
+    env_vars = make_env(tmp_path, reread, LEGACY_TIMEOUT=0.5)
+    server = Server(("127.0.0.1", 0), TCPHandler, env_vars)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    address = ("127.0.0.1", server.server_address[1])
+    try:
+        with socket.create_connection(address) as conn:
+            # a query sent in two parts, read apart, is a single request
+            conn.sendall(b"3;0;1;")
+            time.sleep(0.01)
+            conn.sendall(b"28;0;7;5;0;\napple\n")
+            received = b""
+            while received.count(b"\n") < 2:
+                received += conn.recv(1024)
+            assert received == b"STRING EXISTS\n" * 2
+        with socket.create_connection(address) as conn:
+            conn.sendall(BINARY_MAGIC + encode_batch(["apple", "kiwi"]))
+            assert len(conn.recv(1024)) == 5
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    counts = stage_counts(server.tracer)
+    assert counts["send"] == counts["search"] == 2
+    assert counts["recv"] >= 2 and counts["decode"] >= 2
+    assert counts["reload"] == (2 if reread else 0)
+    logged = [r for r in spans if "span" in r.msg]
+    assert sorted(record.args[2] for record in logged) == [2, 2]
+    assert all("send" in record.args[3] for record in logged)
+
+
+def test_async_server_stages(tmp_path, spans):
+    """Test the stages of the requests of the asyncio engine."""
+    server = AsyncServer(("127.0.0.1", 0), make_env(tmp_path, True))
+
+    async def client():
+        await server.start()
+        port = server.server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"apple\nkiwi\n")
+            assert await reader.readline() == b"STRING EXISTS\n"
+            assert await reader.readline() == b"STRING NOT FOUND\n"
+            writer.close()
+            await writer.wait_closed()
+        finally:
+            server.server.close()
+            await server.server.wait_closed()
+            server.close_database()
+
+    asyncio.run(client())
+    counts = stage_counts(server.tracer)
+    # the event loop reads for every connection, recv is not traced
+    assert counts == {
+        "recv": 0,
+        "decode": 1,
+        "reload": 1,
+        "search": 1,
+        "send": 1,
+    }
+
+
+def test_async_split_batch_span(tmp_path, spans):
+    """Test that a batch split over several reads of the asyncio engine is
+    traced as a single request, from its first read."""
+    server = AsyncServer(("127.0.0.1", 0), make_env(tmp_path, False))
+    frame = BINARY_MAGIC + encode_batch(["apple", "kiwi"])
+
+    async def client():
+        await server.start()
+        port = server.server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(frame[:4])
+            await writer.drain()
+            await asyncio.sleep(0.2)
+            writer.write(frame[4:])
+            assert len(await reader.readexactly(5)) == 5
+            writer.close()
+            await writer.wait_closed()
+        finally:
+            server.server.close()
+            await server.server.wait_closed()
+            server.close_database()
+
+    asyncio.run(client())
+    (record,) = [r for r in spans if "span" in r.msg]
+    assert record.args[2] == 2
+    # the request runs from the read starting the frame
+    assert record.args[4] >= 200000
+
+
+def test_slow_query_log(slow_queries):
+    """Test the thresholds of the slow query log and its entries."""
+    slow_log = SlowQueryLog(10000, algorithm="hash")
+    span = Span(0)
+    span.search = 9000
+    assert not slow_log.is_slow(span, 10000)
+    assert slow_log.is_slow(span, 10001)
+    slow_log.stage_threshold = 8000
+    assert slow_log.is_slow(span, 9500)
+
+    span.queries = 20
+    span.strings = [["key"] * 10, ["other"] * 10]
+    span.reloaded = True
+    span.version = 3
+    tracer = Tracer(MetricsRegistry(), slow_log=slow_log)
+    tracer.finish(span, ("127.0.0.1", 5000), 9500)
+    (record,) = slow_queries
+    assert record.args == (
+        "127.0.0.1",
+        5000,
+        20,
+        ["key"] * 10 + ["other"] * 6,
+        3,
+        "hash",
+        True,
+        {"search": 9.0},
+        9.5,
+    )
+
+    # a request under both thresholds is not written
+    span.search = 1000
+    tracer.finish(span, ("127.0.0.1", 5000), 9500)
+    assert len(slow_queries) == 1
+
+
+@pytest.mark.parametrize("threshold, logged", [(1e-6, 2), (60000.0, 0)])
+def test_server_slow_queries(tmp_path, spans, slow_queries, threshold, logged):
+    """Test the slow requests of the threaded engine, kept out of the
+    server log."""
+    env_vars = make_env(
+        tmp_path,
+        True,
+        SLOW_QUERY_LOG=tmp_path / "slow.log",
+        SLOW_QUERY_MS=threshold,
+    )
+    server = Server(("127.0.0.1", 0), TCPHandler, env_vars)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    address = ("127.0.0.1", server.server_address[1])
+    try:
+        with socket.create_connection(address) as conn:
+            conn.sendall(b"apple\nkiwi\n")
+            received = b""
+            while received.count(b"\n") < 2:
+                received += conn.recv(1024)
+        with socket.create_connection(address) as conn:
+            conn.sendall(BINARY_MAGIC + encode_batch(["apple", "kiwi"]))
+            assert len(conn.recv(1024)) == 5
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(slow_queries) == logged
+    for record in slow_queries:
+        client_ip, _, queries, strings, version, algorithm, reloaded = (
+            record.args[:7]
+        )
+        assert (client_ip, queries, strings) == (
+            "127.0.0.1",
+            2,
+            ["apple", "kiwi"],
+        )
+        assert (version, algorithm, reloaded) == (1, "bisect", False)
+        assert set(record.args[7]) >= {"decode", "reload", "search", "send"}
+    assert not [r for r in spans if "reloaded" in r.msg]
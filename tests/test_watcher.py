@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+import pytest
+import time
+from server.database import Database
+from server.search_algorithms import *
+from server.watcher import FileWatcher
+
+
+@pytest.fixture
+def search_file(tmp_path):
+    """Fixture for a search file."""
+    file_path = tmp_path / "search.txt"
+    file_path.write_text("apple\nbanana\ncherry\n")
+    return file_path
+
+
+def wait_for(condition, timeout=5.0):
+    """Helper function polling a condition until it holds or times out."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_watcher_reloads_changed_file(search_file, monkeypatch, use_inotify):
+    """Test that the watcher swaps in new data when the file changes."""
+    if not use_inotify:
+        monkeypatch.setattr(
+            "server.watcher.inotify_watch", lambda dir_path: None
+        )
+    db = Database(False, search_file, sorted)
+    watcher = FileWatcher(db, poll_interval=0.05)
+    watcher.start()
+    try:
+        assert not db.search(bisect_search, "kiwi\n")
+        search_file.write_text("apple\nkiwi\n")
+        assert wait_for(lambda: db.search(bisect_search, "kiwi\n"))
+        assert not db.search(bisect_search, "banana\n")
+    finally:
+        watcher.stop()
+    assert not watcher.is_alive()
+
+
+def test_watcher_keeps_data_when_file_missing(search_file):
+    """Test that the watcher keeps serving old data if the file vanishes."""
+    db = Database(False, search_file, sorted)
+    watcher = FileWatcher(db, poll_interval=0.05)
+    watcher.start()
+    try:
+        search_file.unlink()
+        time.sleep(0.2)
+        assert watcher.is_alive()
+        assert db.search(bisect_search, "apple\n")
+    finally:
+        watcher.stop()